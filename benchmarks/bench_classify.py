@@ -0,0 +1,65 @@
+"""
+Micro-benchmark of classify() over mixed identifiers (CAS, InChI, InChIKey, SMILES, names)
+taken from the bundled dataset: the previous implementation (patterns compiled and
+lookup dict rebuilt on every call), classify() and classify_many().
+
+Usage:
+    python benchmarks/bench_classify.py [number_of_identifiers]
+"""
+
+import csv
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.append(os.path.realpath('src'))
+
+from classify import classify, classify_many
+
+
+DATA_FILE = os.path.join('src', 'data', 'processed', 'complete_data.csv')
+
+
+def classify_previous(identifier: str) -> str:
+    """classify() before precompiled patterns and prefilter, for comparison"""
+    cas_pattern = re.compile(r'^\d{1,7}\-\d{2}\-\d$')
+    smiles_pattern = re.compile(r'^(?!InChI=)(?!\d{1,7}\-\d{2}\-\d)(?![A-Z]{14}\-[A-Z]{10}(\-[A-Z])?)[^J][a-zA-Z0-9@+\-\[\]\(\)\\\/%=#$]{1,}$')
+    inchi_pattern = re.compile(r'^InChI\=1S?\/[A-Za-z0-9\.]+(\+[0-9]+)?(\/[cnpqbtmsih][A-Za-z0-9\-\+\(\)\,\/\?\;\.]+)*$')
+    inchikey_pattern = re.compile(r'^[A-Z]{14}\-[A-Z]{10}(\-[A-Z])?')
+    lookup = {
+        'cas': lambda x: cas_pattern.search(x),
+        'inchi': lambda x: inchi_pattern.search(x),
+        'inchikey': lambda x: inchikey_pattern.search(x),
+        'smiles': lambda x: smiles_pattern.search(x),
+    }
+    for key, value in lookup.items():
+        if value(identifier):
+            return key
+
+
+def bench(name: str, func, identifiers, baseline=None) -> float:
+    start = time.perf_counter()
+    func(identifiers)
+    elapsed = time.perf_counter() - start
+    speedup = f'  ({baseline / elapsed:.1f}x)' if baseline else ''
+    print(f'{name:20}: {elapsed:6.2f} s, {elapsed / len(identifiers) * 1e9:6.0f} ns/identifier{speedup}')
+    return elapsed
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    with open(DATA_FILE, newline='', encoding='utf-8') as f:
+        records = list(csv.DictReader(f))
+    fields = ['Substance_CASRN', 'InChI', 'InChIKey', 'Canonical_SMILES', 'Substance_Name']
+    random.seed(0)
+    identifiers = [random.choice(records)[random.choice(fields)] for _ in range(n)]
+    print(f'{n} identifiers, {len(set(identifiers))} distinct')
+
+    assert [classify_previous(identifier) for identifier in identifiers[:10000]] == classify_many(identifiers[:10000])
+
+    baseline = bench('previous classify()', lambda ids: [classify_previous(i) for i in ids], identifiers)
+    bench('classify()', lambda ids: [classify(i) for i in ids], identifiers, baseline)
+    bench('classify_many()', classify_many, identifiers, baseline)
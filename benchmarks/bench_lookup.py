@@ -0,0 +1,203 @@
+"""
+Offline benchmark suite of the lookup hot paths, against a local stand-in for Pubchem
+(MockPubchemServer of tests/unit/mock_pubchem.py) instead of the live service, so runs
+are reproducible and need no network:
+    - classify() throughput
+    - single lookups (search_pka()) with a cold local database (every lookup goes to Pubchem),
+      then a warm one (every lookup is a local hit), then with a warm ResultCache
+    - batches (search_pka_many()), cold with 1 and 8 concurrent Pubchem lookups, then warm
+
+The stand-in serves compounds built from the bundled dataset (CAS, InChIKey, SMILES, pKa),
+or compounds recorded from Pubchem (--recording, recorded with --record), with a
+configurable latency and rate of HTTP 503 answers. The Pubchem rate limit (5 requests/second)
+is lifted and the backoff shortened, to measure this code rather than the waits.
+
+Timings can be saved and compared with a previous run, e.g. in CI: the script exits
+with status 1 if a case is more than --tolerance slower than in the baseline.
+
+Usage:
+    python benchmarks/bench_lookup.py [--compounds 200] [--latency 0.0] [--error-rate 0.0]
+                                      [--recording recording.json] [--save results.json]
+                                      [--compare baseline.json] [--tolerance 0.25]
+    python benchmarks/bench_lookup.py --record recording.json 64-19-7 67-56-1 ...
+records the Pubchem answers for these identifiers (needs network access)
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.append(os.path.realpath('src'))
+sys.path.append(os.path.realpath(os.path.join('tests', 'unit')))
+
+import pka_lookup_pubchem
+import pubchem_api
+from classify import classify_many
+from db_index import IndexedDB
+from mock_pubchem import MockPubchemServer, load_recording
+from rate_limiter import RateLimiter
+from result_cache import ResultCache
+from search_pka import search_pka, search_pka_many
+from snapshot import DATA_FILE, read_csv
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+
+CLASSIFY_IDENTIFIERS = 100000
+# Cases that do not change the database are repeated, the fastest run is kept,
+# and warm lookups go through the identifiers several times per run (they are only a few us each)
+REPEAT = 5
+WARM_PASSES = 20
+
+
+def dataset_compounds(records, n: int):
+    """Return {CID: compound} of `n` compounds of the bundled dataset, served like Pubchem would"""
+    compounds = {}
+    seen = set()
+    for record in records:
+        cas = record['Substance_CASRN']
+        if not cas or cas.startswith('NOCAS') or record['InChIKey'] in seen:
+            continue
+        seen.add(record['InChIKey'])
+        compounds[len(compounds) + 1] = {
+            'names': [cas],
+            'synonyms': [record['Substance_Name'], cas],
+            'properties': {
+                'InChI': record['InChI'],
+                'InChIKey': record['InChIKey'],
+                'CanonicalSMILES': record['Canonical_SMILES'],
+                'IsomericSMILES': record['Canonical_SMILES'],
+                'IUPACName': record['Substance_Name'],
+            },
+            'pka': [('Bundled dataset', 'pKa = {}'.format(record['pKa']))],
+        }
+        if len(compounds) == n:
+            break
+    return compounds
+
+
+def record(identifiers, path: str) -> None:
+    """Save the Pubchem answers (CIDs, synonyms, properties, PUG-View pKa XML) for `identifiers` into `path`"""
+    compounds = {}
+    for identifier in identifiers:
+        cids = pka_lookup_pubchem._request(pubchem_api.get_cids, identifier, namespace='name')
+        if not cids:
+            print(f'{identifier}: not found in Pubchem')
+            continue
+        cid = cids[0]
+        properties = pka_lookup_pubchem._request(pubchem_api.get_properties, pka_lookup_pubchem.PROPERTIES, cid)[0]
+        properties.pop('CID', None)
+        r = pka_lookup_pubchem._request(pubchem_api.get_pka_xml, cid)
+        compounds[cid] = {
+            'names': [identifier],
+            'synonyms': pka_lookup_pubchem._request(pubchem_api.get_synonyms, cid)[0]['Synonym'],
+            'properties': properties,
+            'pug_view': r.text if r.status_code == 200 else '',
+        }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(compounds, f, indent=1, ensure_ascii=False)
+    print(f'{len(compounds)} compounds recorded into {path}')
+
+
+def empty_db():
+    return IndexedDB(TinyDB(storage=MemoryStorage))
+
+
+def timed(func, *args, repeat: int = 1, **kwargs) -> float:
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+
+def run(identifiers, classify_identifiers):
+    """Return {case: seconds per identifier}"""
+    results = {}
+    results['classify'] = timed(classify_many, classify_identifiers, repeat=REPEAT) / len(classify_identifiers)
+
+    warm_identifiers = identifiers * WARM_PASSES
+
+    db = empty_db()
+    results['search_pka cold db'] = timed(lambda: [search_pka(i, db) for i in identifiers]) / len(identifiers)
+    results['search_pka warm db'] = timed(lambda: [search_pka(i, db) for i in warm_identifiers],
+                                          repeat=REPEAT) / len(warm_identifiers)
+    cache = ResultCache()
+    for identifier in identifiers:
+        search_pka(identifier, db, cache=cache)
+    results['search_pka warm cache'] = timed(lambda: [search_pka(i, db, cache=cache) for i in warm_identifiers],
+                                             repeat=REPEAT) / len(warm_identifiers)
+
+    for max_workers in (1, 8):
+        results[f'search_pka_many cold db, {max_workers} workers'] = timed(
+            search_pka_many, identifiers, empty_db(), max_workers=max_workers) / len(identifiers)
+    results['search_pka_many warm db'] = timed(search_pka_many, identifiers, db, repeat=REPEAT) / len(identifiers)
+    return results
+
+
+def compare(results, baseline, tolerance: float) -> bool:
+    """Print the cases slower than `baseline` by more than `tolerance`, return True if there is none"""
+    ok = True
+    for case, seconds in results.items():
+        if case in baseline and seconds > baseline[case] * (1 + tolerance):
+            print(f'REGRESSION {case}: {seconds * 1e6:.1f} us vs {baseline[case] * 1e6:.1f} us')
+            ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Offline benchmarks of the lookup hot paths')
+    parser.add_argument('--compounds', type=int, default=200, help='compounds served, from the bundled dataset')
+    parser.add_argument('--recording', help='serve compounds recorded with --record instead')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per Pubchem request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered HTTP 503')
+    parser.add_argument('--save', help='save the timings into this JSON file')
+    parser.add_argument('--compare', help='compare with the timings saved in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='slowdown allowed by --compare')
+    parser.add_argument('--record', help='record the Pubchem answers for the identifiers given into this file')
+    parser.add_argument('identifiers', nargs='*')
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.identifiers, args.record)
+        sys.exit()
+
+    records = read_csv(DATA_FILE)
+    random.seed(0)
+    random.shuffle(records)
+    compounds = load_recording(args.recording) if args.recording else dataset_compounds(records, args.compounds)
+    identifiers = [compound['names'][0] for compound in compounds.values()]
+    classify_identifiers = [random.choice(records)[random.choice(['Substance_CASRN', 'InChI', 'InChIKey',
+                                                                  'Canonical_SMILES', 'Substance_Name'])]
+                            for _ in range(CLASSIFY_IDENTIFIERS)]
+
+    server = MockPubchemServer(compounds, latency=args.latency, error_rate=args.error_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    pubchem_api.PUG_REST_URL = server.url + '/rest/pug'
+    pubchem_api.PUG_VIEW_URL = server.url + '/rest/pug_view'
+    pka_lookup_pubchem.rate_limiter = RateLimiter(rate=100000)
+    pka_lookup_pubchem.BACKOFF = 0.001
+
+    try:
+        results = run(identifiers, classify_identifiers)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(f'{len(identifiers)} compounds, latency {args.latency * 1e3:.0f} ms, error rate {args.error_rate:.0%}, '
+          f'{len(server.requests)} Pubchem requests')
+    for case, seconds in results.items():
+        print(f'{case:36}: {seconds * 1e6:10.1f} us/identifier')
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            if not compare(results, json.load(f), args.tolerance):
+                sys.exit(1)
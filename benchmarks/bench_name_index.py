@@ -0,0 +1,74 @@
+"""
+Time the queries of a type-ahead box on NameIndex: prefix completion of the first letters
+of a name, and fuzzy search of a misspelled name (one letter dropped), compared with a
+Python loop over every name for the fuzzy search.
+
+Names are the Substance_Name of the bundled dataset, repeated with a numbered suffix
+to reach the number asked (as many names as with harvested synonyms).
+
+Usage:
+    python benchmarks/bench_name_index.py [number_of_names] [number_of_queries]
+"""
+
+import difflib
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.realpath('src'))
+
+from name_index import NameIndex, name_key, placeholder_pattern
+from snapshot import DATA_FILE, read_csv
+
+
+def loop_fuzzy(names, name, limit=10):
+    """The fuzzy query without index: ratio of every name"""
+    key = name_key(name)
+    scored = sorted(((difflib.SequenceMatcher(None, key, name_key(other)).ratio(), other) for other in names),
+                    reverse=True)
+    return scored[:limit]
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    dataset_names = sorted(set(record['Substance_Name'] for record in read_csv(DATA_FILE)
+                               if record['Substance_Name'] and not placeholder_pattern.match(record['Substance_Name'])))
+    names = [name if i < len(dataset_names) else '{} {}'.format(name, i // len(dataset_names))
+             for i, name in enumerate((dataset_names * (n // len(dataset_names) + 1))[:n])]
+
+    start = time.perf_counter()
+    index = NameIndex()
+    for i, name in enumerate(names):
+        index.add(name, 'INCHIKEY-{}'.format(i))
+    index.complete('a')
+    build_time = time.perf_counter() - start
+
+    random.seed(0)
+    wanted = random.sample(dataset_names, queries)
+    prefixes = [name[:random.randint(2, 6)] for name in wanted]
+    misspelled = []
+    for name in wanted:
+        i = random.randrange(len(name))
+        misspelled.append(name[:i] + name[i + 1:])
+
+    start = time.perf_counter()
+    for prefix in prefixes:
+        index.complete(prefix)
+    complete_time = (time.perf_counter() - start) / queries
+
+    start = time.perf_counter()
+    found = sum(any(result[0] == name for result in index.fuzzy(query)) for name, query in zip(wanted, misspelled))
+    fuzzy_time = (time.perf_counter() - start) / queries
+
+    loop_queries = misspelled[:max(1, 200000 // n)]
+    start = time.perf_counter()
+    for query in loop_queries:
+        loop_fuzzy(names, query)
+    loop_time = (time.perf_counter() - start) / len(loop_queries)
+
+    print(f'{len(index)} names indexed in {build_time:.1f} s: complete {complete_time * 1e3:.3f} ms/query, '
+          f'fuzzy {fuzzy_time * 1e3:.2f} ms/query ({found}/{queries} misspelled names found), '
+          f'loop {loop_time * 1e3:.0f} ms/query ({loop_time / fuzzy_time:.0f}x)')
@@ -0,0 +1,58 @@
+"""
+Compare matching many identifiers against the local dataset in one process
+(search_db_many() over the snapshot) with worker processes sharing the
+memory-mapped snapshot (search_pka_parallel()).
+
+Identifiers are drawn from the bundled dataset (all found locally, no Pubchem request):
+half of them are distinct (as many as the dataset has), the others repeat these.
+
+Usage:
+    python benchmarks/bench_parallel.py [number_of_identifiers] [processes]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.realpath('src'))
+
+from bulk_search import search_pka_parallel
+from search_pka import search_db_many
+from snapshot import DATA_FILE, Snapshot, build_snapshot, read_csv
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+    records = read_csv(DATA_FILE)
+    random.seed(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'pka_snapshot.bin')
+        build_snapshot(records, path)
+
+        snapshot = Snapshot(path)
+        # Only identifiers found locally (e.g. not empty ones), so Pubchem is never searched
+        distinct = sorted(set(record[field] for record in records
+                              for field in ('Substance_CASRN', 'InChIKey', 'Canonical_SMILES')
+                              if record.get(field) and snapshot.lookup(record[field])))
+        distinct = random.sample(distinct, min(n // 2, len(distinct)))
+        identifiers = distinct + random.choices(distinct, k=n - len(distinct))
+        random.shuffle(identifiers)
+
+        start = time.perf_counter()
+        search_db_many(identifiers, snapshot)
+        single_time = time.perf_counter() - start
+        snapshot.close()
+
+        start = time.perf_counter()
+        search_pka_parallel(identifiers, TinyDB(storage=MemoryStorage), snapshot_path=path, processes=processes)
+        parallel_time = time.perf_counter() - start
+
+    print(f'{len(identifiers)} identifiers ({len(distinct)} distinct, {len(identifiers) - len(distinct)} duplicates): '
+          f'1 process {single_time:6.2f} s, {processes} processes {parallel_time:6.2f} s')
@@ -0,0 +1,59 @@
+"""
+Compare a numeric pKa query ("acidic compounds with 3 <= pKa <= 5 measured at 20-25 °C")
+done as a Python loop parsing every record with PkaTable (records parsed once into
+NumPy columns, pKa range bisected on the sorted column, other filters vectorized).
+
+Records are the bundled dataset, repeated to reach the number asked.
+
+Usage:
+    python benchmarks/bench_pka_query.py [number_of_records] [number_of_queries]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.realpath('src'))
+
+from pka_query import PkaTable, parse_record
+from snapshot import DATA_FILE, read_csv
+
+
+def loop_query(records, min_pka, max_pka):
+    """The query without PkaTable: parse and filter every record"""
+    results = []
+    for record in records:
+        parsed = parse_record(record)
+        if (parsed['value'] is not None and min_pka <= parsed['value'] <= max_pka and parsed['type'] == 'acidic'
+                and parsed['temperature'] is not None and 20 <= parsed['temperature'] <= 25):
+            results.append(record)
+    return results
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    dataset = read_csv(DATA_FILE)
+    records = (dataset * (n // len(dataset) + 1))[:n]
+    random.seed(0)
+    ranges = [sorted((random.uniform(0, 14), random.uniform(0, 14))) for _ in range(queries)]
+
+    start = time.perf_counter()
+    for min_pka, max_pka in ranges:
+        loop_query(records, min_pka, max_pka)
+    loop_time = (time.perf_counter() - start) / queries
+
+    start = time.perf_counter()
+    table = PkaTable(records)
+    table.columns()
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for min_pka, max_pka in ranges:
+        table.query(min_pka=min_pka, max_pka=max_pka, type='acidic', min_temperature=20, max_temperature=25)
+    query_time = (time.perf_counter() - start) / queries
+
+    print(f'{n} records: loop {loop_time * 1e3:8.1f} ms/query, PkaTable {query_time * 1e3:8.2f} ms/query '
+          f'({loop_time / query_time:.0f}x), built once in {build_time * 1e3:.0f} ms')
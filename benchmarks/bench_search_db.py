@@ -0,0 +1,73 @@
+"""
+Compare per-lookup latency of search_db() using a full tinyDB table scan
+against the dict-based indexes of IndexedDB.
+
+The local database is built in memory from the bundled dataset
+(src/data/processed/complete_data.csv) so this runs without network access.
+
+Usage:
+    python benchmarks/bench_search_db.py [number_of_lookups]
+"""
+
+import csv
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.realpath('src'))
+
+from db_index import IDENTIFIER_FIELDS, IndexedDB
+from search_pka import search_db
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+
+DATA_FILE = os.path.join('src', 'data', 'processed', 'complete_data.csv')
+
+
+def load_db() -> TinyDB:
+    db = TinyDB(storage=MemoryStorage)
+    with open(DATA_FILE, newline='', encoding='utf-8') as f:
+        db.insert_multiple(csv.DictReader(f))
+    return db
+
+
+def sample_identifiers(db, n: int):
+    records = db.all()
+    random.seed(0)
+    identifiers = []
+    for _ in range(n):
+        record = random.choice(records)
+        identifiers.append(record[random.choice(['Substance_CASRN', 'InChI', 'InChIKey', 'Canonical_SMILES'])])
+    # Add some misses as well
+    identifiers[::10] = ['0000-00-0'] * len(identifiers[::10])
+    return identifiers
+
+
+def bench(database, identifiers) -> float:
+    start = time.perf_counter()
+    for identifier in identifiers:
+        search_db(identifier=identifier, database=database)
+    return (time.perf_counter() - start) / len(identifiers)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    db = load_db()
+    identifiers = sample_identifiers(db, n)
+    print(f'{len(db)} records, {n} lookups over {len(IDENTIFIER_FIELDS)} identifier fields')
+
+    # Query cache of tinyDB would hide the cost of repeated identifiers
+    db.clear_cache()
+    scan = bench(db, identifiers)
+
+    start = time.perf_counter()
+    indexed_db = IndexedDB(db)
+    build = time.perf_counter() - start
+    indexed = bench(indexed_db, identifiers)
+
+    print(f'full scan   : {scan * 1e6:10.1f} us/lookup')
+    print(f'index build : {build * 1e3:10.1f} ms (once)')
+    print(f'indexed     : {indexed * 1e6:10.1f} us/lookup  ({scan / indexed:.0f}x faster)')
@@ -0,0 +1,67 @@
+"""
+Compare cold start of the tinyDB JSON database with the binary snapshot:
+time from opening the database to the first lookup result, and peak memory (RSS),
+each measured in a fresh Python process.
+
+Usage:
+    python benchmarks/bench_snapshot.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.append(os.path.realpath('src'))
+
+from snapshot import DATA_FILE, build_snapshot, read_csv
+from tinydb import TinyDB
+
+
+CHILD = '''
+import resource, sys, time
+sys.path.append({src!r})
+from db_index import IndexedDB
+from search_pka import search_db
+from snapshot import Snapshot
+from tinydb import TinyDB
+start = time.perf_counter()
+{open_db}
+result = search_db('QTBSBXVTEAMEQO-UHFFFAOYSA-N', db)
+elapsed = time.perf_counter() - start
+# ru_maxrss is in kB on Linux (bytes on macOS)
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+OPEN_JSON = 'db = IndexedDB(TinyDB({path!r}))'
+OPEN_SNAPSHOT = 'db = Snapshot({path!r})'
+# Baseline: imports only, to subtract from the numbers above
+OPEN_NOTHING = 'db = None'
+
+
+def run(open_db: str):
+    code = CHILD.format(src=os.path.realpath('src'), open_db=open_db)
+    elapsed, rss = subprocess.check_output([sys.executable, '-c', code]).split()
+    return float(elapsed), int(rss)
+
+
+if __name__ == "__main__":
+    records = read_csv(DATA_FILE)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'tinydb_db.json')
+        snapshot_path = os.path.join(tmp, 'pka_snapshot.bin')
+
+        db = TinyDB(json_path, sort_keys=True, indent=4)
+        db.insert_multiple(records)
+        db.close()
+        build_snapshot(records, snapshot_path)
+        print(f'{len(records)} records: JSON {os.path.getsize(json_path) / 1e6:.1f} MB, '
+              f'snapshot {os.path.getsize(snapshot_path) / 1e6:.1f} MB')
+
+        _, base_rss = run(OPEN_NOTHING)
+        for name, open_db in [('tinyDB JSON', OPEN_JSON.format(path=json_path)),
+                              ('snapshot', OPEN_SNAPSHOT.format(path=snapshot_path))]:
+            elapsed, rss = run(open_db)
+            print(f'{name:12}: open + first lookup {elapsed * 1e3:8.1f} ms, '
+                  f'peak RSS {rss / 1024:6.1f} MB (+{(rss - base_rss) / 1024:.1f} MB over imports only)')
@@ -0,0 +1,105 @@
+"""
+Compare the tinyDB JSON database (CachingMiddleware(JSONStorage), as used before)
+with the SQLite database (SQLiteDB): open time, lookup latency and the cost of
+saving one new record. Also compare saving new records one at a time into the
+JSON file (each insert rewrites it) with the write-behind queue (WriteBehindDB).
+
+Both databases are built in a temporary directory from the bundled dataset
+(src/data/processed/complete_data.csv), the SQLite one with migrate_tinydb_json().
+
+Usage:
+    python benchmarks/bench_storage.py [number_of_lookups]
+"""
+
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.realpath('src'))
+
+from db_index import IndexedDB
+from search_pka import search_db
+from sqlite_db import SQLiteDB, migrate_tinydb_json
+from tinydb import TinyDB
+from tinydb.middlewares import CachingMiddleware
+from tinydb.storages import JSONStorage
+from write_behind import AtomicJSONStorage, WriteBehindDB
+
+
+DATA_FILE = os.path.join('src', 'data', 'processed', 'complete_data.csv')
+NEW_RECORD = {'InChIKey': 'OKKJLVBELUTLKV-UHFFFAOYSA-N', 'Canonical_SMILES': 'CO', 'pKa': '15.3'}
+NEW_RECORDS = 20
+
+
+def open_tinydb(path):
+    return TinyDB(path, sort_keys=True, indent=4, storage=CachingMiddleware(JSONStorage))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def lookups(database, identifiers) -> float:
+    start = time.perf_counter()
+    for identifier in identifiers:
+        search_db(identifier=identifier, database=database)
+    return (time.perf_counter() - start) / len(identifiers)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    with open(DATA_FILE, newline='', encoding='utf-8') as f:
+        records = list(csv.DictReader(f))
+    random.seed(0)
+    identifiers = [random.choice(records)[random.choice(['Substance_CASRN', 'InChIKey', 'Canonical_SMILES'])]
+                   for _ in range(n)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'tinydb_db.json')
+        sqlite_path = os.path.join(tmp, 'pka_db.sqlite3')
+
+        db = open_tinydb(json_path)
+        db.insert_multiple(records)
+        db.close()
+        migrate_tinydb_json(json_path, sqlite_path)
+        print(f'{len(records)} records: JSON {os.path.getsize(json_path) / 1e6:.1f} MB, '
+              f'SQLite {os.path.getsize(sqlite_path) / 1e6:.1f} MB')
+
+        # tinyDB JSON + IndexedDB (open = parse the whole file + build indexes)
+        db, open_time = timed(lambda: IndexedDB(open_tinydb(json_path)))
+        lookup_time = lookups(db, identifiers)
+        db.insert(NEW_RECORD)
+        _, save_time = timed(db.close)    # rewrites the whole file
+        print(f'tinyDB JSON : open {open_time * 1e3:8.1f} ms, lookup {lookup_time * 1e6:8.1f} us, '
+              f'save 1 record {save_time * 1e3:8.1f} ms')
+
+        db, open_time = timed(SQLiteDB, sqlite_path)
+        lookup_time = lookups(db, identifiers)
+        _, save_time = timed(db.insert, NEW_RECORD)    # appends one row
+        db.close()
+        print(f'SQLite      : open {open_time * 1e3:8.1f} ms, lookup {lookup_time * 1e6:8.1f} us, '
+              f'save 1 record {save_time * 1e3:8.1f} ms')
+
+        # Durable saves into the JSON file: one rewrite per insert vs one per batch
+        db = TinyDB(json_path)
+        start = time.perf_counter()
+        for i in range(NEW_RECORDS):
+            db.insert(dict(NEW_RECORD, pKa=str(i)))
+        direct_time = time.perf_counter() - start
+        db.close()
+
+        db = WriteBehindDB(TinyDB(json_path, storage=AtomicJSONStorage), os.path.join(tmp, 'tinydb_db.journal'),
+                           max_pending=NEW_RECORDS)
+        start = time.perf_counter()
+        for i in range(NEW_RECORDS):
+            db.insert(dict(NEW_RECORD, pKa=str(i)))
+        db.close()
+        write_behind_time = time.perf_counter() - start
+        print(f'{NEW_RECORDS} new records into JSON: one insert at a time {direct_time * 1e3:8.1f} ms, '
+              f'write-behind {write_behind_time * 1e3:8.1f} ms')
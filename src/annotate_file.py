@@ -0,0 +1,292 @@
+"""
+Annotate a large file of compounds with pKa, chunk by chunk.
+
+Rows are read lazily from the input (CSV, SDF or Parquet), the identifiers of each chunk
+are resolved with search_pka_many() (local database first, then Pubchem) and the chunk
+is written out with pKa columns before the next one is read, so memory use is bounded
+by the chunk size, not by the file size.
+
+After each chunk a checkpoint (rows done, output size) is saved. If the run is interrupted,
+running the same command again resumes after the last chunk written instead of starting over.
+
+Usage:
+    python src/annotate_file.py compounds.csv compounds_pka.csv --column CAS
+    python src/annotate_file.py compounds.sdf compounds_pka.sdf --column CAS_NUMBER
+    python src/annotate_file.py compounds.parquet compounds_pka --column inchikey
+(a Parquet output is a directory of part files, one per chunk)
+"""
+
+import argparse
+import csv
+import json
+import os
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
+
+from negative_cache import NegativeCache
+from search_pka import search_pka_many
+from sqlite_db import SQLiteDB
+
+
+# Columns added to each row
+PKA_COLUMNS = ('pKa', 'pKa_source', 'pKa_reference')
+
+FORMATS = {
+    '.csv': 'csv',
+    '.sdf': 'sdf',
+    '.sd': 'sdf',
+    '.parquet': 'parquet',
+}
+
+
+def file_format_of(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError('Unknown file format: {} (one of {})'.format(path, ', '.join(FORMATS)))
+    return FORMATS[extension]
+
+
+def pka_columns(result) -> Dict[str, str]:
+    """Flatten a search_pka() result (list of local records, Pubchem record or None) into PKA_COLUMNS"""
+    if not result:
+        return {column: '' for column in PKA_COLUMNS}
+
+    records = result if isinstance(result, list) else [result]
+
+    def join(key: str, default: str = '') -> str:
+        # Unique values, in order
+        return '; '.join(dict.fromkeys(str(record.get(key) or default) for record in records))
+
+    return {
+        'pKa': join('pKa'),
+        'pKa_source': join('source', 'local'),
+        'pKa_reference': join('reference'),
+    }
+
+
+# Readers: yield rows (dict) one at a time
+
+def read_csv(path: str) -> Iterator[Dict]:
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+
+def read_sdf(path: str) -> Iterator[Dict]:
+    """Yield the data fields of each SDF record, plus the record text itself in '_sdf_block'"""
+    with open(path, encoding='utf-8') as f:
+        lines = []
+        for line in f:
+            if line.rstrip('\r\n') == '$$$$':
+                yield _parse_sdf_record(lines)
+                lines = []
+            else:
+                lines.append(line)
+        if any(line.strip() for line in lines):
+            yield _parse_sdf_record(lines)
+
+
+def _parse_sdf_record(lines: List[str]) -> Dict:
+    row = {}
+    field = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line.startswith('>') and '<' in line:
+            field = line[line.index('<') + 1:line.rindex('>')]
+            row[field] = ''
+        elif field is not None:
+            if line.strip():
+                row[field] = line if not row[field] else row[field] + '\n' + line
+            else:
+                field = None
+    row['_sdf_block'] = ''.join(lines)
+    return row
+
+
+def read_parquet(path: str, chunk_size: int) -> Iterator[Dict]:
+    import pyarrow.parquet as pq    # optional dependency, only for Parquet files
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield from batch.to_pylist()
+
+
+# Writers: write chunks of annotated rows, report the output state to checkpoint
+
+class CSVWriter:
+
+    def __init__(self, path: str, resume_state: Optional[Dict]):
+        self.path = path
+        self.writer = None
+        if resume_state:
+            # Drop whatever was written after the last checkpoint
+            with open(path, 'r+b') as f:
+                f.truncate(resume_state['output_size'])
+        self.f = open(path, 'a' if resume_state else 'w', newline='', encoding='utf-8')
+        self.header_written = bool(resume_state and resume_state['output_size'])
+
+    def write(self, rows: List[Dict]) -> None:
+        if self.writer is None and rows:
+            fieldnames = [key for key in rows[0] if key not in PKA_COLUMNS] + list(PKA_COLUMNS)
+            self.writer = csv.DictWriter(self.f, fieldnames=fieldnames, extrasaction='ignore')
+            if not self.header_written:
+                self.writer.writeheader()
+        if rows:
+            self.writer.writerows(rows)
+
+    def state(self) -> Dict:
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        return {'output_size': self.f.tell()}
+
+    def close(self) -> None:
+        self.f.close()
+
+
+class SDFWriter(CSVWriter):
+
+    def write(self, rows: List[Dict]) -> None:
+        for row in rows:
+            self.f.write(row['_sdf_block'])
+            for column in PKA_COLUMNS:
+                if row[column]:
+                    self.f.write('> <{}>\n{}\n\n'.format(column, row[column]))
+            self.f.write('$$$$\n')
+
+
+class ParquetWriter:
+
+    def __init__(self, path: str, resume_state: Optional[Dict]):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.part = resume_state['part'] if resume_state else 0
+
+    def write(self, rows: List[Dict]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not rows:
+            return
+        part_path = os.path.join(self.path, 'part-{:06d}.parquet'.format(self.part))
+        # Written under a temporary name first, so a part file is either complete or absent
+        pq.write_table(pa.Table.from_pylist(rows), part_path + '.tmp')
+        os.replace(part_path + '.tmp', part_path)
+        self.part += 1
+
+    def state(self) -> Dict:
+        return {'part': self.part}
+
+    def close(self) -> None:
+        pass
+
+
+def _save_checkpoint(path: str, checkpoint: Dict) -> None:
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def annotate_file(input_path: str, output_path: str, database, column: str, chunk_size: int = 1000,
+                  checkpoint_path: Optional[str] = None, negative_cache: Optional[NegativeCache] = None,
+                  max_workers: int = 1) -> int:
+    """Add pKa columns (PKA_COLUMNS) to every row of a CSV, SDF or Parquet file
+
+    Parameters
+    ----------
+    input_path : str
+        file to annotate, format given by its extension (.csv, .sdf/.sd, .parquet)
+    output_path : str
+        annotated file, same format as the input (a directory of part files for Parquet)
+    database : tinyDB tiny.database object, IndexedDB or SQLiteDB
+        local database, see search_pka()
+    column : str
+        the column (CSV, Parquet) or data field (SDF) holding the identifiers
+    chunk_size : int, optional
+        number of rows read, searched and written at a time, by default 1000
+    checkpoint_path : Optional[str], optional
+        where progress is saved after each chunk, by default output_path + '.checkpoint'.
+        An existing checkpoint of the same input resumes the run. It is removed when done
+    negative_cache : Optional[NegativeCache], optional
+        see search_pka()
+    max_workers : int, optional
+        number of Pubchem lookups running at the same time, see search_pka_many()
+
+    Returns
+    -------
+    int
+        number of rows annotated (including the ones done before resuming)
+    """
+    file_format = file_format_of(input_path)
+    checkpoint_path = checkpoint_path or output_path + '.checkpoint'
+
+    checkpoint = None
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('input') != os.path.abspath(input_path):
+            raise ValueError('Checkpoint {} is for another input file: {}'.format(checkpoint_path, checkpoint.get('input')))
+    rows_done = checkpoint['rows_done'] if checkpoint else 0
+
+    if file_format == 'csv':
+        rows = read_csv(input_path)
+        writer = CSVWriter(output_path, checkpoint and checkpoint['output'])
+    elif file_format == 'sdf':
+        rows = read_sdf(input_path)
+        writer = SDFWriter(output_path, checkpoint and checkpoint['output'])
+    else:
+        rows = read_parquet(input_path, chunk_size)
+        writer = ParquetWriter(output_path, checkpoint and checkpoint['output'])
+
+    try:
+        # Skip the rows written before the interruption
+        for _ in islice(rows, rows_done):
+            pass
+
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+
+            identifiers = [(row.get(column) or '').strip() for row in chunk]
+            # Blank cells are not searched
+            searched = [identifier for identifier in identifiers if identifier]
+            results = dict(zip(searched, search_pka_many(searched, database, max_workers=max_workers,
+                                                         negative_cache=negative_cache)))
+            for row, identifier in zip(chunk, identifiers):
+                row.update(pka_columns(results.get(identifier)))
+            writer.write(chunk)
+
+            rows_done += len(chunk)
+            _save_checkpoint(checkpoint_path, {
+                'input': os.path.abspath(input_path),
+                'rows_done': rows_done,
+                'output': writer.state(),
+            })
+    finally:
+        writer.close()
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return rows_done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Annotate a CSV, SDF or Parquet file with pKa')
+    parser.add_argument('input_path')
+    parser.add_argument('output_path')
+    parser.add_argument('--column', required=True, help='column (or SDF data field) holding the identifiers')
+    parser.add_argument('--db', default='src/data/pka_db.sqlite3', help='local database (SQLite)')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--checkpoint', default=None, help='by default <output_path>.checkpoint')
+    parser.add_argument('--max-workers', type=int, default=1, help='concurrent Pubchem lookups')
+    args = parser.parse_args()
+
+    db = SQLiteDB(args.db)
+    try:
+        count = annotate_file(args.input_path, args.output_path, db, args.column,
+                              chunk_size=args.chunk_size, checkpoint_path=args.checkpoint,
+                              negative_cache=NegativeCache(db.table('negative_cache')),
+                              max_workers=args.max_workers)
+        print('Annotated {} rows into {}'.format(count, args.output_path))
+    finally:
+        db.close()
@@ -0,0 +1,298 @@
+"""
+asyncio counterparts of pka_lookup_pubchem() and search_pka(), on aiohttp.
+
+An AsyncPubchemClient shared by the coroutines of an event loop:
+    - coalesces requests: concurrent lookups of the same identifier, and of identifiers
+      resolving to the same compound (CID), share one in-flight fetch
+    - caps the number of requests running at the same time (`max_concurrency`), so one
+      event loop can serve hundreds of lookups at once
+    - shares the rate limiter of pka_lookup_pubchem() (5 requests/second, backs off on HTTP 503)
+
+aiohttp is an optional dependency (pip install aiohttp), only needed by this module.
+
+Usage:
+    async with AsyncPubchemClient() as client:
+        result = await async_search_pka('64-19-7', db, client=client)
+"""
+
+import asyncio
+import re
+import sys
+import traceback
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+import pka_lookup_pubchem as sync_lookup
+import pubchem_api
+from classify import classify
+from dedup import DedupIndex
+from instrumentation import count
+from negative_cache import NO_PKA, NOT_FOUND, NegativeCache
+from pka_lookup_pubchem import PROPERTIES, _check_exact_match, _lookup_error, _pka_record, _report_miss
+from pka_record import PkaRecord
+from search_pka import add_pubchem_result, search_db
+
+
+debug = False
+
+
+class AsyncPubchemClient:
+    """Pubchem client for asyncio with request coalescing and a concurrency cap
+
+    Parameters
+    ----------
+    max_concurrency : int, optional
+        maximum number of requests to Pubchem running at the same time, by default 50
+    session : Optional[aiohttp.ClientSession], optional
+        session used for all requests, by default one created (and closed) by the client
+    """
+
+    def __init__(self, max_concurrency: int = 50, session: Optional['aiohttp.ClientSession'] = None):
+        if aiohttp is None:
+            raise ImportError('AsyncPubchemClient needs aiohttp: pip install aiohttp')
+
+        self._session = session
+        self._owns_session = session is None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = {}
+
+    async def __aenter__(self) -> 'AsyncPubchemClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @property
+    def session(self) -> 'aiohttp.ClientSession':
+        # Created on first use, i.e. inside the running event loop
+        if self._session is None:
+            self._session = aiohttp.ClientSession(headers={'user-agent': pubchem_api.USER_AGENT},
+                                                  timeout=aiohttp.ClientTimeout(total=pubchem_api.TIMEOUT))
+        return self._session
+
+    async def close(self) -> None:
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _coalesce(self, key: Tuple, fetch: Callable[[], Awaitable]):
+        """Await the fetch in flight for `key`, or start it. The fetch is shielded
+        so that a caller being cancelled does not cancel it for the others"""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, method: str, url: str, read: Callable[['aiohttp.ClientResponse'], Awaitable], **kwargs):
+        """Send a request through the rate limiter and the concurrency cap and return `read(response)`,
+        retrying with exponential backoff while Pubchem answers HTTP 503 (see pka_lookup_pubchem._request())"""
+        for attempt in range(sync_lookup.MAX_RETRIES + 1):
+            await asyncio.sleep(sync_lookup.rate_limiter.reserve())
+            count('pubchem_requests')
+            async with self._semaphore:
+                async with self.session.request(method, url, **kwargs) as response:
+                    if response.status != 503 or attempt == sync_lookup.MAX_RETRIES:
+                        return await read(response)
+
+            delay = sync_lookup.BACKOFF * 2 ** attempt
+            if debug:
+                print(f'Pubchem is busy (HTTP 503), retrying in {delay} s')
+            count('pubchem_retries')
+            sync_lookup.rate_limiter.pause(delay)
+
+    async def _get_json(self, path: str, data: Dict) -> Optional[Dict]:
+        """See pubchem_api._get_json()"""
+        async def read(response):
+            if response.status == 404:
+                return None
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+        return await self._fetch('POST', '{}/{}'.format(pubchem_api.PUG_REST_URL, path), read, data=data)
+
+    async def get_cids(self, identifier: str, namespace: str = 'name', domain: str = 'compound') -> List[int]:
+        result = await self._get_json('{}/{}/cids/JSON'.format(domain, namespace), {namespace: identifier})
+        if not result:
+            return []
+        return result.get('IdentifierList', {}).get('CID', [])
+
+    async def get_synonyms(self, cid) -> List[Dict]:
+        result = await self._get_json('compound/cid/synonyms/JSON', {'cid': cid})
+        return result['InformationList']['Information'] if result else []
+
+    async def get_properties(self, properties: List[str], cid) -> List[Dict]:
+        result = await self._get_json('compound/cid/property/{}/JSON'.format(','.join(properties)), {'cid': cid})
+        return result['PropertyTable']['Properties'] if result else []
+
+    async def get_pka_values(self, cid, all_values: bool = False) -> List[Tuple[str, str]]:
+        """Return (reference, pKa) of the first (or every) pKa of a compound, parsed while it is downloaded
+        (see pka_lookup_pubchem._pka_values()). Raise RuntimeError (NO_PKA) if there is none"""
+        async def read(response):
+            values = []
+            # Check to see if give OK status (200) and not redirect
+            if response.status == 200 and not response.history:
+                parser = pubchem_api.pka_xml_parser()
+                async for chunk in response.content.iter_chunked(pubchem_api.XML_CHUNK_SIZE):
+                    parser.feed(chunk)
+                    for reference, pka_result in pubchem_api.read_pka_values(parser):
+                        values.append((reference, re.sub(r'^pKa = ', '', pka_result)))
+                    if values and not all_values:
+                        break
+            return values if all_values else values[:1]
+
+        url = '{}/data/compound/{}/XML'.format(pubchem_api.PUG_VIEW_URL, cid)
+        values = await self._fetch('GET', url, read, params={'heading': 'Dissociation Constants'})
+        if not values:
+            raise _lookup_error(RuntimeError, 'pKa not found in Pubchem.', NO_PKA)
+        return values
+
+    async def _resolve_cid(self, identifier: str, namespace=None):
+        """See pka_lookup_pubchem._resolve_cid()"""
+        cids = []
+        identifier_type = ''
+
+        if not namespace:
+            identifier_type = classify(identifier)
+            # If the input is inchi, inchikey or smiles (this could be a false smiles):
+            lookup_namespace = identifier_type if identifier_type in ['smiles', 'inchi', 'inchikey'] else 'name'
+            lookup = await self.get_cids(identifier, namespace=lookup_namespace)
+            if lookup:
+                cids.append(lookup[0])
+        elif namespace == 'cas':
+            cids = await self.get_cids(identifier, namespace='name')
+        else:
+            cids = await self.get_cids(identifier, namespace=namespace)
+
+        if not cids:
+            lookup = await self.get_cids(identifier, namespace='name')
+            if lookup:
+                cids.append(lookup[0])
+            identifier_type = namespace
+
+        return (cids[0] if cids else None), identifier_type
+
+    async def _get_compound(self, cid) -> Tuple[List[str], Dict]:
+        """Return the synonyms and properties of a compound, requested at the same time"""
+        synonyms, properties = await asyncio.gather(self.get_synonyms(cid), self.get_properties(PROPERTIES, cid))
+        return synonyms[0]['Synonym'] or [], properties[0]
+
+    async def lookup(self, identifier: str, namespace=None, all_values: bool = False) -> PkaRecord:
+        """Look up pKa of `identifier`, raising the errors pka_lookup_pubchem() reports as misses.
+        Concurrent lookups of the same identifier share one fetch"""
+        return await self._coalesce(('identifier', identifier, namespace, all_values),
+                                    lambda: self._lookup(identifier, namespace, all_values))
+
+    async def _lookup(self, identifier: str, namespace, all_values: bool) -> PkaRecord:
+        cid, identifier_type = await self._resolve_cid(identifier, namespace)
+        if cid is None:
+            raise _lookup_error(RuntimeError, 'Compound not found in Pubchem.', NOT_FOUND)
+
+        # Identifiers of the same compound share the requests of its CID.
+        # pKa is requested at the same time as synonyms and properties (see prefetch_pka of pka_lookup_pubchem())
+        pka = asyncio.ensure_future(self._coalesce(('pka', cid, all_values),
+                                                   lambda: self.get_pka_values(cid, all_values)))
+        try:
+            synonyms, properties = await self._coalesce(('compound', cid), lambda: self._get_compound(cid))
+            _check_exact_match(identifier, identifier_type, synonyms, properties)
+            values = await pka
+        finally:
+            if not pka.done():
+                pka.cancel()
+            elif not pka.cancelled():
+                pka.exception()    # retrieved, even if not needed
+
+        return _pka_record(cid, synonyms, properties, values, all_values)
+
+
+async def async_pka_lookup_pubchem(identifier: str, namespace=None, all_values: bool = False,
+                                   client: Optional[AsyncPubchemClient] = None,
+                                   on_miss: Optional[Callable[[str, str], None]] = None) -> Optional[PkaRecord]:
+    """Look up pKa of a compound in Pubchem, see pka_lookup_pubchem()
+
+    Parameters
+    ----------
+    identifier : str
+        search string: CAS number, InChIKey, InChI, IUPAC name or SMILES
+    namespace : optional
+        see pka_lookup_pubchem()
+    all_values : bool, optional
+        see pka_lookup_pubchem()
+    client : Optional[AsyncPubchemClient], optional
+        client shared by the coroutines of the event loop (coalescing, concurrency cap),
+        by default one created for this lookup only
+    on_miss : Optional[Callable[[str, str], None]], optional
+        see pka_lookup_pubchem()
+
+    Returns
+    -------
+    Optional[PkaRecord]
+        the record found in Pubchem, None if not found
+    """
+    global debug
+
+    if len(sys.argv) == 2 and sys.argv[1] in ['--debug=True', '--debug=true', '--debug', '-d']:
+        debug = True
+
+    try:
+        if client is None:
+            async with AsyncPubchemClient() as client:
+                return await client.lookup(identifier, namespace, all_values)
+        return await client.lookup(identifier, namespace, all_values)
+
+    except Exception as error:
+        _report_miss(identifier, error, on_miss)
+        return None
+
+
+async def async_search_pka(identifier: str, database, negative_cache: Optional[NegativeCache] = None,
+                           client: Optional[AsyncPubchemClient] = None,
+                           dedup: Optional[DedupIndex] = None) -> Optional[List[Dict]]:
+    """Search for pKa in the local database, then Pubchem, see search_pka().
+    Local lookups and inserts are not awaited: they are fast with an indexed
+    database (IndexedDB, SQLiteDB, Snapshot) and keep the database in one thread
+
+    Parameters
+    ----------
+    identifier : str
+        search string, see search_pka()
+    database : tinyDB tiny.database object, IndexedDB or SQLiteDB
+        local database
+    negative_cache : Optional[NegativeCache], optional
+        see search_pka()
+    client : Optional[AsyncPubchemClient], optional
+        see async_pka_lookup_pubchem()
+    dedup : Optional[DedupIndex], optional
+        see search_pka()
+
+    Returns
+    -------
+    Optional[List[Dict]]
+        same as search_pka()
+    """
+    try:
+        # Search local DB first:
+        db_result = search_db(identifier=identifier, database=database)
+        if db_result:
+            return [record for _, record in db_result]
+
+        on_miss = None
+        if negative_cache is not None:
+            if identifier in negative_cache:
+                return None
+            on_miss = negative_cache.add
+
+        pubchem_result = await async_pka_lookup_pubchem(identifier, client=client, on_miss=on_miss)
+        return add_pubchem_result(pubchem_result=pubchem_result, database=database, dedup=dedup)
+
+    except Exception as error:
+        if debug:
+            traceback_str = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+            print(traceback_str)
+
+        return None
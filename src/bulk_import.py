@@ -0,0 +1,249 @@
+"""
+Fill the local database from a downloaded Pubchem annotation export of the
+'Dissociation Constants' heading, instead of one compound at a time on search misses.
+
+The export is the PUG-View annotations of the heading, for all compounds, e.g. the pages of
+    https://pubchem.ncbi.nlm.nih.gov/rest/pug_view/annotations/heading/JSON?heading=Dissociation+Constants&page=1
+saved as JSON (one page per file, or one annotation per line in a .jsonl file) or XML.
+XML files and .jsonl files are read as a stream; a JSON page is read at once.
+
+Annotations only link values to CIDs: the identifiers of the compounds (InChI, InChIKey,
+SMILES, IUPAC name, CAS) are read from a property table (`properties_path`, CSV with a
+'CID' column and Pubchem property names, e.g. a PUG-REST .../property/InChI,InChIKey,CanonicalSMILES,
+IsomericSMILES,IUPACName/CSV download, plus an optional 'CAS' column). With `fetch_missing`,
+the identifiers of the other CIDs are requested from Pubchem in batches of up to 200 CIDs.
+
+Records are the same as what pka_lookup_pubchem() returns (first value of each compound,
+every value in 'pKa_values'). Compounds without InChIKey, or whose InChIKey is already
+in the local database, are skipped. The export is not held in memory: records are
+inserted BATCH_SIZE compounds at a time as the annotations are read.
+
+Usage:
+    python src/bulk_import.py annotations_page*.json --properties properties.csv [--fetch-missing]
+"""
+
+import argparse
+import csv
+import json
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pubchem_api
+from negative_cache import NegativeCache
+from pka_lookup_pubchem import PROPERTIES, _pka_record, _request
+
+
+# Compounds inserted into the local database at a time
+BATCH_SIZE = 1000
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _values_of_json(annotation: Dict) -> Iterator[Tuple[str, str]]:
+    for data in annotation.get('Data', []):
+        strings = data.get('Value', {}).get('StringWithMarkup', [])
+        value = ''.join(string.get('String', '') for string in strings)
+        if value:
+            reference = data.get('Reference') or [annotation.get('SourceName', '')]
+            yield '; '.join(reference) if isinstance(reference, list) else reference, value
+
+
+def _annotations_of_json(document) -> Iterator[Dict]:
+    if isinstance(document, list):
+        for item in document:
+            yield from _annotations_of_json(item)
+    elif 'Annotations' in document:
+        yield from document['Annotations'].get('Annotation', [])
+    else:
+        yield document
+
+
+def _iter_json(path: str) -> Iterator[Tuple[List[int], List[Tuple[str, str]]]]:
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            documents = (json.loads(line) for line in f if line.strip())
+        else:
+            documents = [json.load(f)]
+        for document in documents:
+            for annotation in _annotations_of_json(document):
+                yield annotation.get('LinkedRecords', {}).get('CID', []), list(_values_of_json(annotation))
+
+
+def _iter_xml(path: str) -> Iterator[Tuple[List[int], List[Tuple[str, str]]]]:
+    for _, element in ET.iterparse(path, events=('end',)):
+        if _local_name(element.tag) != 'Annotation':
+            continue
+        cids = [int(cid.text) for cid in element.iter() if _local_name(cid.tag) == 'CID']
+        source = next((child.text for child in element if _local_name(child.tag) == 'SourceName'), '')
+        values = []
+        for data in (child for child in element if _local_name(child.tag) == 'Data'):
+            references = [child.text for child in data if _local_name(child.tag) == 'Reference' and child.text]
+            value = ''.join(string.text or '' for string in data.iter() if _local_name(string.tag) == 'String')
+            if value:
+                values.append(('; '.join(references) or source, value))
+        yield cids, values
+        # Only one annotation is kept in memory at a time
+        element.clear()
+
+
+def iter_annotations(path: str) -> Iterator[Tuple[List[int], List[Tuple[str, str]]]]:
+    """Yield (CIDs, [(reference, value), ...]) of every annotation of an export file (.json, .jsonl or .xml)"""
+    return _iter_xml(path) if path.endswith('.xml') else _iter_json(path)
+
+
+def read_properties(path: str, cids: Optional[Iterable[int]] = None) -> Dict[int, Dict]:
+    """Return {CID: properties} of a property table (CSV, see above), only of `cids` if given"""
+    wanted = set(cids) if cids is not None else None
+    properties = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            cid = int(row.pop('CID'))
+            if wanted is None or cid in wanted:
+                properties[cid] = {key: value for key, value in row.items() if value}
+    return properties
+
+
+def fetch_properties(cids: Iterable[int]) -> Dict[int, Dict]:
+    """Return {CID: properties (with 'CAS' if found in the synonyms)} requested from Pubchem in batches"""
+    properties = {}
+    for batch in pubchem_api.cid_batches(cids):
+        for compound in _request(pubchem_api.get_properties, PROPERTIES, batch):
+            properties[compound.pop('CID')] = compound
+        for information in _request(pubchem_api.get_synonyms, batch):
+            cas = next((synonym for synonym in information.get('Synonym') or []
+                        if re.search(r'^\d{2,7}-\d{2}-\d$', synonym)), None)
+            if cas and information['CID'] in properties:
+                properties[information['CID']]['CAS'] = cas
+    return properties
+
+
+def _import_batch(batch: Dict[int, List[Tuple[str, str]]], database, table: Dict[int, Dict],
+                  fetch_missing: bool, negative_cache: Optional[NegativeCache], existing: set,
+                  added: Dict[int, Optional[int]], skipped: Dict[str, set]) -> None:
+    """Add the compounds of a batch {CID: [(reference, value), ...]} with their properties
+    in the property `table` {CID: properties}, see bulk_import()"""
+    new_cids = [cid for cid in batch if cid not in added]
+    properties = {cid: table[cid] for cid in new_cids if cid in table}
+    if fetch_missing:
+        properties.update(fetch_properties([cid for cid in new_cids if cid not in properties]))
+
+    cids = []
+    records = []
+    for cid, cid_values in batch.items():
+        pka_values = [(reference, re.sub(r'^pKa = ', '', value)) for reference, value in cid_values]
+        if cid in added:
+            # Compound met again (e.g. annotation of another source): its values are added to its record
+            if added[cid] is not None and pka_values:
+                record = database.get(doc_id=added[cid])
+                database.update({'pKa_values': record['pKa_values'] + [{'pKa': pka, 'reference': reference}
+                                                                       for reference, pka in pka_values]},
+                                doc_ids=[added[cid]])
+            continue
+
+        compound = dict(properties.get(cid, {}))
+        inchikey = compound.get('InChIKey')
+        if not (inchikey and pka_values):
+            skipped['no_identifiers'].add(cid)
+            continue
+        skipped['no_identifiers'].discard(cid)
+        if inchikey in existing:
+            skipped['existing'].add(cid)
+            continue
+        existing.add(inchikey)
+
+        cas = compound.pop('CAS', None)
+        record = _pka_record(cid, [cas] if cas else [], compound, pka_values, all_values=True)
+        cids.append(cid)
+        records.append(record)
+        if negative_cache is not None:
+            for identifier in (record.get('Substance_CASRN'), inchikey, record.get('InChI')):
+                if identifier:
+                    negative_cache.remove(identifier)
+
+    if records:
+        doc_ids = database.insert_multiple(records)
+        # A WriteBehindDB does not return the ids: later values of these compounds are not added
+        added.update(zip(cids, doc_ids if doc_ids else [None] * len(cids)))
+
+
+def bulk_import(paths: Iterable[str], database, properties_path: Optional[str] = None,
+                fetch_missing: bool = False, negative_cache: Optional[NegativeCache] = None) -> Dict[str, int]:
+    """Add the compounds of a Dissociation Constants annotation export into the local database
+
+    The export is streamed: compounds are added in batches of BATCH_SIZE as annotations are read,
+    only the CIDs (and ids of the records added) and the property table, read once, are kept
+    for the whole import.
+
+    Parameters
+    ----------
+    paths : Iterable[str]
+        export files (.json, .jsonl or .xml)
+    database : tinyDB tiny.database object, IndexedDB, SQLiteDB or WriteBehindDB
+        local database the new records are added to
+    properties_path : Optional[str], optional
+        property table of the compounds (CSV, see above), by default none
+    fetch_missing : bool, optional
+        request the properties of the compounds not in the property table from Pubchem, by default False
+    negative_cache : Optional[NegativeCache], optional
+        identifiers of the records added are removed from it (they now have a pKa)
+
+    Returns
+    -------
+    Dict[str, int]
+        counts: 'annotations' read, 'compounds' found in them, 'added' records,
+        'existing' (InChIKey already in the database) and 'no_identifiers' (no InChIKey) compounds
+    """
+    annotations = 0
+    compounds = set()
+    existing = set(record.get('InChIKey') for record in database.all())
+    # Records of a WriteBehindDB not written yet
+    existing.update(record.get('InChIKey') for record in getattr(database, 'pending', []))
+    # CID: id of the record added (None if unknown)
+    added = {}
+    skipped = {'existing': set(), 'no_identifiers': set()}
+
+    table = read_properties(properties_path) if properties_path else {}
+
+    # CID: [(reference, value), ...], in the order of the export, for up to BATCH_SIZE compounds
+    batch = {}
+    for path in paths:
+        for cids, annotation_values in iter_annotations(path):
+            annotations += 1
+            for cid in cids:
+                compounds.add(cid)
+                batch.setdefault(cid, []).extend(annotation_values)
+            if len(batch) >= BATCH_SIZE:
+                _import_batch(batch, database, table, fetch_missing, negative_cache, existing, added, skipped)
+                batch = {}
+    if batch:
+        _import_batch(batch, database, table, fetch_missing, negative_cache, existing, added, skipped)
+
+    return {
+        'annotations': annotations,
+        'compounds': len(compounds),
+        'added': len(added),
+        'existing': len(skipped['existing']),
+        'no_identifiers': len(skipped['no_identifiers']),
+    }
+
+
+if __name__ == "__main__":
+    from sqlite_db import SQLiteDB
+
+    parser = argparse.ArgumentParser(description='Import a Pubchem Dissociation Constants annotation export')
+    parser.add_argument('paths', nargs='+', help='export files (.json, .jsonl or .xml)')
+    parser.add_argument('--properties', help='CSV of the compound properties, with a CID column')
+    parser.add_argument('--fetch-missing', action='store_true',
+                        help='request the properties of the other compounds from Pubchem')
+    parser.add_argument('--db', default='src/data/pka_db.sqlite3', help='local database (SQLite)')
+    args = parser.parse_args()
+
+    db = SQLiteDB(args.db)
+    try:
+        print(bulk_import(args.paths, db, properties_path=args.properties, fetch_missing=args.fetch_missing,
+                          negative_cache=NegativeCache(db.table('negative_cache'))))
+    finally:
+        db.close()
@@ -0,0 +1,129 @@
+"""
+Search pKa for a very large number of identifiers with several processes.
+
+Matching identifiers against the local dataset is CPU bound, so one Python process
+is the limit. Here worker processes each attach to the same memory-mapped Snapshot
+of the dataset (see snapshot.py: the file pages are shared by the operating system,
+nothing is parsed or copied per worker) and match chunks of identifiers in parallel.
+They only send back the records found and the misses: the parent process alone
+searches the misses in its (writable) local database and Pubchem and writes new
+records, so there is no concurrent write to the database file.
+
+Usage:
+    python src/bulk_search.py identifiers.txt [--processes 4]
+prints the pKa found for each identifier (one per line in identifiers.txt)
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from negative_cache import NegativeCache
+from pka_record import PkaRecord
+from search_pka import search_pka_many
+from snapshot import SNAPSHOT_FILE, Snapshot
+
+
+# Snapshots opened once by each worker process {path: Snapshot} (see _attach_snapshot())
+_snapshots = {}
+
+
+def _attach_snapshot(snapshot_path: str) -> Snapshot:
+    # Opened by the first chunk of each worker: a pool initializer needs Python 3.7
+    if snapshot_path not in _snapshots:
+        _snapshots[snapshot_path] = Snapshot(snapshot_path)
+    return _snapshots[snapshot_path]
+
+
+def _search_chunk(identifiers: List[str], snapshot_path: str) -> Tuple[Dict[str, List[Tuple[int, Dict]]], List[str]]:
+    """Worker: return ({identifier: [(record id, record), ...]}, misses) of a chunk of identifiers"""
+    snapshot = _attach_snapshot(snapshot_path)
+    found = {}
+    misses = []
+    for identifier in identifiers:
+        records = snapshot.lookup(identifier)
+        if records:
+            # Plain dicts are cheaper to send back to the parent process
+            found[identifier] = [(doc_id, dict(record)) for doc_id, record in records]
+        else:
+            misses.append(identifier)
+    return found, misses
+
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def search_pka_parallel(identifiers: Iterable[str], database, snapshot_path: str = SNAPSHOT_FILE,
+                        processes: Optional[int] = None, chunk_size: int = 5000, max_workers: int = 1,
+                        negative_cache: Optional[NegativeCache] = None) -> List[Optional[List[Dict]]]:
+    """Search pKa for many identifiers, matching them against the snapshot in worker processes
+
+    Parameters
+    ----------
+    identifiers : Iterable[str]
+        search strings, see search_pka()
+    database : tinyDB tiny.database object, IndexedDB or SQLiteDB
+        writable local database: the misses of the snapshot are searched in it, then in Pubchem,
+        and new Pubchem records are added into it (by this process only)
+    snapshot_path : str, optional
+        snapshot of the local dataset (see snapshot.py), by default SNAPSHOT_FILE
+    processes : Optional[int], optional
+        number of worker processes, by default the number of CPUs
+    chunk_size : int, optional
+        number of identifiers sent to a worker at a time, by default 5000
+    max_workers : int, optional
+        number of Pubchem lookups running at the same time, see search_pka_many()
+    negative_cache : Optional[NegativeCache], optional
+        see search_pka()
+
+    Returns
+    -------
+    List[Optional[List[Dict]]]
+        one result per input identifier, in the same order (same as search_pka_many())
+    """
+    identifiers = list(identifiers)
+    unique_identifiers = [identifier for identifier in dict.fromkeys(identifiers) if identifier]
+
+    results = {}
+    misses = []
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as executor:
+        for found, chunk_misses in executor.map(_search_chunk, _chunks(unique_identifiers, chunk_size),
+                                                repeat(snapshot_path)):
+            for identifier, records in found.items():
+                results[identifier] = [PkaRecord(record, doc_id) for doc_id, record in records]
+            misses.extend(chunk_misses)
+
+    # Network and writes stay in this process
+    if misses:
+        results.update(zip(misses, search_pka_many(misses, database, max_workers=max_workers,
+                                                   negative_cache=negative_cache)))
+
+    return [results.get(identifier) for identifier in identifiers]
+
+
+if __name__ == "__main__":
+    from sqlite_db import SQLiteDB
+
+    parser = argparse.ArgumentParser(description='Search pKa for many identifiers with several processes')
+    parser.add_argument('identifiers_path', help='text file, one identifier per line')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--snapshot', default=SNAPSHOT_FILE, help='built with python src/snapshot.py')
+    parser.add_argument('--db', default='src/data/pka_db.sqlite3', help='local database (SQLite)')
+    args = parser.parse_args()
+
+    with open(args.identifiers_path, encoding='utf-8') as f:
+        identifiers = [line.strip() for line in f if line.strip()]
+
+    db = SQLiteDB(args.db)
+    try:
+        results = search_pka_parallel(identifiers, db, snapshot_path=args.snapshot, processes=args.processes,
+                                      negative_cache=NegativeCache(db.table('negative_cache')))
+        for identifier, result in zip(identifiers, results):
+            records = result if isinstance(result, list) else [result] if result else []
+            print('{}\t{}'.format(identifier, '; '.join(str(record.get('pKa')) for record in records)))
+    finally:
+        db.close()
@@ -1,57 +1,91 @@
 import re
+from typing import Iterable, List, Optional
 
-def classify(identifier: str) -> str:
+
+# Patterns are compiled once, at import
+
+# https://www.ebi.ac.uk/miriam/main/collections/MIR:00000237
+cas_pattern = re.compile(r'^\d{1,7}\-\d{2}\-\d$')
+
+# The first is reference from: https://gist.github.com/lsauer/1312860/264ae813c2bd2c27a769d261c8c6b38da34e22fb#file-smiles_inchi_annotated-js
+# However, this can be matched with CAS or InChIKey as well
+# >>> smiles_pattern = re.compile(r'^(?!InChI=)[^J][a-zA-Z0-9@+\-\[\]\(\)\\\/%=#$]{1,}$')
+# This will not match CAS or InChIKey.
+# Even then, the solution below can match a lot more strings:
+#     'some non sense'
+#     '123456789',
+#     1234567,
+#     'qwertyui'
+smiles_pattern = re.compile(r'^(?!InChI=)(?!\d{1,7}\-\d{2}\-\d)(?![A-Z]{14}\-[A-Z]{10}(\-[A-Z])?)[^J][a-zA-Z0-9@+\-\[\]\(\)\\\/%=#$]{1,}$')
+
+# https://www.ebi.ac.uk/miriam/main/collections/MIR:00000383
+inchi_pattern = re.compile(r'^InChI\=1S?\/[A-Za-z0-9\.]+(\+[0-9]+)?(\/[cnpqbtmsih][A-Za-z0-9\-\+\(\)\,\/\?\;\.]+)*$')
+
+# https://www.ebi.ac.uk/miriam/main/collections/MIR:00000387
+inchikey_pattern = re.compile(r'^[A-Z]{14}\-[A-Z]{10}(\-[A-Z])?')
+
+
+def classify(identifier: str) -> Optional[str]:
     """Determine the type of chemical indentifier (CAS, smiles, inchi, inchikey)
-    
+
     Parameters
     ----------
     indentifier : str
         a string of chemical indentifier
-    
+
     Returns
     -------
     str
         one of (CAS, smiles, inchi, inchikey)
     """
 
-    # https://www.ebi.ac.uk/miriam/main/collections/MIR:00000237
-    cas_pattern = re.compile(r'^\d{1,7}\-\d{2}\-\d$')
-
-    '''
-    The first is reference from: https://gist.github.com/lsauer/1312860/264ae813c2bd2c27a769d261c8c6b38da34e22fb#file-smiles_inchi_annotated-js
-    However, this can be matched with CAS or InChIKey as well
-    >>> smiles_pattern = re.compile(r'^(?!InChI=)[^J][a-zA-Z0-9@+\-\[\]\(\)\\\/%=#$]{1,}$')
-    This will not match CAS or InChIKey.
-    Even then, the solution below can match a lot more strings: 
-        'some non sense'
-        '123456789',
-        1234567,
-        'qwertyui'
-    '''
-    smiles_pattern = re.compile(r'^(?!InChI=)(?!\d{1,7}\-\d{2}\-\d)(?![A-Z]{14}\-[A-Z]{10}(\-[A-Z])?)[^J][a-zA-Z0-9@+\-\[\]\(\)\\\/%=#$]{1,}$')
-
-    # https://www.ebi.ac.uk/miriam/main/collections/MIR:00000383
-    inchi_pattern = re.compile(r'^InChI\=1S?\/[A-Za-z0-9\.]+(\+[0-9]+)?(\/[cnpqbtmsih][A-Za-z0-9\-\+\(\)\,\/\?\;\.]+)*$')
-
-    # https://www.ebi.ac.uk/miriam/main/collections/MIR:00000387
-    inchikey_pattern = re.compile(r'^[A-Z]{14}\-[A-Z]{10}(\-[A-Z])?')
-
-    # IMPORTANT: careful with the order of the dict since one regex might match more than 1 type
-    # See smiles_pattern above
-    lookup = {
-        'cas': lambda x: cas_pattern.search(x),
-        'inchi': lambda x: inchi_pattern.search(x),
-        'inchikey': lambda x: inchikey_pattern.search(x),
-        'smiles': lambda x: smiles_pattern.search(x),
-    }
-
-    for key, value in lookup.items():
-        if value(identifier):
-            return key
+    # IMPORTANT: careful with the order of the checks since one regex might match more than 1 type
+    # See smiles_pattern above.
+    # Cheap character checks skip the patterns that cannot match:
+    # a CAS number starts with a digit and has dashes
+    if identifier[:1].isdigit() and '-' in identifier and cas_pattern.search(identifier):
+        return 'cas'
+
+    # Only an InChI starts with 'InChI=' (smiles_pattern excludes it)
+    if identifier.startswith('InChI='):
+        return 'inchi' if inchi_pattern.search(identifier) else None
+
+    # An InChIKey has a dash after its first 14 characters
+    if len(identifier) >= 25 and identifier[14] == '-' and inchikey_pattern.search(identifier):
+        return 'inchikey'
+
+    if smiles_pattern.search(identifier):
+        return 'smiles'
+
+    return None
+
+
+def classify_many(identifiers: Iterable[str]) -> List[Optional[str]]:
+    """Classify a whole column of identifiers, see classify().
+    Repeated identifiers are only classified once
+
+    Parameters
+    ----------
+    identifiers : Iterable[str]
+        strings of chemical indentifiers
+
+    Returns
+    -------
+    List[Optional[str]]
+        the type of each identifier, in the same order
+    """
+    types = {}
+    results = []
+    for identifier in identifiers:
+        identifier_type = types.get(identifier, '')
+        if identifier_type == '':
+            identifier_type = types[identifier] = classify(identifier)
+        results.append(identifier_type)
+    return results
 
 
 if __name__ == "__main__":
     print(classify('106-54-7'))
     # print(classify('InChI=1S/C6H12O6/c7-1-2-3(8)4(9)5(10)6(11)12-2/h2-11H,1H2/t2-,3-,4+,5+,6?/m1/s1'))
     # print(classify('VZXOZSQDJJNBRC-UHFFFAOYSA-N'))
-    # print(classify('C1=CC(=CC=C1F)S'))
\ No newline at end of file
+    # print(classify('C1=CC(=CC=C1F)S'))
@@ -0,0 +1,129 @@
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from tinydb.table import Document
+
+
+# Fields that search_db() matches an identifier against
+IDENTIFIER_FIELDS = (
+    'Substance_CASRN',
+    'IUPAC_Name',
+    'InChI',
+    'InChIKey',
+    'Original_SMILES',
+    'Structure_SMILES',
+    'Canonical_SMILES',
+    'Isomeric_SMILES',
+)
+
+
+class IndexedDB:
+    """Wrap a tinyDB database with dict-based inverted indexes on the identifier fields
+
+    The indexes are built once when the wrapper is created and are kept in sync
+    by `insert()` and `update()`, so `lookup()` is a couple of dict lookups instead of a full
+    table scan. Every other attribute is forwarded to the wrapped database,
+    so the wrapper can be used anywhere a tinyDB database is expected.
+
+    Parameters
+    ----------
+    database : tinyDB tiny.database object
+        the database to index
+    fields : Iterable[str], optional
+        the record keys to index, by default IDENTIFIER_FIELDS
+    """
+
+    def __init__(self, database, fields: Iterable[str] = IDENTIFIER_FIELDS):
+        self.database = database
+        self.fields = tuple(fields)
+        self._documents = {}
+        self._indexes = {field: {} for field in self.fields}
+        self.rebuild()
+
+    def __getattr__(self, name):
+        # Only called when the attribute is not found on the wrapper itself
+        return getattr(self.database, name)
+
+    def __len__(self):
+        return len(self._documents)
+
+    def rebuild(self) -> None:
+        """(Re)build all indexes from the content of the wrapped database"""
+        self._documents = {}
+        self._indexes = {field: {} for field in self.fields}
+        for document in self.database.all():
+            self._add(document.doc_id, document)
+
+    def _add(self, doc_id: int, document: Mapping) -> None:
+        self._documents[doc_id] = document
+        for field in self.fields:
+            value = document.get(field)
+            if value:
+                self._indexes[field].setdefault(value, []).append(doc_id)
+
+    def insert(self, document: Mapping) -> int:
+        """Insert a record into the wrapped database and index it
+
+        Returns
+        -------
+        int
+            the id of the new record
+        """
+        doc_id = self.database.insert(document)
+        # Build the Document locally instead of reading the whole table back
+        self._add(doc_id, Document(dict(document), doc_id))
+        return doc_id
+
+    def insert_multiple(self, documents: Iterable[Mapping]) -> List[int]:
+        """Insert records into the wrapped database (in one write) and index them
+
+        Returns
+        -------
+        List[int]
+            the ids of the new records
+        """
+        documents = [dict(document) for document in documents]
+        doc_ids = self.database.insert_multiple(documents)
+        for doc_id, document in zip(doc_ids, documents):
+            self._add(doc_id, Document(document, doc_id))
+        return doc_ids
+
+    def update(self, fields: Mapping, doc_ids: Iterable[int]) -> List[int]:
+        """Update `fields` of the records `doc_ids` in the wrapped database and reindex them
+
+        Returns
+        -------
+        List[int]
+            the ids of the updated records
+        """
+        doc_ids = list(doc_ids)
+        updated = self.database.update(fields, doc_ids=doc_ids)
+        for doc_id in doc_ids:
+            document = self._documents.get(doc_id)
+            if document is None:
+                continue
+            for field in self.fields:
+                value = document.get(field)
+                if value:
+                    self._indexes[field][value].remove(doc_id)
+            self._add(doc_id, Document(dict(document, **fields), doc_id))
+        return updated
+
+    def lookup(self, identifier: str, fields: Optional[Iterable[str]] = None) -> List[Tuple[int, Dict]]:
+        """Return a list of (result'ID, result) whose identifier fields equal `identifier`
+
+        Parameters
+        ----------
+        identifier : str
+            exact value to look up
+        fields : Optional[Iterable[str]], optional
+            restrict the lookup to these indexed fields, by default all of them
+
+        Returns
+        -------
+        List[Tuple[int, Dict]]
+            matched records, in database order (same as a tinyDB search)
+        """
+        doc_ids = set()
+        for field in (fields or self.fields):
+            doc_ids.update(self._indexes[field].get(identifier, ()))
+        return [(doc_id, self._documents[doc_id]) for doc_id in sorted(doc_ids)]
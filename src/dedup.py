@@ -0,0 +1,141 @@
+"""
+Content-hash index of the local database records, to know if a record is already there
+with a set lookup instead of searching the database and comparing whole records.
+
+Two records are duplicates when they have the same InChIKey, source, pKa and reference
+(see record_hash()), whatever their other fields (e.g. the CAS searched).
+
+`deduplicate()` removes the duplicates already in a local database, keeping the first one.
+
+Usage:
+    python src/dedup.py src/data/tinydb_db.json    # or src/data/pka_db.sqlite3
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+from typing import Iterable, List, Mapping, Optional
+
+
+# Fields of a record its content hash is made of
+HASH_FIELDS = ('InChIKey', 'source', 'pKa', 'reference')
+
+
+def record_hash(record: Mapping) -> Optional[str]:
+    """Return the content hash of a record (hex digest of HASH_FIELDS), None if it has no InChIKey"""
+    if not record.get('InChIKey'):
+        return None
+    content = json.dumps([record.get(field) for field in HASH_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class DedupIndex:
+    """Set of the content hashes of the records of a local database
+
+    Built once from the database (one pass) when created, then kept up to date by `add()`
+    when a record is inserted (see add_pubchem_result()), and `discard()` if the insert fails.
+
+    Parameters
+    ----------
+    database : tinyDB tiny.database object, IndexedDB, SQLiteDB or WriteBehindDB, optional
+        the records to index, by default none
+    """
+
+    def __init__(self, database=None):
+        # Pubchem results of several threads can be added at the same time
+        self._lock = threading.Lock()
+        self._hashes = set()
+        if database is not None:
+            self.rebuild(database)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __contains__(self, record: Mapping) -> bool:
+        return record_hash(record) in self._hashes
+
+    def rebuild(self, database) -> None:
+        """(Re)build the index from the records of `database` (and the records not written yet of a WriteBehindDB)"""
+        hashes = set(record_hash(record) for record in database.all())
+        hashes.update(record_hash(record) for record in getattr(database, 'pending', []))
+        hashes.discard(None)
+        with self._lock:
+            self._hashes = hashes
+
+    def add(self, record: Mapping) -> bool:
+        """Index a record, return False if it was already indexed (or has no InChIKey).
+        Checking and adding is atomic: of several threads adding the same record, only one gets True"""
+        content_hash = record_hash(record)
+        if content_hash is None:
+            return False
+        with self._lock:
+            if content_hash in self._hashes:
+                return False
+            self._hashes.add(content_hash)
+            return True
+
+    def discard(self, record: Mapping) -> None:
+        """Remove a record from the index (e.g. indexed by `add()` but its insert failed)"""
+        with self._lock:
+            self._hashes.discard(record_hash(record))
+
+
+def find_duplicates(records: Iterable[Mapping]) -> List[int]:
+    """Return the doc_id of every record that duplicates a record before it (by doc_id)"""
+    seen = set()
+    duplicates = []
+    for record in sorted(records, key=lambda record: record.doc_id):
+        content_hash = record_hash(record)
+        if content_hash is None:
+            continue
+        if content_hash in seen:
+            duplicates.append(record.doc_id)
+        else:
+            seen.add(content_hash)
+    return duplicates
+
+
+def deduplicate(database, dry_run: bool = False) -> List[int]:
+    """Remove the duplicated records of a local database, only the first (lowest doc_id) of each is kept
+
+    Parameters
+    ----------
+    database : tinyDB tiny.database object, IndexedDB, SQLiteDB or WriteBehindDB
+        local database to clean. The records not written yet of a WriteBehindDB are written first
+    dry_run : bool, optional
+        only find the duplicates, by default False
+
+    Returns
+    -------
+    List[int]
+        doc_id of the duplicated records (removed unless `dry_run`)
+    """
+    if hasattr(database, 'flush'):
+        database.flush()
+    duplicates = find_duplicates(database.all())
+    if duplicates and not dry_run:
+        database.remove(doc_ids=duplicates)
+        # Indexes of an IndexedDB are not kept in sync by remove()
+        if hasattr(database, 'rebuild'):
+            database.rebuild()
+    return duplicates
+
+
+if __name__ == "__main__":
+    from tinydb import TinyDB
+
+    from sqlite_db import SQLiteDB
+
+    parser = argparse.ArgumentParser(description='Remove the duplicated records of a local database')
+    parser.add_argument('path', nargs='?', default='src/data/tinydb_db.json',
+                        help='tinyDB JSON file (.json) or SQLite database')
+    parser.add_argument('--dry-run', action='store_true', help='only count the duplicates')
+    args = parser.parse_args()
+
+    db = TinyDB(args.path) if args.path.endswith('.json') else SQLiteDB(args.path)
+    try:
+        duplicates = deduplicate(db, dry_run=args.dry_run)
+        print('{} duplicated records {}'.format(len(duplicates), 'found' if args.dry_run else 'removed'))
+    finally:
+        db.close()
@@ -0,0 +1,185 @@
+"""
+Timing of the stages of a lookup and counters, to find where slow lookups spend their time.
+
+Disabled by default: `span()` then returns one shared no-op context manager and `count()`
+returns at once, so the instrumented code pays a function call and nothing else.
+Once enabled, every stage (classify, search_db, each Pubchem request, the wait for the
+rate limiter, the pKa XML parse, the insert into the local database, ...) is timed and
+the counters (local hits, Pubchem requests, retries, misses, errors) are kept.
+
+Usage:
+    metrics = instrumentation.enable()
+    search_pka_many(identifiers, db)
+    print(metrics.report())           # summary of the batch
+    print(metrics.to_prometheus())    # Prometheus text exposition format
+    instrumentation.disable()
+
+Spans can also be sent elsewhere with hooks, e.g. to OpenTelemetry:
+    instrumentation.enable(hooks=[opentelemetry_hook(trace.get_tracer('pka_lookup'))])
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional
+
+
+# Called as hook(stage, start (ns since the epoch), duration (s), attributes, error or None) at the end of a span
+Hook = Callable[[str, int, float, Dict, Optional[BaseException]], None]
+
+
+class _NullSpan:
+    """Span doing nothing, while disabled (contextlib.nullcontext needs Python 3.7)"""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+# Metrics collected, None when disabled
+_metrics = None
+
+
+class Metrics:
+    """Timing of each stage and counters, shared by every thread
+
+    Parameters
+    ----------
+    hooks : Iterable[Hook], optional
+        called at the end of every span, by default none
+    """
+
+    def __init__(self, hooks: Iterable[Hook] = ()):
+        self.hooks = list(hooks)
+        self._lock = threading.Lock()
+        # stage: [count, total, min, max, errors]
+        self._stages = {}
+        self._counters = {}
+
+    @contextmanager
+    def span(self, stage: str, **attributes):
+        """Time the code run inside `with metrics.span(stage):`"""
+        # time.time_ns() needs Python 3.7
+        start_ns = int(time.time() * 1e9)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as exception:
+            error = exception
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self._record(stage, duration, error is not None)
+            for hook in self.hooks:
+                hook(stage, start_ns, duration, attributes, error)
+
+    def _record(self, stage: str, duration: float, failed: bool) -> None:
+        with self._lock:
+            timing = self._stages.get(stage)
+            if timing is None:
+                self._stages[stage] = [1, duration, duration, duration, int(failed)]
+            else:
+                timing[0] += 1
+                timing[1] += duration
+                timing[2] = min(timing[2], duration)
+                timing[3] = max(timing[3], duration)
+                timing[4] += failed
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def stages(self) -> Dict[str, Dict[str, float]]:
+        """Return {stage: {'count', 'total', 'mean', 'min', 'max', 'errors'}} (times in seconds)"""
+        with self._lock:
+            return {stage: {'count': count, 'total': total, 'mean': total / count,
+                            'min': minimum, 'max': maximum, 'errors': errors}
+                    for stage, (count, total, minimum, maximum, errors) in self._stages.items()}
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def report(self) -> str:
+        """Return a summary table of the stages (slowest in total first) and the counters"""
+        lines = ['{:<20} {:>8} {:>12} {:>12} {:>12} {:>7}'.format(
+            'stage', 'count', 'total (ms)', 'mean (ms)', 'max (ms)', 'errors')]
+        stages = sorted(self.stages().items(), key=lambda item: item[1]['total'], reverse=True)
+        for stage, timing in stages:
+            lines.append('{:<20} {:>8} {:>12.2f} {:>12.3f} {:>12.3f} {:>7}'.format(
+                stage, timing['count'], timing['total'] * 1e3, timing['mean'] * 1e3,
+                timing['max'] * 1e3, timing['errors']))
+        for name, value in sorted(self.counters().items()):
+            lines.append('{:<20} {:>8}'.format(name, value))
+        return '\n'.join(lines)
+
+    def to_prometheus(self, prefix: str = 'pka_lookup') -> str:
+        """Return the metrics in the Prometheus text exposition format"""
+        lines = [
+            f'# HELP {prefix}_stage_seconds Time spent in each stage of a lookup.',
+            f'# TYPE {prefix}_stage_seconds summary',
+        ]
+        stages = self.stages()
+        for stage, timing in sorted(stages.items()):
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {timing["total"]!r}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {timing["count"]}')
+        lines += [
+            f'# HELP {prefix}_stage_errors_total Stages that raised an exception.',
+            f'# TYPE {prefix}_stage_errors_total counter',
+        ]
+        for stage, timing in sorted(stages.items()):
+            lines.append(f'{prefix}_stage_errors_total{{stage="{stage}"}} {timing["errors"]}')
+        for name, value in sorted(self.counters().items()):
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines.append(f'{prefix}_{name}_total {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def enable(hooks: Iterable[Hook] = ()) -> Metrics:
+    """Start collecting metrics (again from zero), return them"""
+    global _metrics
+    _metrics = Metrics(hooks)
+    return _metrics
+
+
+def disable() -> None:
+    global _metrics
+    _metrics = None
+
+
+def metrics() -> Optional[Metrics]:
+    """Return the metrics being collected, None if disabled"""
+    return _metrics
+
+
+def span(stage: str, **attributes):
+    """Context manager timing `stage`, a no-op when disabled"""
+    if _metrics is None:
+        return _NULL_SPAN
+    return _metrics.span(stage, **attributes)
+
+
+def count(name: str, value: int = 1) -> None:
+    """Add `value` to the counter `name`, a no-op when disabled"""
+    if _metrics is not None:
+        _metrics.count(name, value)
+
+
+def opentelemetry_hook(tracer) -> Hook:
+    """Return a hook sending every span to an OpenTelemetry `tracer` (opentelemetry-api, optional)"""
+    def hook(stage, start_ns, duration, attributes, error):
+        otel_span = tracer.start_span(stage, start_time=start_ns, attributes=attributes)
+        if error is not None:
+            otel_span.record_exception(error)
+        otel_span.end(end_time=start_ns + int(duration * 1e9))
+
+    return hook
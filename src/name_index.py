@@ -0,0 +1,212 @@
+"""
+Case- and punctuation-insensitive index of compound names (IUPAC_Name, Substance_Name of
+the records and synonyms) to InChIKeys, for exact, prefix (type-ahead) and fuzzy name queries.
+
+Names are compared by their key: lowercase letters and digits only ('Acetic Acid',
+'acetic-acid' and 'ACETIC ACID' are all 'aceticacid'), except short keys (element symbols,
+abbreviations) that an exact lookup compares case-sensitively ('Co' is not 'CO'). Prefix queries bisect the sorted
+keys; fuzzy queries rank the names sharing trigrams of the query (trigram index) by
+their Dice similarity.
+
+Usage:
+    names = NameIndex.from_database(db)
+    names.complete('acetic ac')    # [('acetic acid', ['QTBSBXVTEAMEQO-UHFFFAOYSA-N']), ...]
+    names.fuzzy('acetc acid')      # [('acetic acid', ['QTBSBXVTEAMEQO-UHFFFAOYSA-N'], 0.8), ...]
+"""
+
+import bisect
+import re
+import threading
+from collections import Counter
+from typing import Iterable, List, Mapping, Optional, Tuple
+
+from classify import classify
+
+
+# Fields of a record indexed as names
+NAME_FIELDS = ('IUPAC_Name', 'Substance_Name')
+
+# Placeholder names of the local dataset ('NoName_699'), not indexed
+placeholder_pattern = re.compile(r'^NoName_\d+$')
+
+# Keys up to this length are only looked up with the same case (e.g. 'Co', cobalt, is not 'CO' or 'co')
+SHORT_KEY = 3
+
+# SMILES syntax not found in a name written without whitespace: bonds, stereo, ring closures ('c1c')
+smiles_syntax_pattern = re.compile(r'[=#@\\/$%]|[A-Za-z\])]\d')
+
+
+def name_key(name: str) -> str:
+    """Return the key a name is compared by: its lowercase letters and digits"""
+    return re.sub(r'[\W_]+', '', name.casefold())
+
+
+def _spelling(name: str) -> str:
+    """Letters and digits of a name, case kept (compared for short keys)"""
+    return re.sub(r'[\W_]+', '', name)
+
+
+def looks_like_name(identifier: str) -> bool:
+    """Return False for identifiers that are not names: CAS numbers, InChI, InChIKeys and SMILES
+    with SMILES-only syntax (classify() also reports single words such as 'benzene' as SMILES)"""
+    if not identifier or classify(identifier) in ('cas', 'inchi', 'inchikey'):
+        return False
+    return bool(re.search(r'\s', identifier.strip())) or not smiles_syntax_pattern.search(identifier)
+
+
+def trigrams(key: str) -> List[str]:
+    """Return the trigrams of a key, padded so that its first and last letters count as much as the others"""
+    padded = '$$' + key + '$'
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class NameIndex:
+    """Index of names to InChIKeys, queried by exact name, prefix or similarity
+
+    Parameters
+    ----------
+    records : Iterable[Mapping], optional
+        records whose NAME_FIELDS are indexed (records without InChIKey are skipped)
+    """
+
+    def __init__(self, records: Iterable[Mapping] = ()):
+        self._lock = threading.Lock()
+        # key: key number
+        self._ids = {}
+        # by key number: key, name as first added, InChIKeys, number of trigrams
+        self._keys = []
+        self._names = []
+        self._inchikeys = []
+        self._sizes = []
+        # trigram: key numbers
+        self._trigrams = {}
+        # key number of a short key: spellings (case kept) added
+        self._spellings = {}
+        # key numbers sorted by key, built on the first prefix query after names were added
+        self._sorted = None
+        self.add_records(records)
+
+    @classmethod
+    def from_database(cls, database) -> 'NameIndex':
+        """Index of every record of a local database (tinyDB, IndexedDB, SQLiteDB or Snapshot)"""
+        return cls(database.all())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, name: str, inchikey: str) -> None:
+        """Index `name` (e.g. a synonym) as a name of the compound `inchikey`"""
+        key = name_key(name) if name else ''
+        if not (key and inchikey):
+            return
+
+        with self._lock:
+            key_id = self._ids.get(key)
+            if key_id is None:
+                key_id = self._ids[key] = len(self._keys)
+                key_trigrams = set(trigrams(key))
+                self._keys.append(key)
+                self._names.append(name.strip())
+                self._inchikeys.append([])
+                self._sizes.append(len(key_trigrams))
+                for trigram in key_trigrams:
+                    self._trigrams.setdefault(trigram, []).append(key_id)
+                self._sorted = None
+            if len(key) <= SHORT_KEY:
+                self._spellings.setdefault(key_id, set()).add(_spelling(name))
+            if inchikey not in self._inchikeys[key_id]:
+                self._inchikeys[key_id].append(inchikey)
+
+    def add_record(self, record: Mapping) -> None:
+        """Index the names of a record (e.g. a Pubchem result added into the local database)"""
+        inchikey = record.get('InChIKey')
+        for field in NAME_FIELDS:
+            name = record.get(field)
+            if name and not placeholder_pattern.match(name):
+                self.add(name, inchikey)
+
+    def add_records(self, records: Iterable[Mapping]) -> None:
+        for record in records:
+            self.add_record(record)
+
+    def add_synonyms(self, inchikey: str, synonyms: Iterable[str]) -> None:
+        """Index the synonyms of the compound `inchikey` (e.g. harvested by pka_lookup_pubchem(on_synonyms=...))"""
+        for synonym in synonyms:
+            self.add(synonym, inchikey)
+
+    def lookup(self, name: str) -> List[str]:
+        """Return the InChIKeys of the compounds named `name` (same key, and same case for a short key), [] if none"""
+        key = name_key(name) if name else ''
+        key_id = self._ids.get(key)
+        if key_id is None or (len(key) <= SHORT_KEY and _spelling(name) not in self._spellings[key_id]):
+            return []
+        return list(self._inchikeys[key_id])
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Tuple[str, List[str]]]:
+        """Return up to `limit` (name, InChIKeys) whose key starts with the key of `prefix`, by key order
+
+        Parameters
+        ----------
+        prefix : str
+            beginning of a name, e.g. what is typed in a type-ahead box
+        limit : int, optional
+            maximum number of names returned, by default 10
+
+        Returns
+        -------
+        List[Tuple[str, List[str]]]
+        """
+        key = name_key(prefix) if prefix else ''
+        if not key:
+            return []
+
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(range(len(self._keys)), key=self._keys.__getitem__)
+                self._sorted_keys = [self._keys[key_id] for key_id in self._sorted]
+            sorted_ids, sorted_keys = self._sorted, self._sorted_keys
+
+        results = []
+        for position in range(bisect.bisect_left(sorted_keys, key), len(sorted_keys)):
+            if len(results) == limit or not sorted_keys[position].startswith(key):
+                break
+            key_id = sorted_ids[position]
+            results.append((self._names[key_id], list(self._inchikeys[key_id])))
+        return results
+
+    def fuzzy(self, name: str, limit: int = 10, min_similarity: float = 0.4) -> List[Tuple[str, List[str], float]]:
+        """Return up to `limit` (name, InChIKeys, similarity) of the names most similar to `name`
+
+        Parameters
+        ----------
+        name : str
+            a name, possibly misspelled or partial
+        limit : int, optional
+            maximum number of names returned, by default 10
+        min_similarity : float, optional
+            minimum Dice similarity (0 to 1, 1 for the same key) of the trigrams, by default 0.4
+
+        Returns
+        -------
+        List[Tuple[str, List[str], float]]
+            most similar first
+        """
+        key = name_key(name) if name else ''
+        if not key:
+            return []
+
+        query_trigrams = set(trigrams(key))
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self._trigrams.get(trigram, ()))
+
+        size = len(query_trigrams)
+        scored = []
+        for key_id, count in shared.items():
+            similarity = 2 * count / (size + self._sizes[key_id])
+            if similarity >= min_similarity:
+                scored.append((similarity, key_id))
+        # Most similar first, then by key for a stable order
+        scored.sort(key=lambda item: (-item[0], self._keys[item[1]]))
+        return [(self._names[key_id], list(self._inchikeys[key_id]), round(similarity, 3))
+                for similarity, key_id in scored[:limit]]
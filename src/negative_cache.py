@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Dict, Optional
+
+from tinydb.table import Document
+
+
+# Reason codes of a Pubchem lookup without result
+NOT_FOUND = 'not_found'              # compound not found in Pubchem
+NO_PKA = 'no_pka'                    # compound found, but without Dissociation Constants section
+NOT_EXACT_MATCH = 'not_exact_match'  # Pubchem compound is not an exact match of the identifier
+
+DEFAULT_TTL = 30 * 24 * 3600    # 30 days, in seconds
+
+
+class NegativeCache:
+    """Remember identifiers known to have no pKa in Pubchem so they are not searched again
+
+    Entries are kept in a tinyDB table (e.g. `db.table('negative_cache')`) so they are
+    saved with the database, and indexed in memory by identifier. Each entry
+    records why the lookup failed and expires after its own time-to-live.
+
+    Parameters
+    ----------
+    table : tinyDB table
+        where entries are saved
+    ttl : float, optional
+        default time-to-live of an entry in seconds, by default DEFAULT_TTL
+    """
+
+    def __init__(self, table, ttl: float = DEFAULT_TTL):
+        self.table = table
+        self.ttl = ttl
+        # Pubchem lookups running in several threads can add entries at the same time
+        self._lock = threading.Lock()
+        self._entries = {entry['identifier']: entry for entry in table.all()}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, identifier: str) -> bool:
+        return self.get(identifier) is not None
+
+    def get(self, identifier: str) -> Optional[Dict]:
+        """Return the entry {'identifier', 'reason', 'expires'} of `identifier`,
+        None if not cached or expired"""
+        entry = self._entries.get(identifier)
+        if entry and entry['expires'] <= time.time():
+            self.remove(identifier)
+            return None
+        return entry
+
+    def add(self, identifier: str, reason: str, ttl: Optional[float] = None) -> None:
+        """Cache `identifier` as a miss for `reason` (one of the reason codes above)"""
+        entry = {
+            'identifier': identifier,
+            'reason': reason,
+            'expires': time.time() + (self.ttl if ttl is None else ttl),
+        }
+        with self._lock:
+            old_entry = self._entries.get(identifier)
+            if old_entry:
+                self.table.update(entry, doc_ids=[old_entry.doc_id])
+                old_entry.update(entry)
+            else:
+                doc_id = self.table.insert(entry)
+                self._entries[identifier] = Document(entry, doc_id)
+
+    def remove(self, identifier: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(identifier, None)
+            if entry:
+                self.table.remove(doc_ids=[entry.doc_id])
+
+    def purge_expired(self) -> int:
+        """Remove all expired entries
+
+        Returns
+        -------
+        int
+            number of entries removed
+        """
+        now = time.time()
+        expired = [identifier for identifier, entry in self._entries.items() if entry['expires'] <= now]
+        for identifier in expired:
+            self.remove(identifier)
+        return len(expired)
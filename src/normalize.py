@@ -0,0 +1,159 @@
+import re
+import threading
+from typing import Iterable, Mapping, Optional
+
+from classify import classify
+from db_index import IDENTIFIER_FIELDS
+from name_index import SHORT_KEY, looks_like_name, name_key
+
+
+# Non-standard InChI layers (fixed H, reconnected metal): such an 'InChI=1/' is not the same as 'InChI=1S/'
+nonstandard_inchi_layers = re.compile(r'/[fr]')
+
+
+def normalize_identifier(identifier: str) -> str:
+    """Return the canonical spelling of an identifier, so equivalent inputs give the same string:
+        - surrounding whitespace removed
+        - CAS number without leading zeros ('0064-19-7' -> '64-19-7')
+        - InChIKey in upper case
+        - 'inchi=' prefix as 'InChI=', and 'InChI=1/' as 'InChI=1S/' when it has no non-standard layer
+    Other identifiers (names, SMILES) are only stripped
+
+    Parameters
+    ----------
+    identifier : str
+        a chemical identifier
+
+    Returns
+    -------
+    str
+        the normalized identifier
+    """
+    identifier = identifier.strip()
+
+    upper = identifier.upper()
+    if upper != identifier and classify(upper) == 'inchikey':
+        return upper
+
+    if identifier[:6].lower() == 'inchi=':
+        identifier = 'InChI=' + identifier[6:]
+        if identifier.startswith('InChI=1/') and not nonstandard_inchi_layers.search(identifier):
+            identifier = 'InChI=1S/' + identifier[len('InChI=1/'):]
+        return identifier
+
+    if classify(identifier) == 'cas':
+        first, rest = identifier.split('-', 1)
+        return '{}-{}'.format(int(first), rest)
+
+    return identifier
+
+
+def _synonym_alias(synonym: str) -> bool:
+    """Return True for the synonyms learned as aliases: CAS numbers and names longer than short
+    tokens (a synonym such as 'CO' or 'Co' must not take the SMILES 'CO' to another compound)"""
+    if classify(synonym) == 'cas':
+        return True
+    return looks_like_name(synonym) and len(name_key(synonym)) > SHORT_KEY
+
+
+class IdentifierNormalizer:
+    """Map identifiers to one canonical key per compound, the InChIKey when it is known
+
+    Identifiers are first normalized (normalize_identifier()), then looked up in an
+    alias map (identifier -> InChIKey) learned from the records found: the identifiers
+    of Pubchem results and the identifiers that matched a single compound locally.
+    So a SMILES written differently from the one saved, already resolved once by
+    Pubchem, is found in the local database by its InChIKey.
+
+    The Pubchem synonyms of the compounds found (learn_synonyms()) are kept apart: a synonym
+    may also be the identifier of another local compound (e.g. a CAS number of its salt),
+    so it is only used when the identifier is not found as it is (see synonym()).
+
+    Aliases are saved in a tinyDB-like table (e.g. `db.table('aliases')`) if given,
+    and kept in memory.
+
+    Parameters
+    ----------
+    table : optional
+        where aliases are saved, by default they are only kept in memory
+    """
+
+    def __init__(self, table=None):
+        self.table = table
+        self._lock = threading.Lock()
+        self._aliases = {}
+        # Pubchem synonyms: InChIKey
+        self._synonyms = {}
+        # alias or synonym: id of its entry in the table
+        self._doc_ids = {}
+        for entry in (table.all() if table is not None else []):
+            aliases = self._synonyms if entry.get('synonym') else self._aliases
+            aliases[entry['alias']] = entry['InChIKey']
+            self._doc_ids[entry['alias']] = entry.doc_id
+
+    def __len__(self):
+        return len(self._aliases) + len(self._synonyms)
+
+    def normalize(self, identifier: str) -> str:
+        return normalize_identifier(identifier)
+
+    def alias(self, identifier: str) -> Optional[str]:
+        """Return the InChIKey learned for the (normalized) `identifier` (alias or synonym), None if unknown"""
+        return self._aliases.get(identifier) or self._synonyms.get(identifier)
+
+    def synonym(self, identifier: str) -> Optional[str]:
+        """Return the InChIKey of the compound the (normalized) `identifier` is a Pubchem synonym of,
+        None if it is not one. Only to be used if `identifier` is not found as it is"""
+        return self._synonyms.get(identifier)
+
+    def canonical_key(self, identifier: str) -> str:
+        """Return the InChIKey of `identifier` if known (synonyms aside), the normalized identifier otherwise"""
+        key = self.normalize(identifier)
+        return self._aliases.get(key, key)
+
+    def learn(self, identifier: str, inchikey: str) -> None:
+        """Remember that the (normalized) `identifier` is the compound `inchikey` (it replaces a synonym)"""
+        if not (identifier and inchikey) or identifier == inchikey or self._aliases.get(identifier) == inchikey:
+            return
+        with self._lock:
+            if self.table is not None:
+                if identifier in self._doc_ids:
+                    self.table.update({'InChIKey': inchikey, 'synonym': False}, doc_ids=[self._doc_ids[identifier]])
+                else:
+                    self._doc_ids[identifier] = self.table.insert({'alias': identifier, 'InChIKey': inchikey})
+            self._synonyms.pop(identifier, None)
+            self._aliases[identifier] = inchikey
+
+    def learn_synonyms(self, inchikey: str, synonyms: Iterable[str]) -> int:
+        """Remember the (normalized) synonyms of the compound `inchikey` (e.g. every Pubchem synonym:
+        names, CAS numbers, registry IDs) as its synonyms (see synonym()), saved in one write.
+        Synonyms already known (as an alias or synonym of this or another compound), SMILES-like
+        and short tokens (e.g. 'CO') are left out
+
+        Returns
+        -------
+        int
+            number of new aliases
+        """
+        if not inchikey:
+            return 0
+        with self._lock:
+            # dict keeps the order of the synonyms, without duplicates
+            new_aliases = dict.fromkeys(alias for alias in (self.normalize(synonym) for synonym in synonyms if synonym)
+                                        if alias and alias != inchikey and alias not in self._aliases
+                                        and alias not in self._synonyms and _synonym_alias(alias))
+            if new_aliases and self.table is not None:
+                doc_ids = self.table.insert_multiple([{'alias': alias, 'InChIKey': inchikey, 'synonym': True}
+                                                      for alias in new_aliases])
+                self._doc_ids.update(zip(new_aliases, doc_ids))
+            self._synonyms.update(dict.fromkeys(new_aliases, inchikey))
+        return len(new_aliases)
+
+    def learn_record(self, record: Mapping, identifier: Optional[str] = None) -> None:
+        """Remember the identifiers of `record` (and the `identifier` that found it) as aliases of its InChIKey"""
+        inchikey = record.get('InChIKey')
+        if not inchikey:
+            return
+        for alias in [record.get(field) for field in IDENTIFIER_FIELDS] + [identifier]:
+            if alias:
+                self.learn(self.normalize(alias), inchikey)
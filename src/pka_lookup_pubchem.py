@@ -15,182 +15,448 @@ Change notes:
 
 import re
 import sys
+import threading
 import traceback
-import xml.etree.ElementTree as ET
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-import pandas as pd
-import pubchempy as pcp  # https://pubchempy.readthedocs.io/en/latest/guide/gettingstarted.html
 import requests
 
+import pubchem_api
 from classify import classify
+from instrumentation import count, span
+from negative_cache import NO_PKA, NOT_EXACT_MATCH, NOT_FOUND
+from pka_record import PkaRecord
+from rate_limiter import RateLimiter
 
 
 debug = False
 
+# Shared by every lookup (including concurrent ones): Pubchem allows at most 5 requests per second
+rate_limiter = RateLimiter(rate=5)
+# Retries (with exponential backoff starting at BACKOFF seconds) when Pubchem answers 503 (server busy)
+MAX_RETRIES = 3
+BACKOFF = 1.0
+# The rest of a pKa (PUG-View) answer not needed is still read, up to this size (bytes),
+# to keep its connection for the next request instead of closing it
+DRAIN_LIMIT = 64 * 1024
+# Threads running the synonyms, properties and pKa requests of pka_lookup_pubchem() calls
+# (3 per call, a few calls at the same time), see _lookup_executor()
+LOOKUP_WORKERS = 6
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _lookup_executor() -> ThreadPoolExecutor:
+    """Return the thread pool shared by every pka_lookup_pubchem() call, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS)
+        return _executor
+
+
+def _request(func, *args, **kwargs):
+    """Call `func` (a Pubchem request) through the shared rate limiter,
+    retrying with exponential backoff while Pubchem answers HTTP 503"""
+    for attempt in range(MAX_RETRIES + 1):
+        with span('rate_limit'):
+            rate_limiter.acquire()
+        count('pubchem_requests')
+        try:
+            # One stage per kind of request: get_cids, get_synonyms, get_properties, get_pka_xml
+            with span(getattr(func, '__name__', 'pubchem_request')):
+                response = func(*args, **kwargs)
+        except requests.HTTPError as error:
+            if error.response.status_code != 503 or attempt == MAX_RETRIES:
+                raise
+        else:
+            if getattr(response, 'status_code', None) != 503 or attempt == MAX_RETRIES:
+                return response
 
-def pka_lookup_pubchem(identifier, namespace=None, domain='compound') -> Optional[str]:
-    global debug
+        delay = BACKOFF * 2 ** attempt
+        if debug:
+            print(f'Pubchem is busy (HTTP 503), retrying in {delay} s')
+        count('pubchem_retries')
+        rate_limiter.pause(delay)
 
-    if len(sys.argv) == 2 and sys.argv[1] in ['--debug=True', '--debug=true', '--debug', '-d']:
-        debug = True
 
-    # if debug:
-    #     print(f'In DEBUG mode: {debug}')
+def _lookup_error(error_class, message: str, reason: str) -> Exception:
+    """Create an `error_class` exception carrying why the lookup has no result (see negative_cache.py)"""
+    error = error_class(message)
+    error.reason = reason
+    return error
 
-    # Identify lookup source (Pubchem in this case)
-    lookup_source = 'Pubchem'
 
-    try:
-        headers = {
-            'user-agent': 'Mozilla/5.0 (X11; CentOS; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/73.0.3683.75 Safari/537.36'}
+# Properties of the compound added to the result
+PROPERTIES = ['InChI', 'InChIKey', 'CanonicalSMILES', 'IsomericSMILES', 'IUPACName']
 
-        # print('Searching Pubchem...')
 
-        # Using pubchem api for python
-        # Getting CID number, the result of this, by default is exact match. The result is returned as a list.
-        cids = []
-        identifier_type = ''
+def _resolve_cid(identifier, namespace, session: requests.Session):
+    """Return (CID, identifier type) of the first Pubchem compound found for `identifier`, CID being None if not found"""
+    # Getting CID number, the result of this, by default is exact match. The result is returned as a list.
+    cids = []
+    identifier_type = ''
 
-        if not namespace:
+    if not namespace:
+        with span('classify'):
             identifier_type = classify(identifier)
-            # print(f'identifier_type determined by classify() is: {identifier_type}')
-
-            # If the input is inchi, inchikey or smiles (this could be a false smiles):
-            if identifier_type in ['smiles', 'inchi', 'inchikey']:
-                lookup = pcp.get_cids(identifier, namespace=identifier_type)
-                if lookup:
-                    cids.append(lookup[0])
-            else:
-                lookup = pcp.get_cids(identifier, namespace='name')
-                if lookup:
-                    cids.append(lookup[0])
-                    # print(f'namespace from pubchem lookup is: {namespace}')
-        elif namespace == 'cas':
-            cids = pcp.get_cids(identifier, namespace='name')
-        else:
-            cids = pcp.get_cids(identifier, namespace=namespace)
+        # print(f'identifier_type determined by classify() is: {identifier_type}')
 
-        if not cids:
-            lookup = pcp.get_cids(identifier, namespace='name')
+        # If the input is inchi, inchikey or smiles (this could be a false smiles):
+        if identifier_type in ['smiles', 'inchi', 'inchikey']:
+            lookup = _request(pubchem_api.get_cids, identifier, namespace=identifier_type, session=session)
             if lookup:
                 cids.append(lookup[0])
+        else:
+            lookup = _request(pubchem_api.get_cids, identifier, namespace='name', session=session)
+            if lookup:
+                cids.append(lookup[0])
+                # print(f'namespace from pubchem lookup is: {namespace}')
+    elif namespace == 'cas':
+        cids = _request(pubchem_api.get_cids, identifier, namespace='name', session=session)
+    else:
+        cids = _request(pubchem_api.get_cids, identifier, namespace=namespace, session=session)
 
-            # cids = pcp.get_cids(identifier, namespace=namespace)
-            identifier_type = namespace
+    if not cids:
+        lookup = _request(pubchem_api.get_cids, identifier, namespace='name', session=session)
+        if lookup:
+            cids.append(lookup[0])
 
-        # print(cids)
+        # cids = pubchem_api.get_cids(identifier, namespace=namespace)
+        identifier_type = namespace
 
-        #  this api return an empty list if it cannot find cas_nr. This is to check if pubchem has this chemical.
-        if len(cids) > 0:
-            # if Pubchem found the result, get the first result of the list
-            cid = cids[0]
-            # print('Compound ID (CID) from PubChem is: {} and type is: {}'.format(cid, type(cid)))
+    # print(cids)
+    # if Pubchem found the result, get the first result of the list
+    return (cids[0] if cids else None), identifier_type
 
-            exact_match = True
 
-            # synonyms = []
-            synonyms = pcp.get_synonyms(cid)[0]['Synonym'] or []
-            
-            # Extract CAS number from the list of synonyms
-            returned_cas = ''
-            for synonym in synonyms:
-                cas_nr = re.search(r'^\d{2,7}-\d{2}-\d$', synonym)
-                if cas_nr:
-                    cas_nr = cas_nr.group()
-                    returned_cas = cas_nr
-                    break
+def _check_exact_match(identifier, identifier_type, synonyms: List[str], properties: Dict) -> None:
+    """Raise ValueError (NOT_EXACT_MATCH) if the compound found in Pubchem is not exactly `identifier`"""
+    exact_match = True
 
-            # lookup_result = []
-            lookup_result = pcp.get_properties(['inchi', 'inchikey',
-                                        'canonical_smiles', 'isomeric_smiles',
-                                        'iupac_name'],
-                                cid)
-
-            if identifier_type == 'cas':
-                # To double check if the CAS number is correct:
-                # using pubchem api, get a list of synonym. The result is a list of dict.
-                # choose the first result and check all values for 'Synonym' key:
-                exact_match = identifier in synonyms
-
-            elif identifier_type in ['inchi', 'inchikey']:
-
-                if identifier_type == 'inchi':
-                    # print(lookup_result[0].get('InChI', False))
-                    # print(f'input:\n{identifier}')
-                    exact_match = (identifier == lookup_result[0].get('InChI', False))
-                
-                elif identifier_type == 'inchikey':
-                    exact_match = (identifier == lookup_result[0].get('InChIKey', False))
-
-            if not exact_match:
-                if debug:
-                    print(f'Exact match between input and Pubchem return value? {identifier in synonyms}')
-                raise ValueError('This is not an exact match on Pubchem!')
+    if identifier_type == 'cas':
+        # To double check if the CAS number is correct:
+        # using pubchem api, get a list of synonym. The result is a list of dict.
+        # choose the first result and check all values for 'Synonym' key:
+        exact_match = identifier in synonyms
 
-            '''
-            get url from Pubchem to get pka lookup result
-            'XML' can be replaced with 'JSON' but it is harder to parse later on
-            for more info about Pubchem output types: https://pubchemdocs.ncbi.nlm.nih.gov/pug-rest$_Toc494865558
-            '''
-            pka_lookup_result_xml = 'https://pubchem.ncbi.nlm.nih.gov/rest/pug_view/data/compound/{}/XML?heading=Dissociation+Constants'.format(cid)
+    elif identifier_type in ['inchi', 'inchikey']:
 
-            # Get the html request info using CID number from pubchem
-            r = requests.get(pka_lookup_result_xml, headers=headers, timeout=15)
-            # Check to see if give OK status (200) and not redirect
-            if r.status_code == 200 and len(r.history) == 0:
-                # print(r.text)
-                # Use python XML to parse the return result
-                tree = ET.fromstring(r.text)
-            
-                # Get the XML tree of <Information> only
-                info_node = tree.find('.//*{http://pubchem.ncbi.nlm.nih.gov/pug_view}Information')
-
-                # Get the pKa reference:
-                original_source = info_node.find('{http://pubchem.ncbi.nlm.nih.gov/pug_view}Reference').text
-                # Get the pKa result:
-                pka_result = info_node.find('.//*{http://pubchem.ncbi.nlm.nih.gov/pug_view}String').text
-                pka_result = re.sub(r'^pKa = ', '', pka_result)    # remove 'pka = ' part out of the string answer
-                # print(pka_result)
-                # print(original_source)
-                # print(lookup_result)
-
-                core_result = {
-                    'source': lookup_source,
-                    'Pubchem_CID': str(cid),
-                    'pKa': pka_result,
-                    'reference': original_source,
-                    'Substance_CASRN': returned_cas,
-                }
-                extra_info = lookup_result[0]
-                extra_info.pop('CID', None)    # Remove 'CID': ... from lookup_result[0]
-
-                # Merge 2 dict: https://treyhunner.com/2016/02/how-to-merge-dictionaries-in-python/
-                result = {**core_result, **extra_info}
-                # Rename some keys in the dict
-                s = pd.Series(result)
-                s = s.rename({
-                    'CanonicalSMILES': 'Canonical_SMILES',
-                    'IsomericSMILES': 'Isomeric_SMILES',
-                    'IUPACName': 'IUPAC_Name'
-                })
-                result = s.to_dict()            
-                return result
-
-            else:
-                raise RuntimeError('pKa not found in Pubchem.')
-    
-        else:
-            raise RuntimeError('Compound not found in Pubchem.')
+        if identifier_type == 'inchi':
+            # print(properties.get('InChI', False))
+            # print(f'input:\n{identifier}')
+            exact_match = (identifier == properties.get('InChI', False))
 
-    except Exception as error:
+        elif identifier_type == 'inchikey':
+            exact_match = (identifier == properties.get('InChIKey', False))
+
+    if not exact_match:
         if debug:
-            traceback_str = ''.join(traceback.format_exception(etype=type(error), value=error, tb=error.__traceback__))
-            print(traceback_str)
+            print(f'Exact match between input and Pubchem return value? {identifier in synonyms}')
+        raise _lookup_error(ValueError, 'This is not an exact match on Pubchem!', NOT_EXACT_MATCH)
+
 
+def _pka_values(r: requests.Response, all_values: bool = False) -> List[Tuple[str, str]]:
+    """Return (reference, pKa) of the first (or every) value of a streamed PUG-View pKa response,
+    raise RuntimeError (NO_PKA) if it has none.
+    The XML is parsed as it is downloaded and, for the first value only, the rest is not parsed"""
+    values = []
+    try:
+        # Check to see if give OK status (200) and not redirect
+        if r.status_code == 200 and len(r.history) == 0:
+            with span('pka_parse'):
+                for reference, pka_result in pubchem_api.iter_pka_values(r.iter_content(pubchem_api.XML_CHUNK_SIZE)):
+                    pka_result = re.sub(r'^pKa = ', '', pka_result)    # remove 'pka = ' part out of the string answer
+                    values.append((reference, pka_result))
+                    if not all_values:
+                        break
+    finally:
+        _release_response(r)
+
+    if not values:
+        raise _lookup_error(RuntimeError, 'pKa not found in Pubchem.', NO_PKA)
+    return values
+
+
+def _release_response(r: requests.Response) -> None:
+    """Close a streamed response, reading what is left first if it is small so the connection can be reused"""
+    length = int(r.headers.get('Content-Length') or 0)
+    if not r.raw.closed and 0 < length <= DRAIN_LIMIT:
+        for _ in r.iter_content(pubchem_api.XML_CHUNK_SIZE):
+            pass
+    r.close()
+
+
+def _pka_record(cid, synonyms: List[str], properties: Dict, values: List[Tuple[str, str]],
+                all_values: bool = False) -> PkaRecord:
+    """Build the result from the (reference, pKa) `values` found (see _pka_values())"""
+    # Identify lookup source (Pubchem in this case)
+    lookup_source = 'Pubchem'
+
+    # Extract CAS number from the list of synonyms
+    returned_cas = ''
+    for synonym in synonyms:
+        cas_nr = re.search(r'^\d{2,7}-\d{2}-\d$', synonym)
+        if cas_nr:
+            cas_nr = cas_nr.group()
+            returned_cas = cas_nr
+            break
+
+    # Get the pKa reference and result of the first value:
+    original_source, pka_result = values[0]
+    # print(pka_result)
+    # print(original_source)
+
+    core_result = {
+        'source': lookup_source,
+        'Pubchem_CID': str(cid),
+        'pKa': pka_result,
+        'reference': original_source,
+        'Substance_CASRN': returned_cas,
+    }
+    if all_values:
+        core_result['pKa_values'] = [{'pKa': pka, 'reference': reference} for reference, pka in values]
+    extra_info = dict(properties)
+    extra_info.pop('CID', None)    # Remove 'CID': ... from the properties
+
+    # Merge 2 dict: https://treyhunner.com/2016/02/how-to-merge-dictionaries-in-python/
+    # and rename the Pubchem property names (e.g. 'CanonicalSMILES' to 'Canonical_SMILES')
+    return PkaRecord.from_pubchem({**core_result, **extra_info})
+
+
+def _close_prefetched(future) -> None:
+    if not future.exception():
+        _release_response(future.result())
+
+
+def _report_miss(identifier, error: Exception, on_miss: Optional[Callable[[str, str], None]]) -> None:
+    """Print the error in debug mode and report why `identifier` has no result to `on_miss`"""
+    if debug:
+        traceback_str = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+        print(traceback_str)
+
+    # A miss is a lookup without result, an error a lookup that failed (e.g. network error)
+    count('pubchem_misses' if getattr(error, 'reason', None) else 'pubchem_errors')
+    if on_miss and getattr(error, 'reason', None):
+        on_miss(identifier, error.reason)
+
+
+def _report_synonyms(record: PkaRecord, synonyms: List[str],
+                     on_synonyms: Optional[Callable[[str, List[str]], None]]) -> None:
+    """Give the synonyms of the compound of a result to `on_synonyms`, with its InChIKey"""
+    if on_synonyms and record.get('InChIKey') and synonyms:
+        on_synonyms(record['InChIKey'], synonyms)
+
+
+def pka_lookup_pubchem(identifier, namespace=None, domain='compound', prefetch_pka: bool = True,
+                       session: Optional[requests.Session] = None,
+                       on_miss: Optional[Callable[[str, str], None]] = None,
+                       all_values: bool = False,
+                       on_synonyms: Optional[Callable[[str, List[str]], None]] = None) -> Optional[PkaRecord]:
+    """Look up pKa of a compound in Pubchem
+
+    Parameters
+    ----------
+    identifier : str
+        search string: CAS number, InChIKey, InChI, IUPAC name or SMILES
+    namespace : optional
+        one of (cas, name, smiles, inchi, inchikey), determined by classify() if not given
+    domain : str, optional
+        by default 'compound'
+    prefetch_pka : bool, optional
+        request pKa at the same time as synonyms and properties, by default True.
+        If False, pKa is only requested after the exact match check passed,
+        which saves a request for identifiers that are not an exact match
+    session : Optional[requests.Session], optional
+        session used for all requests to Pubchem (see pubchem_api.create_session()),
+        by default a session shared by all calls
+    on_miss : Optional[Callable[[str, str], None]], optional
+        called as on_miss(identifier, reason) when Pubchem has no result for `identifier`,
+        reason being one of the reason codes in negative_cache.py (e.g. NegativeCache.add).
+        Not called on errors that may not happen again (e.g. network errors)
+    all_values : bool, optional
+        also return every pKa reported by Pubchem, as 'pKa_values': [{'pKa': ..., 'reference': ...}, ...],
+        by default False: only the first one is read ('pKa' and 'reference')
+    on_synonyms : Optional[Callable[[str, List[str]], None]], optional
+        called as on_synonyms(InChIKey, synonyms) with every synonym Pubchem has for the compound
+        found (names, CAS numbers, registry IDs, ...), e.g. IdentifierNormalizer.learn_synonyms
+
+    Returns
+    -------
+    Optional[PkaRecord]
+        the record found in Pubchem (see search_pka()), None if not found
+    """
+    global debug
+
+    if len(sys.argv) == 2 and sys.argv[1] in ['--debug=True', '--debug=true', '--debug', '-d']:
+        debug = True
+
+    # if debug:
+    #     print(f'In DEBUG mode: {debug}')
+
+    try:
+        # Keep connections to Pubchem alive between requests
+        session = session or pubchem_api.default_session()
+
+        # print('Searching Pubchem...')
+        cid, identifier_type = _resolve_cid(identifier, namespace, session)
+
+        #  this api return an empty list if it cannot find cas_nr. This is to check if pubchem has this chemical.
+        if cid is None:
+            raise _lookup_error(RuntimeError, 'Compound not found in Pubchem.', NOT_FOUND)
+
+        # print('Compound ID (CID) from PubChem is: {} and type is: {}'.format(cid, type(cid)))
+
+        '''
+        get url from Pubchem to get pka lookup result
+        'XML' can be replaced with 'JSON' but it is harder to parse later on
+        for more info about Pubchem output types: https://pubchemdocs.ncbi.nlm.nih.gov/pug-rest$_Toc494865558
+        '''
+        # Synonyms, properties and pKa do not depend on each other: request them at the same time
+        pka_future = None
+        try:
+            executor = _lookup_executor()
+            synonyms_future = executor.submit(_request, pubchem_api.get_synonyms, cid, session=session)
+            lookup_result_future = executor.submit(_request, pubchem_api.get_properties, PROPERTIES,
+                                                   cid, session=session)
+            # Get the html request info using CID number from pubchem
+            pka_future = (executor.submit(_request, pubchem_api.get_pka_xml, cid, session=session, stream=True)
+                          if prefetch_pka else None)
+
+            # synonyms = []
+            synonyms = synonyms_future.result()[0]['Synonym'] or []
+            # lookup_result = []
+            lookup_result = lookup_result_future.result()
+
+            _check_exact_match(identifier, identifier_type, synonyms, lookup_result[0])
+
+            # Only request pKa now (i.e. after an exact match) when it was not prefetched
+            r = (pka_future.result() if pka_future
+                 else _request(pubchem_api.get_pka_xml, cid, session=session, stream=True))
+            # From here, the response is released by _pka_values()
+            pka_future = None
+        finally:
+            if pka_future:
+                # The prefetched pKa is not needed (not an exact match, or another request failed):
+                # release its response when it arrives, so its connection goes back to the pool
+                pka_future.add_done_callback(_close_prefetched)
+
+        record = _pka_record(cid, synonyms, lookup_result[0], _pka_values(r, all_values), all_values)
+        _report_synonyms(record, synonyms, on_synonyms)
+        return record
+
+    except Exception as error:
+        _report_miss(identifier, error, on_miss)
         return None
 
 
+def pka_lookup_pubchem_many(identifiers: Iterable[str], namespace=None, domain='compound',
+                            max_workers: int = 5, session: Optional[requests.Session] = None,
+                            on_miss: Optional[Callable[[str, str], None]] = None,
+                            all_values: bool = False,
+                            on_synonyms: Optional[Callable[[str, List[str]], None]] = None) -> List[Optional[PkaRecord]]:
+    """Look up pKa of many identifiers in Pubchem.
+
+    Identifiers are resolved to CIDs concurrently, then the synonyms and properties
+    of all the CIDs are requested in batches (see pubchem_api.cid_batches()) instead of
+    2 requests per compound, and pKa of the exact matches is requested concurrently.
+    Every request still goes through the shared rate limiter,
+    so the Pubchem usage policy is respected whatever `max_workers` is.
+
+    Parameters
+    ----------
+    identifiers : Iterable[str]
+        search strings, see pka_lookup_pubchem()
+    namespace : optional
+        see pka_lookup_pubchem()
+    domain : str, optional
+        see pka_lookup_pubchem()
+    max_workers : int, optional
+        maximum number of requests running at the same time, by default 5
+    session : Optional[requests.Session], optional
+        see pka_lookup_pubchem(). Its connection pool should be
+        at least max_workers (see pubchem_api.create_session())
+    on_miss : Optional[Callable[[str, str], None]], optional
+        see pka_lookup_pubchem(), may be called from several threads at the same time
+    all_values : bool, optional
+        see pka_lookup_pubchem()
+    on_synonyms : Optional[Callable[[str, List[str]], None]], optional
+        see pka_lookup_pubchem(), called once per compound found
+
+    Returns
+    -------
+    List[Optional[PkaRecord]]
+        one result per input identifier (same order),
+        each is what pka_lookup_pubchem() returns for that identifier
+    """
+    identifiers = list(identifiers)
+    unique_identifiers = list(dict.fromkeys(identifiers))
+    session = session or pubchem_api.default_session()
+    results = dict.fromkeys(unique_identifiers)
+
+    def resolve(identifier):
+        try:
+            cid, identifier_type = _resolve_cid(identifier, namespace, session)
+            if cid is None:
+                raise _lookup_error(RuntimeError, 'Compound not found in Pubchem.', NOT_FOUND)
+            return cid, identifier_type
+        except Exception as error:
+            _report_miss(identifier, error, on_miss)
+            return None
+
+    def get_pka_values(cid):
+        try:
+            return _pka_values(_request(pubchem_api.get_pka_xml, cid, session=session, stream=True), all_values)
+        except Exception as error:
+            return error
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        resolved = {identifier: found
+                    for identifier, found in zip(unique_identifiers, executor.map(resolve, unique_identifiers))
+                    if found}
+        cids = list(dict.fromkeys(cid for cid, _ in resolved.values()))
+
+        # One request per batch of CIDs instead of one per compound
+        synonyms = {}
+        properties = {}
+        for batch in pubchem_api.cid_batches(cids):
+            try:
+                for information in _request(pubchem_api.get_synonyms, batch, session=session):
+                    synonyms[information['CID']] = information.get('Synonym') or []
+                for compound in _request(pubchem_api.get_properties, PROPERTIES, batch, session=session):
+                    properties[compound['CID']] = compound
+            except Exception as error:
+                # The compounds of this batch are reported below as missing synonyms or properties
+                if debug:
+                    print(f'Batch request of {len(batch)} CIDs failed: {error!r}')
+
+        matched = {}
+        for identifier, (cid, identifier_type) in resolved.items():
+            try:
+                _check_exact_match(identifier, identifier_type, synonyms[cid], properties[cid])
+                matched[identifier] = cid
+            except Exception as error:
+                _report_miss(identifier, error, on_miss)
+
+        matched_cids = list(dict.fromkeys(matched.values()))
+        pka_values = dict(zip(matched_cids, executor.map(get_pka_values, matched_cids)))
+
+    reported = set()
+    for identifier, cid in matched.items():
+        try:
+            if isinstance(pka_values[cid], Exception):
+                raise pka_values[cid]
+            results[identifier] = _pka_record(cid, synonyms[cid], properties[cid], pka_values[cid], all_values)
+            if cid not in reported:
+                reported.add(cid)
+                _report_synonyms(results[identifier], synonyms[cid], on_synonyms)
+        except Exception as error:
+            _report_miss(identifier, error, on_miss)
+
+    return [results[identifier] for identifier in identifiers]
+
+
 if __name__ == "__main__":
     import pprint as pp
     # from pprint import pprint as print
@@ -0,0 +1,250 @@
+"""
+Numeric pKa: parse the pKa text of records ('4.76 at 25 °C', 'pKa = 9.99 @ 25 °C', '3.5 +/- 0.1 (in DMSO)', ...)
+into typed values, and query many records by pKa range, acidic/basic type, solvent and temperature.
+
+PkaTable parses every record once, when it is added, into NumPy columns. A pKa range is
+then found by bisecting the sorted pKa column (np.searchsorted) and the other filters are
+vectorized comparisons on the candidates, instead of a Python loop parsing every record.
+
+NumPy is an optional dependency (pip install numpy), only needed by PkaTable.
+
+Usage:
+    table = PkaTable.from_database(db)
+    table.query(min_pka=3, max_pka=5, type='acidic', solvent='H2O')
+"""
+
+import math
+import re
+from typing import Dict, Iterable, List, Mapping, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from pka_record import PkaRecord
+
+
+# A sign right after a digit is a range dash (e.g. '20-25'), not a minus
+NUMBER = r'(?:(?<![\d.])[-+−])?\d+(?:\.\d+)?'
+# Optional constant name ('pKa', 'pKa1', 'pK2', 'pKb', 'Ka', ...), value and power of ten (e.g. 'Ka = 1.8X10-5')
+value_pattern = re.compile(r'(?:\b(pK[ab]?|K[ab])\d*\s*[=:]?\s*)?(' + NUMBER + r')'
+                           r'(?:\s*(?:[xX×*]\s*10\s*\^?\s*|[eE])([-+−]?\d+))?')
+uncertainty_pattern = re.compile(r'(?:±|\+/-|\+-)\s*(\d+(?:\.\d+)?)')
+# A temperature range (e.g. '20-25 °C') gives its middle
+temperature_pattern = re.compile(r'(' + NUMBER + r')(?:\s*[-–]\s*(\d+(?:\.\d+)?))?\s*(?:°\s*|deg(?:rees?)?\.?\s*)C\b',
+                                 re.IGNORECASE)
+solvent_pattern = re.compile(r'\bin\s+((?:\d+\s*%\s*)?[A-Za-z][\w\-]*)')
+# pKb or Kb values, not a pKa (e.g. '4.75 (pKb)')
+basic_constant_pattern = re.compile(r'\bp?Kb\d*\b')
+basic_pattern = re.compile(r'\bp?Kb\d*\b|conjugate acid|\bbas(?:e|ic)\b', re.IGNORECASE)
+acidic_pattern = re.compile(r'\bacid(?:ic)?\b', re.IGNORECASE)
+
+# Spellings of water, all stored as 'H2O'
+WATER = {'h2o', 'water', 'aqueous', 'aq'}
+TYPES = ('acidic', 'basic')
+
+
+def _number(text: str) -> float:
+    return float(text.replace('−', '-'))
+
+
+def normalize_solvent(solvent: Optional[str]) -> Optional[str]:
+    """Return 'H2O' for the spellings of water, `solvent` stripped otherwise"""
+    if not solvent:
+        return None
+    solvent = solvent.strip()
+    return 'H2O' if solvent.lower() in WATER else solvent
+
+
+def parse_pka(text: Optional[str]) -> Dict[str, Optional[object]]:
+    """Parse a pKa text (e.g. 'pKa = 4.76 +/- 0.02 at 25 °C in water') of Pubchem or of the local dataset
+
+    Only the first value of texts with several (e.g. 'pKa1 = 2.15; pKa2 = 7.20') is kept.
+    A Ka (e.g. 'Ka = 1.8X10-5') is converted to its pKa; a pKb or Kb gives no value, the pKa
+    of the conjugate acid depends on the solvent and temperature.
+
+    Parameters
+    ----------
+    text : Optional[str]
+        a pKa as text
+
+    Returns
+    -------
+    Dict[str, Optional[object]]
+        {'value': float, 'uncertainty': float, 'temperature': float (°C), 'solvent': str, 'type': 'acidic' or 'basic'},
+        None for what is not in the text
+    """
+    parsed = dict.fromkeys(['value', 'uncertainty', 'temperature', 'solvent', 'type'])
+    if not text:
+        return parsed
+
+    text = str(text)
+    temperature = temperature_pattern.search(text)
+    if temperature:
+        low, high = temperature.groups()
+        parsed['temperature'] = (_number(low) + _number(high)) / 2 if high else _number(low)
+        # So that the temperature is not taken for the value (e.g. 'at 25 °C: 4.2')
+        text = text[:temperature.start()] + text[temperature.end():]
+
+    value = value_pattern.search(text)
+    if value:
+        constant, number, exponent = value.groups()
+        if constant == 'Ka':
+            ka = _number(number) * 10 ** int(_number(exponent)) if exponent else _number(number)
+            if ka > 0:
+                parsed['value'] = round(-math.log10(ka), 2)
+        elif not basic_constant_pattern.search(text):
+            parsed['value'] = _number(number)
+    uncertainty = uncertainty_pattern.search(text)
+    if uncertainty:
+        parsed['uncertainty'] = float(uncertainty.group(1))
+    solvent = solvent_pattern.search(text)
+    if solvent:
+        parsed['solvent'] = normalize_solvent(solvent.group(1))
+    elif re.search(r'\b(?:H2O|water|aqueous)\b', text, re.IGNORECASE):
+        parsed['solvent'] = 'H2O'
+
+    if basic_pattern.search(text):
+        parsed['type'] = 'basic'
+    elif acidic_pattern.search(text):
+        parsed['type'] = 'acidic'
+    return parsed
+
+
+def parse_record(record: Mapping) -> Dict[str, Optional[object]]:
+    """Parse the pKa of a record (see parse_pka()), completed by its own fields when it has them:
+    'temp' (°C) and 'basicOrAcidic' of the local dataset"""
+    parsed = parse_pka(record.get('pKa'))
+    if parsed['temperature'] is None and record.get('temp'):
+        try:
+            parsed['temperature'] = _number(str(record['temp']))
+        except ValueError:
+            pass
+    if record.get('basicOrAcidic') in TYPES:
+        parsed['type'] = record['basicOrAcidic']
+    return parsed
+
+
+class PkaTable:
+    """Records with their parsed pKa in NumPy columns, for vectorized range and filter queries
+
+    Columns (one row per record): value, uncertainty and temperature (float, NaN if unknown),
+    type and solvent (integer codes). The columns and the pKa sort order are built on the
+    first query after records were added.
+
+    Parameters
+    ----------
+    records : Iterable[Mapping], optional
+        records to add, their `doc_id` is kept if they have one
+    """
+
+    def __init__(self, records: Iterable[Mapping] = ()):
+        if np is None:
+            raise ImportError('PkaTable needs numpy: pip install numpy')
+
+        self.records = []
+        self._rows = []
+        self._solvents = {None: 0}
+        self._columns = None
+        self.add_multiple(records)
+
+    @classmethod
+    def from_database(cls, database) -> 'PkaTable':
+        """Table of every record of a local database (tinyDB, IndexedDB, SQLiteDB or Snapshot)"""
+        return cls(database.all())
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, record: Mapping, doc_id: Optional[int] = None) -> None:
+        """Add a record (parsed now), e.g. a new record added into the local database"""
+        if doc_id is None:
+            doc_id = getattr(record, 'doc_id', None)
+        parsed = parse_record(record)
+        solvent = self._solvents.setdefault(parsed['solvent'], len(self._solvents))
+        self.records.append(PkaRecord(record, doc_id))
+        self._rows.append((parsed['value'], parsed['uncertainty'], parsed['temperature'],
+                           TYPES.index(parsed['type']) + 1 if parsed['type'] else 0, solvent))
+        self._columns = None
+
+    def add_multiple(self, records: Iterable[Mapping]) -> None:
+        for record in records:
+            self.add(record)
+
+    def columns(self) -> Dict[str, 'np.ndarray']:
+        """Return the columns {'value', 'uncertainty', 'temperature', 'type', 'solvent', 'order', 'sorted_value'},
+        'order' being the row numbers sorted by value (NaN last)"""
+        if self._columns is None:
+            nan = float('nan')
+            rows = [tuple(nan if cell is None else cell for cell in row) for row in self._rows]
+            values, uncertainties, temperatures, types, solvents = (zip(*rows) if rows else ((),) * 5)
+            value = np.array(values, dtype=np.float64)
+            order = np.argsort(value, kind='stable')
+            self._columns = {
+                'value': value,
+                'uncertainty': np.array(uncertainties, dtype=np.float64),
+                'temperature': np.array(temperatures, dtype=np.float64),
+                'type': np.array(types, dtype=np.int8),
+                'solvent': np.array(solvents, dtype=np.int32),
+                'order': order,
+                'sorted_value': value[order],
+            }
+        return self._columns
+
+    def query(self, min_pka: Optional[float] = None, max_pka: Optional[float] = None,
+              type: Optional[str] = None, solvent: Optional[str] = None,
+              min_temperature: Optional[float] = None,
+              max_temperature: Optional[float] = None) -> List[PkaRecord]:
+        """Return the records matching every filter given, by increasing pKa
+
+        Parameters
+        ----------
+        min_pka, max_pka : Optional[float], optional
+            pKa range (bounds included)
+        type : Optional[str], optional
+            'acidic' or 'basic'
+        solvent : Optional[str], optional
+            e.g. 'H2O' (any spelling of water), 'DMSO'
+        min_temperature, max_temperature : Optional[float], optional
+            temperature range in °C (bounds included); records without temperature do not match
+
+        Returns
+        -------
+        List[PkaRecord]
+        """
+        return [self.records[row] for row in self.query_rows(min_pka, max_pka, type, solvent,
+                                                             min_temperature, max_temperature)]
+
+    def query_rows(self, min_pka: Optional[float] = None, max_pka: Optional[float] = None,
+                   type: Optional[str] = None, solvent: Optional[str] = None,
+                   min_temperature: Optional[float] = None,
+                   max_temperature: Optional[float] = None) -> 'np.ndarray':
+        """Same as query(), returning the row numbers of the records"""
+        columns = self.columns()
+        sorted_value = columns['sorted_value']
+
+        # The pKa range is a slice of the rows sorted by pKa
+        start = 0 if min_pka is None else np.searchsorted(sorted_value, min_pka, side='left')
+        if max_pka is None:
+            # Rows without pKa (NaN, sorted last) only match when no pKa bound is given
+            end = len(sorted_value) if min_pka is None else np.searchsorted(sorted_value, np.inf, side='right')
+        else:
+            end = np.searchsorted(sorted_value, max_pka, side='right')
+        rows = columns['order'][start:end]
+
+        mask = np.ones(len(rows), dtype=bool)
+        if type is not None:
+            if type not in TYPES:
+                raise ValueError('type is one of {}'.format(TYPES))
+            mask &= columns['type'][rows] == TYPES.index(type) + 1
+        if solvent is not None:
+            code = self._solvents.get(normalize_solvent(solvent))
+            if code is None:
+                return rows[:0]
+            mask &= columns['solvent'][rows] == code
+        if min_temperature is not None:
+            mask &= columns['temperature'][rows] >= min_temperature
+        if max_temperature is not None:
+            mask &= columns['temperature'][rows] <= max_temperature
+        return rows[mask]
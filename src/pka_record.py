@@ -0,0 +1,81 @@
+"""
+Result record of a pKa search, from the local database or from Pubchem.
+"""
+
+from typing import Dict, Iterable, Mapping, Optional
+
+
+# Pubchem property names renamed to the names used by the local database
+PUBCHEM_KEYS = {
+    'CanonicalSMILES': 'Canonical_SMILES',
+    'IsomericSMILES': 'Isomeric_SMILES',
+    'IUPACName': 'IUPAC_Name',
+}
+
+
+class PkaRecord(dict):
+    """A pKa record: a plain dict (so it compares, serializes and is saved
+    like one) with typed accessors to the common fields.
+    `doc_id` is the id of the record in the local database, None for a new record
+
+    Parameters
+    ----------
+    fields : Mapping
+        the fields of the record
+    doc_id : Optional[int], optional
+        id of the record in the local database, by default None
+    """
+
+    __slots__ = ('doc_id',)
+
+    def __init__(self, fields: Mapping = (), doc_id: Optional[int] = None):
+        super().__init__(fields)
+        self.doc_id = doc_id
+
+    @classmethod
+    def from_pubchem(cls, fields: Mapping) -> 'PkaRecord':
+        """Create a record from Pubchem fields, renaming Pubchem property names (see PUBCHEM_KEYS)"""
+        return cls({PUBCHEM_KEYS.get(key, key): value for key, value in fields.items()})
+
+    @property
+    def pka(self) -> Optional[str]:
+        return self.get('pKa')
+
+    @property
+    def reference(self) -> Optional[str]:
+        return self.get('reference')
+
+    @property
+    def source(self) -> Optional[str]:
+        return self.get('source')
+
+    @property
+    def cas(self) -> Optional[str]:
+        return self.get('Substance_CASRN')
+
+    @property
+    def inchikey(self) -> Optional[str]:
+        return self.get('InChIKey')
+
+    def __repr__(self):
+        return 'PkaRecord({}, doc_id={})'.format(dict.__repr__(self), self.doc_id)
+
+
+def to_dataframe(records: Iterable[Dict]):
+    """Return `records` as a pandas DataFrame, one row per record (pandas is only needed here)
+
+    Parameters
+    ----------
+    records : Iterable[Dict]
+        e.g. what search_pka() returns from the local database, or many pka_lookup_pubchem() results
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    try:
+        import pandas as pd
+    except ImportError as error:
+        raise ImportError('to_dataframe() needs pandas: pip install pandas') from error
+
+    return pd.DataFrame([dict(record) for record in records if record])
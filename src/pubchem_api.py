@@ -0,0 +1,193 @@
+"""
+Thin client for the Pubchem PUG-REST and PUG-View services.
+All requests go through one requests.Session, so TCP/TLS connections
+to Pubchem are kept alive and reused between requests.
+"""
+
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+PUG_REST_URL = 'https://pubchem.ncbi.nlm.nih.gov/rest/pug'
+PUG_VIEW_URL = 'https://pubchem.ncbi.nlm.nih.gov/rest/pug_view'
+
+USER_AGENT = 'Mozilla/5.0 (X11; CentOS; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/73.0.3683.75 Safari/537.36'
+TIMEOUT = 15
+
+# Limits of one batch request (a list of CIDs): Pubchem answers up to a few hundred compounds
+# per request and the CID list must stay short enough for a URL in case the request is a GET
+MAX_BATCH_CIDS = 200
+MAX_BATCH_LENGTH = 2000
+
+PUG_VIEW_NS = '{http://pubchem.ncbi.nlm.nih.gov/pug_view}'
+# Size of the pieces of a PUG-View answer read (and parsed) at a time
+XML_CHUNK_SIZE = 8192
+
+_default_session = None
+
+
+def create_session(pool_size: int = 10, retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
+    """Create a session with keep-alive connection pooling and retries for Pubchem
+
+    Parameters
+    ----------
+    pool_size : int, optional
+        maximum number of connections kept open to Pubchem, by default 10.
+        Should be at least the number of threads sharing the session
+    retries : int, optional
+        number of retries on connection errors and HTTP 500/502/504, by default 3.
+        HTTP 503 (server busy) is not retried here but by the caller's rate limiter
+    backoff_factor : float, optional
+        see urllib3 Retry, by default 0.5
+
+    Returns
+    -------
+    requests.Session
+    """
+    retry = Retry(total=retries,
+                  backoff_factor=backoff_factor,
+                  status_forcelist=(500, 502, 504),
+                  # PUG-REST POST requests are searches, i.e. safe to repeat
+                  allowed_methods=frozenset(['GET', 'POST']),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.headers['user-agent'] = USER_AGENT
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def default_session() -> requests.Session:
+    """Return the session shared by all calls that do not pass their own"""
+    global _default_session
+
+    if _default_session is None:
+        _default_session = create_session()
+    return _default_session
+
+
+def _get_json(path: str, data: Optional[Dict] = None, session: Optional[requests.Session] = None) -> Optional[Dict]:
+    """POST (or GET if no `data`) a PUG-REST request and return the JSON answer,
+    None if Pubchem did not find anything (HTTP 404).
+    Other HTTP errors raise requests.HTTPError"""
+    session = session or default_session()
+    url = '{}/{}'.format(PUG_REST_URL, path)
+    if data:
+        r = session.post(url, data=data, timeout=TIMEOUT)
+    else:
+        r = session.get(url, timeout=TIMEOUT)
+
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return r.json()
+
+
+def get_cids(identifier: str, namespace: str = 'name', domain: str = 'compound',
+             session: Optional[requests.Session] = None) -> List[int]:
+    """Return the Pubchem CIDs matching `identifier` (same as pubchempy.get_cids())"""
+    result = _get_json('{}/{}/cids/JSON'.format(domain, namespace), {namespace: identifier}, session)
+    if not result:
+        return []
+    return result.get('IdentifierList', {}).get('CID', [])
+
+
+def _cid_list(cid) -> str:
+    """'1,2,3' for a list of CIDs, the CID itself otherwise"""
+    if isinstance(cid, (list, tuple)):
+        return ','.join(str(one_cid) for one_cid in cid)
+    return cid
+
+
+def cid_batches(cids: Iterable[int], max_cids: int = MAX_BATCH_CIDS,
+                max_length: int = MAX_BATCH_LENGTH) -> Iterator[List[int]]:
+    """Split `cids` into lists small enough for one batch request:
+    at most `max_cids` CIDs, and at most `max_length` characters once joined with commas"""
+    batch = []
+    length = 0
+    for cid in cids:
+        cid_length = len(str(cid)) + 1
+        if batch and (len(batch) == max_cids or length + cid_length > max_length):
+            yield batch
+            batch = []
+            length = 0
+        batch.append(cid)
+        length += cid_length
+    if batch:
+        yield batch
+
+
+def get_synonyms(cid, session: Optional[requests.Session] = None) -> List[Dict]:
+    """Return [{'CID': cid, 'Synonym': [...]}] (same as pubchempy.get_synonyms()).
+    `cid` can also be a list of CIDs (see cid_batches()), answered in one request"""
+    result = _get_json('compound/cid/synonyms/JSON', {'cid': _cid_list(cid)}, session)
+    return result['InformationList']['Information'] if result else []
+
+
+def get_properties(properties: Iterable[str], cid, session: Optional[requests.Session] = None) -> List[Dict]:
+    """Return [{'CID': cid, <property>: value, ...}] (same as pubchempy.get_properties())
+
+    Parameters
+    ----------
+    properties : Iterable[str]
+        Pubchem property names, e.g. 'InChI', 'InChIKey', 'CanonicalSMILES'
+    cid
+        a CID, or a list of CIDs (see cid_batches()) answered in one request
+    """
+    result = _get_json('compound/cid/property/{}/JSON'.format(','.join(properties)), {'cid': _cid_list(cid)}, session)
+    return result['PropertyTable']['Properties'] if result else []
+
+
+def get_pka_xml(cid, session: Optional[requests.Session] = None, stream: bool = False) -> requests.Response:
+    """Return the response of the PUG-View 'Dissociation Constants' section of a compound (XML).
+    With `stream`, only the headers are read: read the body with iter_pka_values(response.iter_content(...))"""
+    session = session or default_session()
+    url = '{}/data/compound/{}/XML'.format(PUG_VIEW_URL, cid)
+    return session.get(url, params={'heading': 'Dissociation Constants'}, timeout=TIMEOUT, stream=stream)
+
+
+def iter_pka_values(chunks: Iterable[bytes]) -> Iterator[Tuple[str, str]]:
+    """Parse a PUG-View 'Dissociation Constants' answer piece by piece
+    and yield (reference, value) of each <Information> node as soon as it is read.
+    Stop iterating after the first value to skip reading and parsing the rest
+
+    Parameters
+    ----------
+    chunks : Iterable[bytes]
+        the XML answer, e.g. response.iter_content(XML_CHUNK_SIZE)
+
+    Yields
+    -------
+    Tuple[str, str]
+        the reference and the text of the value (e.g. 'pKa = 4.76 at 25 °C')
+    """
+    parser = pka_xml_parser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from read_pka_values(parser)
+    parser.close()
+
+
+def pka_xml_parser() -> ET.XMLPullParser:
+    """Return a parser to feed a PUG-View pKa answer to, see read_pka_values()"""
+    return ET.XMLPullParser(events=('end',))
+
+
+def read_pka_values(parser: ET.XMLPullParser) -> Iterator[Tuple[str, str]]:
+    """Yield (reference, value) of the <Information> nodes parsed since the last call, skipping
+    those without reference or text value (see iter_pka_values(), for answers that are not read through an iterable, e.g. with asyncio)"""
+    for _, element in parser.read_events():
+        if element.tag == PUG_VIEW_NS + 'Information':
+            reference = element.find(PUG_VIEW_NS + 'Reference')
+            value = element.find('.//*' + PUG_VIEW_NS + 'String')
+            # Nodes without reference or text value (e.g. a <Number>) are skipped
+            if reference is not None and value is not None:
+                yield reference.text, value.text
+            # Only the values are needed: do not keep the parsed nodes
+            element.clear()
@@ -0,0 +1,51 @@
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """Token bucket rate limiter that can be shared by many threads
+
+    Each `acquire()` takes one token; tokens refill at `rate` per second up to
+    `capacity`. A thread that finds the bucket empty reserves the next token
+    and sleeps until it is due, so concurrent callers never exceed the rate.
+
+    Parameters
+    ----------
+    rate : float, optional
+        tokens (requests) per second, by default 5 (Pubchem usage policy)
+    capacity : Optional[float], optional
+        maximum burst size, by default equal to `rate`
+    """
+
+    def __init__(self, rate: float = 5, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take a token without blocking, return how many seconds to wait before using it
+        (e.g. with `await asyncio.sleep()`)"""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0
+
+    def acquire(self) -> None:
+        """Block until a token is available, then take it"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for `seconds`, e.g. after the server answered 'busy'"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
@@ -0,0 +1,213 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from db_index import IDENTIFIER_FIELDS
+from pka_record import PkaRecord
+
+
+DEFAULT_TTL = 24 * 3600    # 1 day, in seconds
+
+
+class ResultCache:
+    """Cache of search_pka() results, in front of the local database
+
+    Two tiers:
+        - in memory: least recently used entries are evicted when there are more than
+          `max_entries` entries or their results take more than `max_bytes` (JSON size)
+        - on disk (optional): a tinyDB-like table (e.g. `db.table('result_cache', fields=['identifier'])`
+          of a SQLiteDB) that keeps entries across runs; entries evicted from memory are still found there.
+          It holds at most `max_disk_entries` entries: beyond, the expired ones, then the ones expiring
+          first, are removed. A table that does not index 'identifier' (e.g. a tinyDB table) is read
+          once, when the cache is created, to map the identifiers to their entries
+
+    Every entry expires after its own time-to-live. search_pka() invalidates the entries
+    of the identifiers of a new record it adds into the database (see `invalidate_record()`).
+    Counters (hits, misses, evictions, ...) are in `stats()`, to size the cache.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        maximum number of entries in memory, by default 10000
+    max_bytes : int, optional
+        maximum total size (JSON) of the results in memory, by default 32 MB
+    ttl : float, optional
+        default time-to-live of an entry in seconds, by default DEFAULT_TTL
+    table : optional
+        disk tier, by default none
+    max_disk_entries : int, optional
+        maximum number of entries on disk, by default 100000
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 32 * 1024 * 1024,
+                 ttl: float = DEFAULT_TTL, table=None, max_disk_entries: int = 100000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.table = table
+        self.max_disk_entries = max_disk_entries
+        # identifier: ids of its entries on disk, for tables that do not index 'identifier'
+        self._disk_ids = None
+        self._disk_count = 0
+        if table is not None:
+            if 'identifier' in getattr(table, 'fields', ()):
+                self._disk_count = len(table)
+            else:
+                self._disk_ids = {}
+                for entry in table.all():
+                    self._disk_ids.setdefault(entry.get('identifier'), []).append(entry.doc_id)
+                    self._disk_count += 1
+        # identifier: (expires, size, result), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._counters = dict.fromkeys(['hits', 'memory_hits', 'disk_hits', 'misses',
+                                        'evictions', 'disk_evictions', 'expirations', 'invalidations'], 0)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, identifier: str) -> bool:
+        return identifier in self._entries
+
+    def stats(self) -> Dict[str, int]:
+        """Return the counters, plus the number of entries and bytes in memory"""
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bytes=self._bytes)
+
+    def get(self, identifier: str) -> Optional[List[Dict]]:
+        """Return the cached result of `identifier`, None if not cached or expired"""
+        with self._lock:
+            entry = self._entries.get(identifier)
+            if entry is not None:
+                expires, _, result = entry
+                if expires > time.time():
+                    self._entries.move_to_end(identifier)
+                    self._counters['hits'] += 1
+                    self._counters['memory_hits'] += 1
+                    return result
+                self._remove(identifier)
+                self._counters['expirations'] += 1
+
+            if self.table is not None:
+                result = self._disk_get(identifier)
+                if result is not None:
+                    self._counters['hits'] += 1
+                    self._counters['disk_hits'] += 1
+                    return result
+
+            self._counters['misses'] += 1
+            return None
+
+    def put(self, identifier: str, result: List[Dict], ttl: Optional[float] = None) -> None:
+        """Cache the (non empty) result of `identifier`, i.e. a list of local records"""
+        if not result:
+            return
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        serialized = [[getattr(record, 'doc_id', None), dict(record)] for record in result]
+        size = len(json.dumps(serialized, ensure_ascii=False).encode('utf-8'))
+
+        with self._lock:
+            self._memory_put(identifier, expires, size, result)
+            if self.table is not None:
+                self._disk_remove(identifier)
+                doc_id = self.table.insert({'identifier': identifier, 'expires': expires, 'result': serialized})
+                if self._disk_ids is not None:
+                    self._disk_ids[identifier] = [doc_id]
+                self._disk_count += 1
+                if self._disk_count > self.max_disk_entries:
+                    self._disk_prune()
+
+    def invalidate(self, identifiers: Iterable[str]) -> int:
+        """Remove the entries of `identifiers` from both tiers, return how many were in memory"""
+        count = 0
+        with self._lock:
+            for identifier in identifiers:
+                if identifier in self._entries:
+                    self._remove(identifier)
+                    count += 1
+                if self.table is not None:
+                    self._disk_remove(identifier)
+            self._counters['invalidations'] += count
+        return count
+
+    def invalidate_record(self, record: Mapping) -> int:
+        """Remove the entries of every identifier of `record` (e.g. a new record added into the
+        database changes the results of searches by its CAS, InChIKey, SMILES, ...)"""
+        return self.invalidate(set(record.get(field) for field in IDENTIFIER_FIELDS if record.get(field)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self.table is not None:
+                self.table.truncate()
+                if self._disk_ids is not None:
+                    self._disk_ids = {}
+                self._disk_count = 0
+
+    def _memory_put(self, identifier: str, expires: float, size: int, result: List[Dict]) -> None:
+        if identifier in self._entries:
+            self._remove(identifier)
+        if size > self.max_bytes:
+            return
+        self._entries[identifier] = (expires, size, result)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._counters['evictions'] += 1
+
+    def _remove(self, identifier: str) -> None:
+        _, size, _ = self._entries.pop(identifier)
+        self._bytes -= size
+
+    def _disk_entries(self, identifier: str) -> List[Dict]:
+        if self._disk_ids is None:
+            # The table indexes 'identifier' (e.g. `db.table('result_cache', fields=['identifier'])` of a SQLiteDB)
+            return [entry for _, entry in self.table.lookup(identifier, fields=['identifier'])]
+        entries = (self.table.get(doc_id=doc_id) for doc_id in self._disk_ids.get(identifier, ()))
+        return [entry for entry in entries if entry is not None]
+
+    def _disk_get(self, identifier: str) -> Optional[List[Dict]]:
+        entries = self._disk_entries(identifier)
+        if not entries:
+            return None
+        entry = entries[0]
+        if entry['expires'] <= time.time():
+            self._disk_remove(identifier)
+            self._counters['expirations'] += 1
+            return None
+
+        result = [PkaRecord(record, doc_id) for doc_id, record in entry['result']]
+        size = len(json.dumps(entry['result'], ensure_ascii=False).encode('utf-8'))
+        # Promote into the memory tier
+        self._memory_put(identifier, entry['expires'], size, result)
+        return result
+
+    def _disk_remove(self, identifier: str) -> None:
+        if self._disk_ids is None:
+            doc_ids = [entry.doc_id for entry in self._disk_entries(identifier)]
+        else:
+            doc_ids = self._disk_ids.pop(identifier, [])
+        if doc_ids:
+            self.table.remove(doc_ids=doc_ids)
+            self._disk_count -= len(doc_ids)
+
+    def _disk_prune(self) -> None:
+        """Remove the expired entries on disk, then the ones expiring first, down to 90% of
+        max_disk_entries: the table is read once every max_disk_entries / 10 puts at most"""
+        entries = sorted(self.table.all(), key=lambda entry: entry['expires'])
+        keep = max(self.max_disk_entries * 9 // 10, 1)
+        now = time.time()
+        removed = [entry for i, entry in enumerate(entries) if entry['expires'] <= now or len(entries) - i > keep]
+        if not removed:
+            return
+        self.table.remove(doc_ids=[entry.doc_id for entry in removed])
+        self._disk_count = len(entries) - len(removed)
+        self._counters['disk_evictions'] += len(removed)
+        if self._disk_ids is not None:
+            self._disk_ids = {}
+            for entry in entries[len(removed):]:
+                self._disk_ids.setdefault(entry.get('identifier'), []).append(entry.doc_id)
@@ -1,14 +1,22 @@
 # import csv
 import json
+import os
 import sys
 import traceback
 from functools import partial
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-from pka_lookup_pubchem import pka_lookup_pubchem
-from tinydb import Query, TinyDB
-from tinydb.middlewares import CachingMiddleware
-from tinydb.storages import JSONStorage
+from db_index import IDENTIFIER_FIELDS
+from dedup import DedupIndex, record_hash
+from instrumentation import count, span
+from name_index import NameIndex, looks_like_name
+from negative_cache import NegativeCache
+from normalize import IdentifierNormalizer
+from pka_lookup_pubchem import pka_lookup_pubchem, pka_lookup_pubchem_many
+from pka_record import PkaRecord
+from result_cache import ResultCache
+from sqlite_db import SQLiteDB, migrate_tinydb_json
+from tinydb import Query
 
 
 debug = False
@@ -22,7 +30,11 @@ def pprint(nested_element):
     print(style(nested_element))
 
 
-def search_pka(identifier: str, database) -> Optional[List[Tuple[Dict]]]:
+def search_pka(identifier: str, database, negative_cache: Optional[NegativeCache] = None,
+               cache: Optional[ResultCache] = None,
+               normalizer: Optional[IdentifierNormalizer] = None,
+               dedup: Optional[DedupIndex] = None,
+               names: Optional[NameIndex] = None) -> Optional[List[Tuple[Dict]]]:
     """Search for pKa in current local database, if not found
      then search Pubchem. If result is found from Pubchem, then 
      add to the local database
@@ -34,14 +46,35 @@ def search_pka(identifier: str, database) -> Optional[List[Tuple[Dict]]]:
         - CAS number ~ InChIKey ~ InChI > IUPAC name >> SMILES
     database : tinyDB tiny.database object
         the name of the database the search query need
+    negative_cache : Optional[NegativeCache], optional
+        identifiers known to have no result in Pubchem are not searched again.
+        New misses are added into it
+    cache : Optional[ResultCache], optional
+        results of the local database are cached there and returned from there
+        while they are cached. Entries of a record added from Pubchem are invalidated
+    normalizer : Optional[IdentifierNormalizer], optional
+        `identifier` is first mapped to its canonical key (see normalize.py): equivalent
+        identifiers (e.g. two SMILES of the same compound already resolved once) share
+        one cache entry and one local lookup, and all the local records of the compound
+        are returned. Identifiers and synonyms of Pubchem results are learned as aliases,
+        so later searches by any synonym (other CAS numbers, trade names, registry IDs)
+        are answered locally
+    dedup : Optional[DedupIndex], optional
+        content hashes of the local records (see dedup.py): a Pubchem result is only added
+        if its hash is not there (a set lookup). Without it, the records of the same
+        InChIKey are searched in the local database
+    names : Optional[NameIndex], optional
+        names of the local compounds (see name_index.py): if `identifier` is not found as is,
+        it is looked up as a name ignoring case and punctuation (e.g. 'Acetic-Acid', a
+        Substance_Name or a synonym) before searching Pubchem. Names and synonyms of the Pubchem results are added
 
     Returns
     -------
     Optional[List[Tuple[Dict]]]: either
         - The record(s) found in local database in the following format:
             [
-                (record1_id, record1 [Dict]),
-                (record2_id, record2 [Dict]),
+                (record1_id, record1 [PkaRecord]),
+                (record2_id, record2 [PkaRecord]),
                 ...
             ]
         - The record found in Pubchem: i.e.
@@ -64,54 +97,355 @@ def search_pka(identifier: str, database) -> Optional[List[Tuple[Dict]]]:
         debug = True
 
     try:
+        keys = [identifier]
+        if normalizer is not None:
+            identifier = normalizer.canonical_key(identifier)
+            # A Pubchem synonym is only searched by its compound if `identifier` is not found
+            # as it is: it may also be the identifier of another local compound
+            keys = [identifier] + [synonym for synonym in [normalizer.synonym(identifier)] if synonym]
+
         # Search local DB first:
-        db_result = search_db(identifier=identifier, database=database)
+        for key in keys:
+            if cache is not None:
+                cached_result = cache.get(key)
+                if cached_result is not None:
+                    return cached_result
+
+            with span('search_db'):
+                db_result = _local_records(key, database, normalizer, names)
+            if db_result:
+                break
+        count('db_hits' if db_result else 'db_misses')
 
         if db_result:
             # return db_result
-            return [record for _, record in db_result]
-
-        # If record(s) NOT found, search in Pubchem
-        elif not db_result:
-            # Get pubchem result
-            pubchem_result = pka_lookup_pubchem(identifier)
-
-            # Get pubchem result InChIKey
-            pubchem_result_inchikey = pubchem_result.get('InChIKey') if pubchem_result else None
-            
-            # Add pubchem result (if found) into local DB:
-            if pubchem_result_inchikey:
-                '''Use pubchem_result_inchikey to search in current db:
-                A bit redundant to check if current DB has the entry again 
-                but this is for EXACT match'''
-                current_db_result = search_db(identifier=pubchem_result_inchikey, database=db)
-                record_existed = False
-                if current_db_result:
-                    for db_id, result in current_db_result:
-                        if pubchem_result == result:
-                            # Do not add into current db
-                            if debug:
-                                print('Will not add into current DB')    # for trouble shooting
-                            record_existed = True
-                            break
-                
-                # Add record from pubchem
-                if not record_existed:
-                    if debug:
-                        print('Will add into current DB')    # for trouble shooting
-                        # print('Exiting record id with same InChIKey: {}'.format(db_id))    # for trouble shooting
-
-                    # Add into current DB
-                    db.insert(pubchem_result)
-                    return pubchem_result
+            result = [record for _, record in db_result]
+            if cache is not None:
+                cache.put(key, result)
+            return result
+
+        # If record(s) NOT found, search in Pubchem (by the InChIKey if known)
+        return search_pubchem(identifier=keys[-1], database=database, negative_cache=negative_cache, cache=cache,
+                              normalizer=normalizer, dedup=dedup, names=names)
     
     except Exception as error:
+        count('errors')
         if debug:
-            traceback_str = ''.join(traceback.format_exception(etype=type(error), value=error, tb=error.__traceback__))
+            traceback_str = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
             print(traceback_str)
 
         return None
 
+
+def search_pubchem(identifier: str, database, negative_cache: Optional[NegativeCache] = None,
+                   cache: Optional[ResultCache] = None,
+                   normalizer: Optional[IdentifierNormalizer] = None,
+                   dedup: Optional[DedupIndex] = None,
+                   names: Optional[NameIndex] = None) -> Optional[Dict]:
+    """Search Pubchem for pKa and add the result (if found) into the local database
+    
+    Parameters
+    ----------
+    identifier : str
+        search string, see search_pka()
+    database : tinyDB tiny.database object
+        the local database the Pubchem result is added to
+    negative_cache : Optional[NegativeCache], optional
+        see search_pka()
+    cache : Optional[ResultCache], optional
+        see search_pka()
+    normalizer : Optional[IdentifierNormalizer], optional
+        see search_pka()
+    dedup : Optional[DedupIndex], optional
+        see search_pka()
+    names : Optional[NameIndex], optional
+        see search_pka()
+
+    Returns
+    -------
+    Optional[Dict]
+        The record found in Pubchem (see search_pka()), None if not found
+    """
+    if negative_cache is not None:
+        if identifier in negative_cache:
+            count('negative_cache_hits')
+            if debug:
+                print('Known miss in Pubchem: {}'.format(negative_cache.get(identifier)))    # for trouble shooting
+            return None
+        on_miss = negative_cache.add
+    else:
+        on_miss = None
+
+    # Get pubchem result
+    pubchem_result = pka_lookup_pubchem(identifier, on_miss=on_miss, on_synonyms=_synonym_learner(normalizer, names))
+    if pubchem_result and normalizer is not None:
+        normalizer.learn_record(pubchem_result, identifier)
+    with span('db_insert'):
+        added = add_pubchem_result(pubchem_result=pubchem_result, database=database, dedup=dedup)
+    if added and cache is not None:
+        cache.invalidate_record(added)
+    if added and names is not None:
+        names.add_record(added)
+    return added
+
+
+def add_pubchem_result(pubchem_result: Optional[Dict], database,
+                       dedup: Optional[DedupIndex] = None) -> Optional[Dict]:
+    """Add a result of pka_lookup_pubchem() into the local database
+    if the same record (same content hash, see dedup.py) is not there yet
+    
+    Parameters
+    ----------
+    pubchem_result : Optional[Dict]
+        what pka_lookup_pubchem() returned
+    database : tinyDB tiny.database object
+        the local database the Pubchem result is added to
+    dedup : Optional[DedupIndex], optional
+        see search_pka(), updated with the record added
+
+    Returns
+    -------
+    Optional[Dict]
+        pubchem_result if it was added, None otherwise
+    """
+    # Get pubchem result InChIKey
+    pubchem_result_inchikey = pubchem_result.get('InChIKey') if pubchem_result else None
+    
+    # Add pubchem result (if found) into local DB:
+    if pubchem_result_inchikey:
+        if dedup is not None:
+            # Indexed before the insert (atomic check and add): two threads adding the same
+            # record cannot both insert it. Removed again if the insert fails
+            record_existed = not dedup.add(pubchem_result)
+        else:
+            # Without index: hashes of the current records of the same InChIKey
+            current_db_result = search_db(identifier=pubchem_result_inchikey, database=database) or []
+            record_existed = record_hash(pubchem_result) in set(record_hash(result) for _, result in current_db_result)
+
+        if record_existed:
+            # Do not add into current db
+            if debug:
+                print('Will not add into current DB')    # for trouble shooting
+            return None
+
+        if debug:
+            print('Will add into current DB')    # for trouble shooting
+        # Add into current DB
+        try:
+            database.insert(pubchem_result)
+        except Exception:
+            # Not stored (e.g. database locked): can be added again
+            if dedup is not None:
+                dedup.discard(pubchem_result)
+            raise
+        return pubchem_result
+
+
+def _local_records(identifier: str, database, normalizer: Optional[IdentifierNormalizer],
+                   names: Optional[NameIndex]) -> List[Tuple[int, Dict]]:
+    """Return the local records of `identifier` (see search_db()), else of the compounds it names,
+    extended to every record of the compound if it is only one"""
+    db_result = search_db(identifier=identifier, database=database)
+    if not db_result and names is not None:
+        db_result = _named_records(identifier, database, names)
+    if db_result and normalizer is not None:
+        db_result = _compound_records(identifier, db_result, database, normalizer)
+    return db_result or []
+
+
+def _local_records_many(identifiers: List[str], database, normalizer: Optional[IdentifierNormalizer],
+                        names: Optional[NameIndex]) -> Dict[str, List[Tuple[int, Dict]]]:
+    """Same as _local_records() for many identifiers, in a single pass over the database:
+    return {identifier: [(result'ID, result), ...]} of the identifiers found"""
+    db_results = search_db_many(identifiers=identifiers, database=database) or {}
+    if names is not None:
+        for identifier in identifiers:
+            if identifier and identifier not in db_results:
+                named_records = _named_records(identifier, database, names)
+                if named_records:
+                    db_results[identifier] = named_records
+    if normalizer is not None:
+        db_results = {identifier: _compound_records(identifier, db_result, database, normalizer)
+                      for identifier, db_result in db_results.items()}
+    return db_results
+
+
+def _compound_records(identifier: str, db_result: List[Tuple[int, Dict]], database,
+                      normalizer: IdentifierNormalizer) -> List[Tuple[int, Dict]]:
+    """If the local records found for `identifier` are all of one compound,
+    learn `identifier` as an alias of its InChIKey and return every record of the compound"""
+    inchikeys = set(record.get('InChIKey') for _, record in db_result)
+    if len(inchikeys) != 1 or None in inchikeys or identifier in inchikeys:
+        return db_result
+    inchikey = inchikeys.pop()
+    normalizer.learn(identifier, inchikey)
+    return search_db(identifier=inchikey, database=database) or db_result
+
+
+def _synonym_learner(normalizer: Optional[IdentifierNormalizer],
+                     names: Optional[NameIndex]) -> Optional[Callable[[str, List[str]], None]]:
+    """Return the on_synonyms callback of pka_lookup_pubchem() saving the synonyms of the compounds found
+    as aliases of their InChIKey and as names, None if there is nowhere to save them"""
+    if normalizer is None and names is None:
+        return None
+
+    def learn_synonyms(inchikey: str, synonyms: List[str]) -> None:
+        if normalizer is not None:
+            normalizer.learn_synonyms(inchikey, synonyms)
+        if names is not None:
+            names.add_synonyms(inchikey, synonyms)
+    return learn_synonyms
+
+
+def _named_records(identifier: str, database, names: NameIndex) -> List[Tuple[int, Dict]]:
+    """Return the local records of the compounds named `identifier` (see NameIndex.lookup()),
+    [] if `identifier` does not look like a name (e.g. 'C=O' is not looked up as 'Co', cobalt)"""
+    db_result = []
+    if not looks_like_name(identifier):
+        return db_result
+    for inchikey in names.lookup(identifier):
+        db_result.extend(search_db(identifier=inchikey, database=database) or [])
+    return db_result
+
+
+def search_pka_many(identifiers: Iterable[str], database, max_workers: int = 1,
+                    negative_cache: Optional[NegativeCache] = None,
+                    cache: Optional[ResultCache] = None,
+                    normalizer: Optional[IdentifierNormalizer] = None,
+                    dedup: Optional[DedupIndex] = None,
+                    names: Optional[NameIndex] = None) -> List[Optional[List[Dict]]]:
+    """Search pKa for many identifiers at once.
+    Duplicated identifiers are only searched once, all local records are
+    found in a single pass over the database and only the unique misses
+    are searched in Pubchem (and added into the local database if found)
+    
+    Parameters
+    ----------
+    identifiers : Iterable[str]
+        search strings, see search_pka()
+    database : tinyDB tiny.database object
+        the name of the database the search query need
+    max_workers : int, optional
+        number of Pubchem lookups running at the same time, by default 1.
+        Above 1, synonyms and properties of the misses are also requested in batches
+        (see pka_lookup_pubchem_many()). Records found are still added into the local database one at a time
+    negative_cache : Optional[NegativeCache], optional
+        see search_pka()
+    cache : Optional[ResultCache], optional
+        see search_pka()
+    normalizer : Optional[IdentifierNormalizer], optional
+        see search_pka(). Equivalent identifiers are searched only once
+    dedup : Optional[DedupIndex], optional
+        see search_pka()
+    names : Optional[NameIndex], optional
+        see search_pka()
+
+    Returns
+    -------
+    List[Optional[List[Dict]]]
+        one result per input identifier, in the same order as the input.
+        Each result is the same as what search_pka() returns for that identifier
+    """
+    global debug
+
+    if len(sys.argv) == 2 and sys.argv[1] in ['--debug=True', '--debug=true', '--debug', '-d']:
+        debug = True
+
+    identifiers = list(identifiers)
+    if normalizer is not None:
+        identifiers = [normalizer.canonical_key(identifier) if identifier else identifier
+                       for identifier in identifiers]
+    # dict keeps the first-seen order of the unique identifiers, empty ones are not searched
+    unique_identifiers = [identifier for identifier in dict.fromkeys(identifiers) if identifier]
+
+    results = {}
+    if cache is not None:
+        for identifier in unique_identifiers:
+            cached_result = cache.get(identifier)
+            if cached_result is not None:
+                results[identifier] = cached_result
+        unique_identifiers = [identifier for identifier in unique_identifiers if identifier not in results]
+
+    try:
+        with span('search_db'):
+            db_results = _local_records_many(unique_identifiers, database, normalizer, names)
+            # Compounds of the Pubchem synonyms not found as they are (see search_pka()),
+            # their results are cached by the compound InChIKey
+            aliases = {}
+            if normalizer is not None:
+                aliases = {identifier: normalizer.synonym(identifier) for identifier in unique_identifiers
+                           if identifier not in db_results and normalizer.synonym(identifier)}
+            alias_keys = []
+            for key in dict.fromkeys(aliases.values()):
+                if key in results or key in db_results:
+                    continue
+                cached_result = cache.get(key) if cache is not None else None
+                if cached_result is not None:
+                    results[key] = cached_result
+                else:
+                    alias_keys.append(key)
+            db_results.update(_local_records_many(alias_keys, database, normalizer, names))
+    except Exception as error:
+        # Same as search_pka(): None instead of raising, except for the cached results
+        count('errors')
+        if debug:
+            traceback_str = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+            print(traceback_str)
+
+        return [results.get(identifier) for identifier in identifiers]
+
+    on_miss = negative_cache.add if negative_cache is not None else None
+    on_synonyms = _synonym_learner(normalizer, names)
+
+    # What each identifier is searched by: the compound of its synonym if it is one
+    keys = list(dict.fromkeys(aliases.get(identifier, identifier) for identifier in unique_identifiers))
+    misses = []
+    for identifier in keys:
+        if identifier in results:
+            continue
+        if db_results.get(identifier):
+            results[identifier] = [record for _, record in db_results[identifier]]
+            if cache is not None:
+                cache.put(identifier, results[identifier])
+        elif negative_cache is not None and identifier in negative_cache:
+            results[identifier] = None
+            count('negative_cache_hits')
+        else:
+            misses.append(identifier)
+    hits = sum(1 for identifier in keys if db_results.get(identifier))
+    count('db_hits', hits)
+    count('db_misses', len(keys) - hits)
+
+    if max_workers > 1:
+        pubchem_results = pka_lookup_pubchem_many(misses, max_workers=max_workers, on_miss=on_miss,
+                                                  on_synonyms=on_synonyms)
+    else:
+        # Lazily look up one at a time
+        pubchem_results = (pka_lookup_pubchem(identifier, on_miss=on_miss, on_synonyms=on_synonyms)
+                           for identifier in misses)
+
+    for identifier, pubchem_result in zip(misses, pubchem_results):
+        try:
+            if pubchem_result and normalizer is not None:
+                normalizer.learn_record(pubchem_result, identifier)
+            with span('db_insert'):
+                results[identifier] = add_pubchem_result(pubchem_result=pubchem_result, database=database, dedup=dedup)
+            if results[identifier] and cache is not None:
+                cache.invalidate_record(results[identifier])
+            if results[identifier] and names is not None:
+                names.add_record(results[identifier])
+        except Exception as error:
+            count('errors')
+            if debug:
+                traceback_str = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+                print(traceback_str)
+
+            results[identifier] = None
+
+    for identifier, alias in aliases.items():
+        results[identifier] = results[alias]
+    return [results.get(identifier) for identifier in identifiers]
+
                    
 def search_db(identifier: str, database) -> Optional[List[Tuple[Dict]]]:
     """Return a list of (result'ID, result) from pka search using local database 
@@ -121,7 +455,7 @@ def search_db(identifier: str, database) -> Optional[List[Tuple[Dict]]]:
     identifier : str
         search keywords. Could be one of (ranked likely search)
         - CAS number ~ InChIKey ~ InChI > IUPAC name >> SMILES 
-    database : tinyDB tiny.database object
+    database : tinyDB tiny.database object, IndexedDB or SQLiteDB
         the name of the database the search query need
     
     Returns
@@ -129,14 +463,18 @@ def search_db(identifier: str, database) -> Optional[List[Tuple[Dict]]]:
     Optional[List[Tuple[Dict]]]
         The record(s) found in local database in the following format:
             [
-                (record1_id, record1 [Dict]),
-                (record2_id, record2 [Dict]),
+                (record1_id, record1 [PkaRecord]),
+                (record2_id, record2 [PkaRecord]),
                 ...
             ]
         None: if not found any
     """
 
     if identifier and database:
+        # Indexed databases (IndexedDB, SQLiteDB) answer the query without a full table scan
+        if hasattr(database, 'lookup'):
+            return [(doc_id, PkaRecord(record, doc_id)) for doc_id, record in database.lookup(identifier)]
+
         results = database.search(
                     (Query()['Substance_CASRN'] == identifier) | 
                     (Query()['IUPAC_Name'] == identifier) | 
@@ -147,16 +485,62 @@ def search_db(identifier: str, database) -> Optional[List[Tuple[Dict]]]:
                     (Query()['Canonical_SMILES'] == identifier) | 
                     (Query()['Isomeric_SMILES'] == identifier)
                 )
-        return [(record.doc_id, record) for record in results]
+        return [(record.doc_id, PkaRecord(record, record.doc_id)) for record in results]
 
 
-if __name__ == "__main__":
-    # Access local tinyDB
-    db = TinyDB('src/data/tinydb_db.json', 
-                sort_keys=True, 
-                indent=4, 
-                storage=CachingMiddleware(JSONStorage))    # Using caching for faster performance 
+def search_db_many(identifiers: Iterable[str], database) -> Optional[Dict[str, List[Tuple[int, Dict]]]]:
+    """Return the (result'ID, result) pairs of many identifiers using one pass over the local database
+    
+    Parameters
+    ----------
+    identifiers : Iterable[str]
+        search keywords, see search_db()
+    database : tinyDB tiny.database object, IndexedDB or SQLiteDB
+        the name of the database the search query need
     
+    Returns
+    -------
+    Optional[Dict[str, List[Tuple[int, Dict]]]]
+        {identifier: [(record1_id, record1 [PkaRecord]), ...]} for every identifier
+        found in the local database
+        None: if identifiers or database is empty
+    """
+
+    wanted = set(identifier for identifier in identifiers if identifier)
+    if not (wanted and database):
+        return None
+
+    if hasattr(database, 'lookup'):
+        found = {identifier: search_db(identifier, database) for identifier in wanted}
+        return {identifier: records for identifier, records in found.items() if records}
+
+    results = {}
+    for record in database.all():
+        # A record is only added once per identifier even if several of its fields match
+        matched = set(record.get(field) for field in IDENTIFIER_FIELDS) & wanted
+        for identifier in matched:
+            results.setdefault(identifier, []).append((record.doc_id, PkaRecord(record, record.doc_id)))
+    return results
+
+
+if __name__ == "__main__":
+    # Access local database
+    # (records are indexed by identifier and each new record is appended without rewriting the file)
+    db_path = 'src/data/pka_db.sqlite3'
+    tinydb_path = 'src/data/tinydb_db.json'
+    if not os.path.exists(db_path) and os.path.exists(tinydb_path):
+        # One-shot migration from the previous tinyDB JSON database
+        migrate_tinydb_json(tinydb_path, db_path)
+    db = SQLiteDB(db_path)
+    # Identifiers without result in Pubchem, saved in the same file
+    negative_cache = NegativeCache(db.table('negative_cache'))
+    # Identifiers and Pubchem synonyms learned as aliases of an InChIKey, also saved in the same file
+    normalizer = IdentifierNormalizer(db.table('aliases'))
+    # Content hashes of the local records, to not add a Pubchem result twice
+    dedup = DedupIndex(db)
+    # Names (IUPAC name, Substance_Name) of the local compounds, matched ignoring case and punctuation
+    names = NameIndex.from_database(db)
+
     try:
         identifiers = [
             # '64-19-7',    # acetic acid   >>> pKa = 4.76 at 25 °C
@@ -172,15 +556,14 @@ if __name__ == "__main__":
 
         for identifier in identifiers:
             print('Searching for pKa of structure with identifier: {}'.format(identifier))
-            result = search_pka(identifier=identifier, database=db)      
+            result = search_pka(identifier=identifier, database=db, negative_cache=negative_cache,
+                                normalizer=normalizer, dedup=dedup, names=names)
             pprint(result)
 
     except Exception as error:
         if debug:
-            traceback_str = ''.join(traceback.format_exception(etype=type(error), value=error, tb=error.__traceback__))
+            traceback_str = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
             print(traceback_str)
 
     finally:
-        # Because CachingMIddleware is used, db.close() is required to save to disk after some operations!
-        # db.storage.flush()
         db.close()
@@ -0,0 +1,231 @@
+"""
+Compact read-only binary snapshot of the pKa dataset.
+
+The snapshot is built once from the bundled dataset (or any list of records) and
+memory-mapped when opened, so startup does not parse any record: only the
+records touched by a lookup are decoded.
+
+File layout (all integers are unsigned 32-bit, little-endian, except the offsets):
+    header      MAGIC, then (n_records, n_fields, n_strings, n_index) and
+                the byte offsets of the sections below (64-bit)
+    fields      field names, as a JSON list
+    strings     every distinct value once (string interning), sorted by UTF-8 bytes:
+                n_strings + 1 offsets, then the UTF-8 data
+    rows        n_records x n_fields string ids (columnar values of each record), MISSING if absent
+    index       n_index (string id, record index) pairs of the identifier fields, sorted
+
+Usage:
+    python src/snapshot.py [csv_path] [snapshot_path]
+builds the snapshot of src/data/processed/complete_data.csv into src/data/pka_snapshot.bin
+"""
+
+import csv
+import json
+import mmap
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from tinydb.table import Document
+
+from db_index import IDENTIFIER_FIELDS
+
+
+MAGIC = b'PKASNAP1'
+HEADER = struct.Struct('<8s4I5Q')
+MISSING = 0xFFFFFFFF
+
+DATA_FILE = 'src/data/processed/complete_data.csv'
+SNAPSHOT_FILE = 'src/data/pka_snapshot.bin'
+
+
+def _uint32_array(values: Iterable[int]) -> bytes:
+    values = array('I', values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def build_snapshot(records: Iterable[Mapping], path: str, index_fields: Iterable[str] = IDENTIFIER_FIELDS) -> int:
+    """Write `records` into a snapshot file
+
+    Parameters
+    ----------
+    records : Iterable[Mapping]
+        the records, their values are stored as strings
+    path : str
+        path of the snapshot file
+    index_fields : Iterable[str], optional
+        fields that lookup() searches, by default IDENTIFIER_FIELDS
+
+    Returns
+    -------
+    int
+        number of records written
+    """
+    records = [{key: str(value) for key, value in record.items() if value is not None} for record in records]
+    index_fields = tuple(index_fields)
+    fields = list(index_fields)
+    for record in records:
+        fields.extend(key for key in record if key not in fields)
+
+    strings = sorted(set(value for record in records for value in record.values()),
+                     key=lambda value: value.encode('utf-8'))
+    string_ids = {value: i for i, value in enumerate(strings)}
+
+    rows = []
+    index = []
+    for record_index, record in enumerate(records):
+        for field in fields:
+            value = record.get(field)
+            rows.append(string_ids[value] if value is not None else MISSING)
+            if field in index_fields and value:
+                index.append((string_ids[value], record_index))
+    index = sorted(set(index))
+
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+
+    sections = [
+        json.dumps(fields).encode('utf-8'),
+        _uint32_array(offsets) + b''.join(encoded),
+        _uint32_array(rows),
+        _uint32_array(value for pair in index for value in pair),
+    ]
+    section_offsets = []
+    position = HEADER.size
+    for section in sections:
+        section_offsets.append(position)
+        position += len(section)
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(records), len(fields), len(strings), len(index),
+                            *section_offsets, position))
+        for section in sections:
+            f.write(section)
+
+    return len(records)
+
+
+class Snapshot:
+    """Memory-mapped read-only pKa database built by build_snapshot().
+    It can be used as the database of search_db()/search_db_many()
+
+    Parameters
+    ----------
+    path : str
+        path of the snapshot file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self._n_records, self._n_fields, self._n_strings, self._n_index,
+         fields_offset, strings_offset, rows_offset, index_offset, end) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError('Not a pKa snapshot file: {}'.format(path))
+
+        buffer = memoryview(self._mmap)
+        self.fields = json.loads(bytes(buffer[fields_offset:strings_offset]).decode('utf-8'))
+        self._string_offsets = self._uint32_view(buffer, strings_offset, self._n_strings + 1)
+        self._strings_data = strings_offset + 4 * (self._n_strings + 1)
+        self._rows = self._uint32_view(buffer, rows_offset, self._n_records * self._n_fields)
+        self._index = self._uint32_view(buffer, index_offset, 2 * self._n_index)
+
+    @staticmethod
+    def _uint32_view(buffer: memoryview, offset: int, count: int):
+        view = buffer[offset:offset + 4 * count]
+        if sys.byteorder == 'big':
+            # Rare: pay for a copy instead of reading in place
+            values = array('I', view.tobytes())
+            values.byteswap()
+            return values
+        return view.cast('I')
+
+    def __len__(self):
+        return self._n_records
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def _string_bytes(self, string_id: int) -> bytes:
+        start = self._strings_data + self._string_offsets[string_id]
+        end = self._strings_data + self._string_offsets[string_id + 1]
+        return self._mmap[start:end]
+
+    def _string_id(self, value: str) -> Optional[int]:
+        """Binary search the sorted string table"""
+        target = value.encode('utf-8')
+        low, high = 0, self._n_strings
+        while low < high:
+            middle = (low + high) // 2
+            if self._string_bytes(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._n_strings and self._string_bytes(low) == target:
+            return low
+        return None
+
+    def _record(self, record_index: int) -> Document:
+        start = record_index * self._n_fields
+        record = {}
+        for field, string_id in zip(self.fields, self._rows[start:start + self._n_fields]):
+            if string_id != MISSING:
+                record[field] = self._string_bytes(string_id).decode('utf-8')
+        return Document(record, record_index + 1)
+
+    def get(self, doc_id: int) -> Optional[Document]:
+        if 1 <= doc_id <= self._n_records:
+            return self._record(doc_id - 1)
+        return None
+
+    def all(self) -> List[Document]:
+        return [self._record(record_index) for record_index in range(self._n_records)]
+
+    def lookup(self, identifier: str, fields: Optional[Iterable[str]] = None) -> List[Tuple[int, Dict]]:
+        """Return a list of (result'ID, result) whose identifier fields equal `identifier`
+        (see IndexedDB.lookup()). Only the matched records are decoded"""
+        string_id = self._string_id(identifier)
+        if string_id is None:
+            return []
+
+        # Bisect the sorted (string id, record index) pairs for the first pair of string_id
+        low, high = 0, self._n_index
+        while low < high:
+            middle = (low + high) // 2
+            if self._index[2 * middle] < string_id:
+                low = middle + 1
+            else:
+                high = middle
+
+        results = []
+        while low < self._n_index and self._index[2 * low] == string_id:
+            record = self._record(self._index[2 * low + 1])
+            if not fields or any(record.get(field) == identifier for field in fields):
+                results.append((record.doc_id, record))
+            low += 1
+        return results
+
+    def close(self) -> None:
+        # Views on the map must be released before it can be closed
+        self._string_offsets = self._rows = self._index = None
+        self._mmap.close()
+
+
+def read_csv(path: str) -> List[Dict]:
+    """Read the records of a dataset CSV file (e.g. complete_data.csv)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+if __name__ == "__main__":
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else DATA_FILE
+    snapshot_path = sys.argv[2] if len(sys.argv) > 2 else SNAPSHOT_FILE
+    count = build_snapshot(read_csv(csv_path), snapshot_path)
+    print('Wrote {} records into {}'.format(count, snapshot_path))
@@ -0,0 +1,243 @@
+"""
+Local database stored in SQLite (stdlib sqlite3) instead of a tinyDB JSON file.
+
+Records are saved as JSON, with the identifier fields also copied into indexed
+columns, so opening the database does not read any record, a lookup is an index
+search and an insert only writes the new record. WAL mode lets several reader
+processes share the file while one process writes.
+
+Usage:
+    python src/sqlite_db.py src/data/tinydb_db.json src/data/pka_db.sqlite3
+migrates an existing tinyDB JSON file into a new SQLite file.
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from tinydb.table import Document
+
+from db_index import IDENTIFIER_FIELDS
+
+
+class SQLiteTable:
+    """A table of JSON documents with the same interface as a tinyDB table
+    (insert, insert_multiple, all, get, update, remove, truncate, len, iter)
+    plus `lookup()` over the indexed fields (see IndexedDB.lookup())
+
+    Parameters
+    ----------
+    db : SQLiteDB
+        the database the table belongs to
+    name : str
+        name of the table
+    fields : Iterable[str], optional
+        document keys copied into indexed columns, by default none
+    """
+
+    def __init__(self, db: 'SQLiteDB', name: str, fields: Iterable[str] = ()):
+        if not re.match(r'^\w+$', name):
+            raise ValueError('Invalid table name: {}'.format(name))
+
+        self.db = db
+        self.name = name
+        self.fields = tuple(fields)
+
+        columns = ''.join(', "{}" TEXT'.format(field) for field in self.fields)
+        with self.db.lock, self.db.connection:
+            self.db.connection.execute(
+                'CREATE TABLE IF NOT EXISTS "{}" (doc_id INTEGER PRIMARY KEY{}, data TEXT NOT NULL)'.format(name, columns))
+            for field in self.fields:
+                self.db.connection.execute(
+                    'CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ("{1}")'.format(name, field))
+
+    def __len__(self):
+        return self._fetchall('SELECT COUNT(*) FROM "{}"'.format(self.name))[0][0]
+
+    def __iter__(self) -> Iterator[Document]:
+        return iter(self.all())
+
+    def _fetchall(self, sql: str, parameters: Iterable = ()) -> List[Tuple]:
+        with self.db.lock:
+            return self.db.connection.execute(sql, tuple(parameters)).fetchall()
+
+    def _row(self, document: Mapping) -> Tuple:
+        return (json.dumps(document, ensure_ascii=False),) + tuple(document.get(field) for field in self.fields)
+
+    def _insert_rows(self, rows: Iterable[Tuple]) -> List[int]:
+        """Insert (doc_id, document) rows, doc_id being None for a new id"""
+        columns = ''.join(', "{}"'.format(field) for field in self.fields)
+        sql = 'INSERT INTO "{}" (doc_id, data{}) VALUES (?, ?{})'.format(
+            self.name, columns, ', ?' * len(self.fields))
+        doc_ids = []
+        with self.db.lock, self.db.connection:
+            for doc_id, document in rows:
+                doc_ids.append(self.db.connection.execute(sql, (doc_id,) + self._row(document)).lastrowid)
+        return doc_ids
+
+    def insert(self, document: Mapping) -> int:
+        """Insert a document (a single-row append), return its id"""
+        return self._insert_rows([(None, document)])[0]
+
+    def insert_multiple(self, documents: Iterable[Mapping]) -> List[int]:
+        """Insert many documents in one transaction, return their ids"""
+        return self._insert_rows((None, document) for document in documents)
+
+    def all(self) -> List[Document]:
+        rows = self._fetchall('SELECT doc_id, data FROM "{}" ORDER BY doc_id'.format(self.name))
+        return [Document(json.loads(data), doc_id) for doc_id, data in rows]
+
+    def get(self, doc_id: int) -> Optional[Document]:
+        rows = self._fetchall('SELECT data FROM "{}" WHERE doc_id = ?'.format(self.name), [doc_id])
+        return Document(json.loads(rows[0][0]), doc_id) if rows else None
+
+    def update(self, fields: Mapping, doc_ids: Iterable[int]) -> List[int]:
+        """Update `fields` of the documents with `doc_ids`, return the ids updated"""
+        assignments = ''.join(', "{}" = ?'.format(field) for field in self.fields)
+        sql = 'UPDATE "{}" SET data = ?{} WHERE doc_id = ?'.format(self.name, assignments)
+        updated = []
+        for doc_id in doc_ids:
+            document = self.get(doc_id)
+            if document is None:
+                continue
+            document.update(fields)
+            with self.db.lock, self.db.connection:
+                self.db.connection.execute(sql, self._row(document) + (doc_id,))
+            updated.append(doc_id)
+        return updated
+
+    def remove(self, doc_ids: Iterable[int]) -> List[int]:
+        """Remove the documents with `doc_ids`, return the ids given"""
+        doc_ids = list(doc_ids)
+        with self.db.lock, self.db.connection:
+            self.db.connection.executemany(
+                'DELETE FROM "{}" WHERE doc_id = ?'.format(self.name), [(doc_id,) for doc_id in doc_ids])
+        return doc_ids
+
+    def truncate(self) -> None:
+        """Remove all the documents"""
+        with self.db.lock, self.db.connection:
+            self.db.connection.execute('DELETE FROM "{}"'.format(self.name))
+
+    def lookup(self, identifier: str, fields: Optional[Iterable[str]] = None) -> List[Tuple[int, Dict]]:
+        """Return a list of (result'ID, result) whose indexed fields equal `identifier`
+
+        Parameters
+        ----------
+        identifier : str
+            exact value to look up
+        fields : Optional[Iterable[str]], optional
+            restrict the lookup to these indexed fields, by default all of them
+
+        Returns
+        -------
+        List[Tuple[int, Dict]]
+            matched records, by record id
+
+        Raises
+        ------
+        ValueError
+            if a field is not indexed (not a column of the table) or the table has no indexed field
+        """
+        fields = tuple(fields or self.fields)
+        not_indexed = [field for field in fields if field not in self.fields]
+        if not_indexed or not fields:
+            raise ValueError('Not indexed in table {}: {}'.format(self.name, not_indexed or 'no field'))
+        # SQLite answers an OR of indexed columns with one index search per column
+        condition = ' OR '.join('"{}" = ?'.format(field) for field in fields)
+        rows = self._fetchall('SELECT doc_id, data FROM "{}" WHERE {} ORDER BY doc_id'.format(self.name, condition),
+                              [identifier] * len(fields))
+        return [(doc_id, Document(json.loads(data), doc_id)) for doc_id, data in rows]
+
+
+class SQLiteDB:
+    """Local pKa database stored in SQLite, usable wherever a tinyDB database is.
+    Like tinyDB, the methods of the default table (records indexed on IDENTIFIER_FIELDS)
+    are available on the database itself, and other tables are created with `table()`
+
+    Parameters
+    ----------
+    path : str
+        path of the SQLite file, created if it does not exist
+    wal : bool, optional
+        use write-ahead logging so readers in other processes are not blocked by a writer,
+        by default True
+    """
+
+    default_table_name = '_default'
+
+    def __init__(self, path: str, wal: bool = True):
+        self.path = path
+        # Shared by the threads of a process (e.g. concurrent Pubchem lookups), guarded by self.lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        if wal:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            # In WAL mode, NORMAL is still safe against corruption, only the last commits can be lost on power failure
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+
+        self._tables = {}
+        self._default_table = self.table(self.default_table_name, fields=IDENTIFIER_FIELDS)
+
+    def __getattr__(self, name):
+        # Only called when the attribute is not found on the database itself
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._default_table, name)
+
+    def __len__(self):
+        return len(self._default_table)
+
+    def __iter__(self) -> Iterator[Document]:
+        return iter(self._default_table)
+
+    def table(self, name: str, fields: Iterable[str] = ()) -> SQLiteTable:
+        """Return the table `name`, created if it does not exist"""
+        if name not in self._tables:
+            self._tables[name] = SQLiteTable(self, name, fields)
+        return self._tables[name]
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def migrate_tinydb_json(json_path: str, sqlite_path: str) -> int:
+    """Copy every table of a tinyDB JSON file into a SQLite database, keeping record ids
+
+    Parameters
+    ----------
+    json_path : str
+        path of the tinyDB JSON file
+    sqlite_path : str
+        path of the SQLite file
+
+    Returns
+    -------
+    int
+        number of records copied
+    """
+    with open(json_path, encoding='utf-8') as f:
+        tables = json.load(f)
+
+    db = SQLiteDB(sqlite_path)
+    try:
+        count = 0
+        for name, documents in tables.items():
+            table = db.table(name, fields=IDENTIFIER_FIELDS if name == db.default_table_name else ())
+            rows = sorted((int(doc_id), document) for doc_id, document in documents.items())
+            count += len(table._insert_rows(rows))
+        return count
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Migrate a tinyDB JSON database into SQLite')
+    parser.add_argument('json_path', help='e.g. src/data/tinydb_db.json')
+    parser.add_argument('sqlite_path', help='e.g. src/data/pka_db.sqlite3')
+    args = parser.parse_args()
+
+    print('Migrated {} records'.format(migrate_tinydb_json(args.json_path, args.sqlite_path)))
@@ -0,0 +1,196 @@
+"""
+Write-behind insert queue for the local database.
+
+New records (e.g. Pubchem results added by search_pka()) are appended to a small
+journal file (one JSON line each) and kept in memory; they are written into the
+database in batches, when `max_pending` records are waiting or `flush_interval`
+seconds passed since the last flush. With a tinyDB JSON database this rewrites the
+file once per batch instead of once per record, and a crash loses nothing: records
+still in the journal are written into the database the next time it is opened.
+The journal is only cleared once a batch is on disk: a buffering storage (tinyDB
+CachingMiddleware) is flushed first.
+
+`flush_interval` is checked on each insert, there is no background timer: in a process
+that stops inserting, the last records stay queued (and journaled) until the next insert,
+`flush()` or `close()`. Call `flush()` from the application (e.g. when idle) if they must
+reach the database sooner.
+
+Usage:
+    db = WriteBehindDB(TinyDB('src/data/tinydb_db.json', storage=AtomicJSONStorage),
+                       'src/data/tinydb_db.journal')
+    ...
+    search_pka(identifier, db)
+    ...
+    db.close()    # flushes the records left
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from tinydb.storages import JSONStorage
+
+from db_index import IDENTIFIER_FIELDS
+from search_pka import search_db
+
+
+class AtomicJSONStorage(JSONStorage):
+    """tinyDB JSON storage that writes the whole file under a temporary name
+    and renames it over the previous one, so the file is never left half written"""
+
+    def __init__(self, path: str, create_dirs=False, encoding=None, access_mode='r+', **kwargs):
+        super().__init__(path, create_dirs=create_dirs, encoding=encoding, access_mode=access_mode, **kwargs)
+        self._path = path
+        self._encoding = encoding
+
+    def write(self, data: Dict[str, Dict]):
+        temp_path = self._path + '.tmp'
+        with open(temp_path, 'w', encoding=self._encoding) as f:
+            json.dump(data, f, **self.kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        # An open file cannot be replaced on Windows: the handle is closed first,
+        # then reopened on the new file
+        self._handle.close()
+        try:
+            os.replace(temp_path, self._path)
+        finally:
+            self._handle = open(self._path, mode=self._mode, encoding=self._encoding)
+
+
+class WriteBehindDB:
+    """Wrap a database so that inserts are journaled and written into it in batches.
+    Records waiting to be written are still found by `lookup()` (i.e. by search_db()),
+    every other attribute is forwarded to the wrapped database
+
+    Parameters
+    ----------
+    database : tinyDB tiny.database object, IndexedDB or SQLiteDB
+        the database the records are written into
+    journal_path : str
+        append-only journal of the records not written into the database yet
+    max_pending : int, optional
+        flush when this many records are waiting, by default 100
+    flush_interval : float, optional
+        flush on the next insert when this many seconds passed since the last flush, by default 30
+        (checked on insert only, see above)
+    sync : bool, optional
+        fsync the journal after each insert (survives a power failure, not only a crash
+        of the process), by default False
+    """
+
+    def __init__(self, database, journal_path: str, max_pending: int = 100,
+                 flush_interval: float = 30.0, sync: bool = False):
+        self.database = database
+        self.journal_path = journal_path
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.sync = sync
+        self._pending = []
+        self._lock = threading.RLock()
+        self._last_flush = time.monotonic()
+
+        self.recover()
+        self._journal = open(journal_path, 'a', encoding='utf-8')
+
+    def __getattr__(self, name):
+        # Only called when the attribute is not found on the wrapper itself
+        return getattr(self.database, name)
+
+    def __len__(self):
+        return len(self.database) + len(self._pending)
+
+    @property
+    def pending(self) -> List[Dict]:
+        """Records waiting to be written into the database"""
+        with self._lock:
+            return list(self._pending)
+
+    def recover(self) -> int:
+        """Write the records left in the journal (by a crash) into the database, return how many.
+        Records that are already in the database (crash after the write, before the journal
+        was cleared) are not written twice"""
+        if not os.path.exists(self.journal_path):
+            return 0
+
+        with open(self.journal_path, encoding='utf-8') as f:
+            records = []
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # The last line may have been cut by the crash
+                    break
+
+        if records:
+            saved = set(json.dumps(record, sort_keys=True) for record in self.database.all())
+            records = [record for record in records if json.dumps(record, sort_keys=True) not in saved]
+            if records:
+                self.database.insert_multiple(records)
+
+        os.remove(self.journal_path)
+        return len(records)
+
+    def insert(self, document: Mapping) -> None:
+        """Journal a record and queue it, the queue is flushed if a threshold is reached.
+        Unlike a tinyDB insert, the record id is not known yet: None is returned"""
+        with self._lock:
+            self._journal.write(json.dumps(document, ensure_ascii=False) + '\n')
+            self._journal.flush()
+            if self.sync:
+                os.fsync(self._journal.fileno())
+            self._pending.append(dict(document))
+
+            if (len(self._pending) >= self.max_pending
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+
+    def insert_multiple(self, documents: Iterable[Mapping]) -> None:
+        for document in documents:
+            self.insert(document)
+
+    def flush(self) -> int:
+        """Write the queued records into the database in one batch, return how many"""
+        with self._lock:
+            count = len(self._pending)
+            if self._pending:
+                self.database.insert_multiple(self._pending)
+                self._pending = []
+                self._flush_storage()
+                # Written: the journal can be cleared
+                self._journal.truncate(0)
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+            self._last_flush = time.monotonic()
+            return count
+
+    def _flush_storage(self) -> None:
+        """Write the batch through a buffering tinyDB storage (e.g. CachingMiddleware), which keeps
+        inserted records in memory until its own flush: until then the journal is still needed"""
+        storage = getattr(self.database, 'storage', None)
+        if storage is not None and hasattr(storage, 'flush'):
+            storage.flush()
+
+    def lookup(self, identifier: str, fields: Optional[Iterable[str]] = None) -> List[Tuple[Optional[int], Dict]]:
+        """Return the (result'ID, result) of the database (see search_db())
+        followed by the queued records (with ID None) matching `identifier`"""
+        results = list(search_db(identifier, self.database) or [])
+        with self._lock:
+            pending = list(self._pending)
+
+        fields = tuple(fields or IDENTIFIER_FIELDS)
+        for document in pending:
+            if any(document.get(field) == identifier for field in fields):
+                results.append((None, document))
+        return results
+
+    def close(self) -> None:
+        """Flush the queued records, remove the journal and close the database"""
+        with self._lock:
+            self.flush()
+            self._journal.close()
+            os.remove(self.journal_path)
+        self.database.close()
+
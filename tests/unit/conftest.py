@@ -0,0 +1,29 @@
+import threading
+
+import pytest
+
+from mock_pubchem import MockPubchemServer
+
+
+@pytest.fixture
+def pubchem_server(monkeypatch):
+    """Start a MockPubchemServer and point pka_lookup_pubchem at it"""
+    from src.rate_limiter import RateLimiter
+
+    server = MockPubchemServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    # pka_lookup_pubchem imports pubchem_api from src/ (not as src.pubchem_api)
+    monkeypatch.setattr('pubchem_api.PUG_REST_URL', server.url + '/rest/pug')
+    monkeypatch.setattr('pubchem_api.PUG_VIEW_URL', server.url + '/rest/pug_view')
+    # Keep the tests fast (pka_lookup_pubchem is also imported from src/ by search_pka)
+    rate_limiter = RateLimiter(rate=100)
+    for module in ('src.pka_lookup_pubchem', 'pka_lookup_pubchem'):
+        monkeypatch.setattr(module + '.rate_limiter', rate_limiter)
+        monkeypatch.setattr(module + '.BACKOFF', 0.01)
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
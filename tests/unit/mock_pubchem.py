@@ -0,0 +1,231 @@
+"""
+Local stand-in for the Pubchem PUG-REST and PUG-View services, used by the tests
+(see the `pubchem_server` fixture in conftest.py) and by the offline benchmarks
+(benchmarks/bench_lookup.py). It answers from a table of compounds: by default the
+few compounds below, or compounds recorded from Pubchem (see load_recording()).
+"""
+
+import json
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+# Minimal Pubchem data served by the mock server
+MOCK_COMPOUNDS = {
+    176: {
+        'names': ['64-19-7', 'acetic acid'],
+        'synonyms': ['acetic acid', 'ethanoic acid', '64-19-7', 'Glacial acetic acid'],
+        'properties': {
+            'InChI': 'InChI=1S/C2H4O2/c1-2(3)4/h1H3,(H,3,4)',
+            'InChIKey': 'QTBSBXVTEAMEQO-UHFFFAOYSA-N',
+            'CanonicalSMILES': 'CC(=O)O',
+            'IsomericSMILES': 'CC(=O)O',
+            'IUPACName': 'acetic acid',
+        },
+        'pka': [('Serjeant, E.P., Dempsey B.; IUPAC Chemical Data Series No. 23', 'pKa = 4.76 at 25 °C')],
+    },
+    887: {
+        # '1000-00-0' resolves to this CID but is not one of its synonyms (i.e. not an exact match)
+        'names': ['67-56-1', 'methanol', '1000-00-0'],
+        'synonyms': ['methanol', '67-56-1', 'Methyl alcohol'],
+        'properties': {
+            'InChI': 'InChI=1S/CH4O/c1-2/h2H,1H3',
+            'InChIKey': 'OKKJLVBELUTLKV-UHFFFAOYSA-N',
+            'CanonicalSMILES': 'CO',
+            'IsomericSMILES': 'CO',
+            'IUPACName': 'methanol',
+        },
+        'pka': [('Serjeant, E.P., Dempsey B.; IUPAC Chemical Data Series No. 23', 'pKa = 15.3'),
+                ('Another reference', '15.5')],
+    },
+    6117: {
+        'names': ['2950-43-8'],
+        'synonyms': ['Hydroxylamine-O-sulfonic acid', '2950-43-8'],
+        'properties': {
+            'InChI': 'InChI=1S/H3NO4S/c1-5-6(2,3)4/h1H2,(H,2,3,4)',
+            'InChIKey': 'DQMGKULPXJRUDR-UHFFFAOYSA-N',
+            'CanonicalSMILES': 'NOS(=O)(=O)O',
+            'IsomericSMILES': 'NOS(=O)(=O)O',
+            'IUPACName': 'amino hydrogen sulfate',
+        },
+        'pka': [],
+    },
+}
+
+PUG_VIEW_NS = 'http://pubchem.ncbi.nlm.nih.gov/pug_view'
+
+
+def pug_view_xml(pka) -> str:
+    information = ''.join(
+        '<Information><ReferenceNumber>{}</ReferenceNumber><Reference>{}</Reference>'
+        '<Value><StringWithMarkup><String>{}</String></StringWithMarkup></Value></Information>'.format(i, reference, value)
+        for i, (reference, value) in enumerate(pka, 1)
+    )
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<Record xmlns="{}"><RecordType>CID</RecordType>'
+            '<Section><TOCHeading>Chemical and Physical Properties</TOCHeading>'
+            '<Section><TOCHeading>Dissociation Constants</TOCHeading>{}</Section>'
+            '</Section></Record>').format(PUG_VIEW_NS, information)
+
+
+# http.server.ThreadingHTTPServer needs Python 3.7
+class MockPubchemServer(socketserver.ThreadingMixIn, HTTPServer):
+    """Local stand-in for the Pubchem PUG-REST and PUG-View services
+
+    Attributes
+    ----------
+    requests : list
+        (time, method, path) of every request received
+    connections : set
+        client (host, port) of every connection used
+    busy : int
+        number of next requests to answer with HTTP 503
+    latency : float
+        seconds each request takes to answer
+    error_rate : float
+        fraction of the requests answered with HTTP 503 at random
+    max_active : int
+        maximum number of requests that were being answered at the same time
+
+    Parameters
+    ----------
+    compounds : Optional[Dict[int, Dict]], optional
+        {CID: compound} served, see MOCK_COMPOUNDS (a compound can have the recorded
+        PUG-View answer in 'pug_view' instead of 'pka'), by default MOCK_COMPOUNDS
+    latency : float, optional
+        by default 0
+    error_rate : float, optional
+        by default 0
+    seed : int, optional
+        seed of the random errors, by default 0
+    """
+
+    daemon_threads = True
+
+    def __init__(self, compounds: Optional[Dict[int, Dict]] = None, latency: float = 0,
+                 error_rate: float = 0, seed: int = 0):
+        super().__init__(('127.0.0.1', 0), MockPubchemHandler)
+        self.requests = []
+        self.connections = set()
+        self.busy = 0
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.serve(MOCK_COMPOUNDS if compounds is None else compounds)
+
+    def serve(self, compounds: Dict[int, Dict]) -> None:
+        """Answer from `compounds` from now on"""
+        # Name, InChIKey, InChI or SMILES: CIDs
+        index = {}
+        for cid, compound in compounds.items():
+            properties = compound['properties']
+            for name in compound['names'] + [properties.get('InChIKey'), properties.get('InChI'),
+                                             properties.get('CanonicalSMILES')]:
+                if name and cid not in index.setdefault(name, []):
+                    index[name].append(cid)
+        self.compounds, self.index = compounds, index
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+
+class MockPubchemHandler(BaseHTTPRequestHandler):
+
+    # Keep-alive connections, like Pubchem
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately: without this, each answer waits for the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.respond(parse_qs(urlparse(self.path).query))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.respond(parse_qs(self.rfile.read(length).decode()))
+
+    def send(self, status: int, body: str = '', content_type: str = 'application/json'):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def respond(self, params):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.latency)
+            self.answer(params)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def answer(self, params):
+        server = self.server
+        with server.lock:
+            server.requests.append((time.monotonic(), self.command, self.path))
+            server.connections.add(self.client_address)
+            if server.busy > 0 or (server.error_rate and server.random.random() < server.error_rate):
+                server.busy = max(server.busy - 1, 0)
+                return self.send(503, '{"Fault": {"Code": "PUGREST.ServerBusy"}}')
+
+        parts = [unquote(part) for part in urlparse(self.path).path.strip('/').split('/')]
+        # e.g. rest/pug/compound/<namespace>[/<identifier>]/<operation>/JSON
+        if parts[:2] == ['rest', 'pug_view']:
+            compound = server.compounds.get(int(parts[4]))
+            if compound and compound.get('pug_view'):
+                return self.send(200, compound['pug_view'], 'application/xml')
+            if not compound or not compound.get('pka'):
+                return self.send(404, '<Fault/>', 'application/xml')
+            return self.send(200, pug_view_xml(compound['pka']), 'application/xml')
+
+        namespace = parts[3]
+        if namespace in params:
+            identifiers = params[namespace][0].split(',')
+            operation = parts[4:-1]
+        else:
+            identifiers = parts[4].split(',')
+            operation = parts[5:-1]
+
+        if namespace == 'cid':
+            cids = [int(cid) for cid in identifiers if int(cid) in server.compounds]
+        else:
+            cids = server.index.get(identifiers[0], [])
+        if not cids:
+            return self.send(404, '{"Fault": {"Code": "PUGREST.NotFound"}}')
+
+        if operation == ['cids']:
+            body = {'IdentifierList': {'CID': cids}}
+        elif operation == ['synonyms']:
+            body = {'InformationList': {'Information': [
+                {'CID': cid, 'Synonym': server.compounds[cid]['synonyms']} for cid in cids]}}
+        elif operation[0] == 'property':
+            fields = operation[1].split(',')
+            body = {'PropertyTable': {'Properties': [
+                dict({'CID': cid}, **{field: server.compounds[cid]['properties'][field]
+                                      for field in fields if field in server.compounds[cid]['properties']})
+                for cid in cids]}}
+        else:
+            return self.send(400, '{"Fault": {"Code": "PUGREST.BadRequest"}}')
+        return self.send(200, json.dumps(body))
+
+
+def load_recording(path: str) -> Dict[int, Dict]:
+    """Return the compounds of a recording (JSON {CID: compound}, see benchmarks/bench_lookup.py --record)"""
+    with open(path, encoding='utf-8') as f:
+        return {int(cid): compound for cid, compound in json.load(f).items()}
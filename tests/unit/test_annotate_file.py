@@ -0,0 +1,155 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import csv
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+import src.annotate_file
+from src.annotate_file import annotate_file, read_sdf
+
+
+RECORDS = [
+    {'Substance_CASRN': '64-19-7', 'InChIKey': 'QTBSBXVTEAMEQO-UHFFFAOYSA-N', 'pKa': '4.76'},
+    {'Substance_CASRN': '108-95-2', 'InChIKey': 'ISWSIDIOOBJBQZ-UHFFFAOYSA-N', 'pKa': '9.99'},
+]
+
+ROWS = [
+    {'name': 'acetic acid', 'CAS': '64-19-7'},
+    {'name': 'phenol', 'CAS': '108-95-2'},
+    {'name': 'unknown', 'CAS': '00000-00-0'},
+    {'name': 'empty', 'CAS': ''},
+    {'name': 'acetic acid again', 'CAS': '64-19-7'},
+]
+
+SDF_RECORD = """{name}
+  test
+
+  1  0  0  0  0  0  0  0  0  0999 V2000
+    0.0000    0.0000    0.0000 C   0  0  0  0  0  0  0  0  0  0  0  0
+M  END
+> <CAS>
+{cas}
+
+"""
+
+
+@pytest.fixture
+def db(monkeypatch):
+    # Identifiers missing from the local database are not found in Pubchem either
+    monkeypatch.setattr('search_pka.pka_lookup_pubchem', lambda identifier, **kwargs: None)
+    db = TinyDB(storage=MemoryStorage)
+    db.insert_multiple(RECORDS)
+    return db
+
+
+@pytest.fixture
+def input_csv(tmp_path):
+    path = str(tmp_path / 'compounds.csv')
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['name', 'CAS'])
+        writer.writeheader()
+        writer.writerows(ROWS)
+    return path
+
+
+def read_output(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_annotate_csv(db, input_csv, tmp_path):
+    output = str(tmp_path / 'compounds_pka.csv')
+    assert annotate_file(input_csv, output, db, 'CAS', chunk_size=2) == 5
+
+    rows = read_output(output)
+    assert [row['name'] for row in rows] == [row['name'] for row in ROWS]
+    assert [row['pKa'] for row in rows] == ['4.76', '9.99', '', '', '4.76']
+    assert rows[0]['pKa_source'] == 'local'
+    assert not os.path.exists(output + '.checkpoint')
+
+
+def test_blank_identifiers_are_not_searched(tmp_path, monkeypatch):
+    lookups = []
+    monkeypatch.setattr('search_pka.pka_lookup_pubchem', lambda identifier, **kwargs: lookups.append(identifier))
+    path = str(tmp_path / 'compounds.csv')
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['name', 'CAS'])
+        writer.writeheader()
+        writer.writerows([{'name': 'empty', 'CAS': ''}, {'name': 'blank', 'CAS': '  '},
+                          {'name': 'unknown', 'CAS': '00000-00-0'}])
+
+    output = str(tmp_path / 'compounds_pka.csv')
+    assert annotate_file(path, output, TinyDB(storage=MemoryStorage), 'CAS') == 3
+    assert [row['pKa'] for row in read_output(output)] == ['', '', '']
+    assert lookups == ['00000-00-0']
+
+
+def test_annotate_csv_resume(db, input_csv, tmp_path, monkeypatch):
+    output = str(tmp_path / 'compounds_pka.csv')
+    expected = str(tmp_path / 'expected.csv')
+    annotate_file(input_csv, expected, db, 'CAS', chunk_size=2)
+
+    search_pka_many = src.annotate_file.search_pka_many
+    calls = []
+
+    def interrupted_search_pka_many(identifiers, *args, **kwargs):
+        calls.append(identifiers)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return search_pka_many(identifiers, *args, **kwargs)
+
+    monkeypatch.setattr('src.annotate_file.search_pka_many', interrupted_search_pka_many)
+    with pytest.raises(KeyboardInterrupt):
+        annotate_file(input_csv, output, db, 'CAS', chunk_size=2)
+    assert os.path.exists(output + '.checkpoint')
+    assert len(read_output(output)) == 2
+
+    calls.clear()
+    monkeypatch.setattr('src.annotate_file.search_pka_many', search_pka_many)
+    assert annotate_file(input_csv, output, db, 'CAS', chunk_size=2) == 5
+    with open(output) as f, open(expected) as g:
+        assert f.read() == g.read()
+
+
+def test_checkpoint_of_another_input(db, input_csv, tmp_path):
+    output = str(tmp_path / 'compounds_pka.csv')
+    with open(output + '.checkpoint', 'w') as f:
+        f.write('{"input": "/elsewhere.csv", "rows_done": 2, "output": {"output_size": 10}}')
+    with pytest.raises(ValueError):
+        annotate_file(input_csv, output, db, 'CAS')
+
+
+def test_annotate_sdf(db, tmp_path):
+    path = str(tmp_path / 'compounds.sdf')
+    with open(path, 'w') as f:
+        for row in ROWS[:3]:
+            f.write(SDF_RECORD.format(name=row['name'], cas=row['CAS']) + '$$$$\n')
+
+    output = str(tmp_path / 'compounds_pka.sdf')
+    assert annotate_file(path, output, db, 'CAS', chunk_size=2) == 3
+
+    records = list(read_sdf(output))
+    assert [record['CAS'] for record in records] == ['64-19-7', '108-95-2', '00000-00-0']
+    assert [record.get('pKa') for record in records] == ['4.76', '9.99', None]
+    assert records[0]['_sdf_block'].startswith('acetic acid\n')
+
+
+def test_annotate_parquet(db, tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+
+    path = str(tmp_path / 'compounds.parquet')
+    pq.write_table(pa.Table.from_pylist(ROWS), path)
+
+    output = str(tmp_path / 'compounds_pka')
+    assert annotate_file(path, output, db, 'CAS', chunk_size=2) == 5
+    assert sorted(os.listdir(output)) == ['part-000000.parquet', 'part-000001.parquet', 'part-000002.parquet']
+    assert pq.read_table(output).column('pKa').to_pylist() == ['4.76', '9.99', '', '', '4.76']
+
+
+def test_unknown_format(db, tmp_path):
+    with pytest.raises(ValueError):
+        annotate_file(str(tmp_path / 'compounds.xlsx'), str(tmp_path / 'out.xlsx'), db, 'CAS')
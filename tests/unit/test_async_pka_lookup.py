@@ -0,0 +1,96 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import asyncio
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+pytest.importorskip('aiohttp')
+
+from src.async_pka_lookup import AsyncPubchemClient, async_pka_lookup_pubchem, async_search_pka
+from src.negative_cache import NegativeCache, NO_PKA
+from src.pka_lookup_pubchem import pka_lookup_pubchem
+
+
+def run(coroutine):
+    # asyncio.run() needs Python 3.7
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+@pytest.mark.parametrize(
+    'identifier, all_values', [
+        ('64-19-7', False),
+        ('OKKJLVBELUTLKV-UHFFFAOYSA-N', False),
+        ('67-56-1', True),
+        ('2950-43-8', False),
+        ('1000-00-0', False),
+        ('00000-00-0', False),
+    ]
+)
+def test_same_as_pka_lookup_pubchem(pubchem_server, identifier, all_values):
+    misses = []
+    result = run(async_pka_lookup_pubchem(identifier, all_values=all_values, on_miss=lambda *miss: misses.append(miss)))
+
+    expected_misses = []
+    assert result == pka_lookup_pubchem(identifier, all_values=all_values,
+                                        on_miss=lambda *miss: expected_misses.append(miss))
+    assert misses == expected_misses
+
+
+def test_concurrent_lookups_are_coalesced(pubchem_server):
+    pubchem_server.latency = 0.05
+
+    async def lookups():
+        async with AsyncPubchemClient() as client:
+            return await asyncio.gather(*[async_pka_lookup_pubchem(identifier, client=client)
+                                          for identifier in ['64-19-7'] * 10 + ['acetic acid'] * 10])
+
+    results = run(lookups())
+    assert all(result['Pubchem_CID'] == '176' for result in results)
+    paths = [path for _, _, path in pubchem_server.requests]
+    # One CID request per identifier, then synonyms, properties and pKa of the compound once
+    assert sum('/cids/' in path for path in paths) == 2
+    assert len(paths) == 5
+
+
+def test_concurrency_cap(pubchem_server):
+    pubchem_server.latency = 0.05
+
+    async def lookups():
+        async with AsyncPubchemClient(max_concurrency=2) as client:
+            return await asyncio.gather(*[async_pka_lookup_pubchem(identifier, client=client)
+                                          for identifier in ['64-19-7', '67-56-1', '2950-43-8', '1000-00-0']])
+
+    assert [result and result['pKa'] for result in run(lookups())] == ['4.76 at 25 °C', '15.3', None, None]
+    assert pubchem_server.max_active == 2
+
+
+def test_busy_server(pubchem_server):
+    pubchem_server.busy = 2
+    assert run(async_pka_lookup_pubchem('64-19-7'))['pKa'] == '4.76 at 25 °C'
+
+
+def test_async_search_pka(pubchem_server):
+    db = TinyDB(storage=MemoryStorage)
+    negative_cache = NegativeCache(db.table('negative_cache'))
+
+    async def searches():
+        async with AsyncPubchemClient() as client:
+            found = await async_search_pka('67-56-1', db, negative_cache, client=client)
+            local = await async_search_pka('67-56-1', db, negative_cache, client=client)
+            missing = await async_search_pka('2950-43-8', db, negative_cache, client=client)
+            return found, local, missing
+
+    found, local, missing = run(searches())
+    assert found['source'] == 'Pubchem'
+    assert local == [found]
+    assert missing is None
+    assert negative_cache.get('2950-43-8')['reason'] == NO_PKA
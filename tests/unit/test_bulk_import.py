@@ -0,0 +1,183 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import json
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.bulk_import import bulk_import, iter_annotations, read_properties
+from src.db_index import IndexedDB
+from src.negative_cache import NO_PKA, NegativeCache
+from src.search_pka import search_db
+
+
+ANNOTATIONS = {'Annotations': {'Annotation': [
+    {
+        'SourceName': 'HSDB',
+        'Name': 'Acetic Acid',
+        'Data': [
+            {'Reference': ['Serjeant, E.P., Dempsey B.'], 'Value': {'StringWithMarkup': [{'String': 'pKa = 4.76 at 25 °C'}]}},
+            {'Value': {'StringWithMarkup': [{'String': '4.8 (in water)'}]}},
+        ],
+        'LinkedRecords': {'CID': [176]},
+    },
+    {
+        'SourceName': 'HSDB',
+        'Name': 'Methanol',
+        'Data': [{'Reference': ['Another reference'], 'Value': {'StringWithMarkup': [{'String': '15.5'}]}}],
+        'LinkedRecords': {'CID': [887]},
+    },
+    {
+        'SourceName': 'HSDB',
+        'Name': 'No structure',
+        'Data': [{'Value': {'StringWithMarkup': [{'String': '3.0'}]}}],
+        'LinkedRecords': {'CID': [999999]},
+    },
+    {'SourceName': 'HSDB', 'Name': 'No CID', 'Data': []},
+], 'Page': 1, 'TotalPages': 1}}
+
+ANNOTATIONS_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<Annotations xmlns="http://pubchem.ncbi.nlm.nih.gov/pug_view">
+  <Annotation>
+    <SourceName>HSDB</SourceName>
+    <Name>Acetic Acid</Name>
+    <Data>
+      <Reference>Serjeant, E.P., Dempsey B.</Reference>
+      <Value><StringWithMarkup><String>pKa = 4.76 at 25 °C</String></StringWithMarkup></Value>
+    </Data>
+    <Data>
+      <Value><StringWithMarkup><String>4.8 (in water)</String></StringWithMarkup></Value>
+    </Data>
+    <LinkedRecords><CID>176</CID></LinkedRecords>
+  </Annotation>
+</Annotations>
+'''
+
+PROPERTIES = '''"CID","InChI","InChIKey","CanonicalSMILES","IsomericSMILES","IUPACName","CAS"
+176,"InChI=1S/C2H4O2/c1-2(3)4/h1H3,(H,3,4)","QTBSBXVTEAMEQO-UHFFFAOYSA-N","CC(=O)O","CC(=O)O","acetic acid","64-19-7"
+887,"InChI=1S/CH4O/c1-2/h2H,1H3","OKKJLVBELUTLKV-UHFFFAOYSA-N","CO","CO","methanol",
+2244,"InChI=1S/C9H8O4/c1-6(10)13-8-5-3-2-4-7(8)9(11)12/h2-5H,1H3,(H,11,12)","BSYNRYMUTXBXSQ-UHFFFAOYSA-N","CC(=O)OC1=CC=CC=C1C(=O)O","CC(=O)OC1=CC=CC=C1C(=O)O","2-acetyloxybenzoic acid","50-78-2"
+'''
+
+ACETIC_ACID = {
+    'source': 'Pubchem',
+    'Pubchem_CID': '176',
+    'pKa': '4.76 at 25 °C',
+    'reference': 'Serjeant, E.P., Dempsey B.',
+    'Substance_CASRN': '64-19-7',
+    'pKa_values': [{'pKa': '4.76 at 25 °C', 'reference': 'Serjeant, E.P., Dempsey B.'},
+                   {'pKa': '4.8 (in water)', 'reference': 'HSDB'}],
+    'InChI': 'InChI=1S/C2H4O2/c1-2(3)4/h1H3,(H,3,4)',
+    'InChIKey': 'QTBSBXVTEAMEQO-UHFFFAOYSA-N',
+    'Canonical_SMILES': 'CC(=O)O',
+    'Isomeric_SMILES': 'CC(=O)O',
+    'IUPAC_Name': 'acetic acid',
+}
+
+
+def write_files(tmp_path):
+    annotations_path = tmp_path / 'annotations.json'
+    annotations_path.write_text(json.dumps(ANNOTATIONS), encoding='utf-8')
+    properties_path = tmp_path / 'properties.csv'
+    properties_path.write_text(PROPERTIES, encoding='utf-8')
+    return str(annotations_path), str(properties_path)
+
+
+def test_iter_annotations_json_and_xml(tmp_path):
+    annotations_path, _ = write_files(tmp_path)
+    xml_path = tmp_path / 'annotations.xml'
+    xml_path.write_text(ANNOTATIONS_XML, encoding='utf-8')
+    jsonl_path = tmp_path / 'annotations.jsonl'
+    jsonl_path.write_text('\n'.join(json.dumps(annotation) for annotation in ANNOTATIONS['Annotations']['Annotation']),
+                          encoding='utf-8')
+
+    expected = ([176], [('Serjeant, E.P., Dempsey B.', 'pKa = 4.76 at 25 °C'), ('HSDB', '4.8 (in water)')])
+    assert list(iter_annotations(str(xml_path))) == [expected]
+    assert list(iter_annotations(annotations_path))[0] == expected
+    assert list(iter_annotations(str(jsonl_path))) == list(iter_annotations(annotations_path))
+
+
+def test_read_properties_only_wanted_cids(tmp_path):
+    _, properties_path = write_files(tmp_path)
+    properties = read_properties(properties_path, [887])
+    assert list(properties) == [887]
+    assert 'CAS' not in properties[887]
+
+
+def test_bulk_import(tmp_path):
+    annotations_path, properties_path = write_files(tmp_path)
+    db = TinyDB(storage=MemoryStorage)
+    # Already in the local database: not added again
+    db.insert({'InChIKey': 'OKKJLVBELUTLKV-UHFFFAOYSA-N', 'pKa': '15.5'})
+    negative_cache = NegativeCache(TinyDB(storage=MemoryStorage).table('negative_cache'))
+    negative_cache.add('64-19-7', NO_PKA)
+
+    stats = bulk_import([annotations_path], db, properties_path=properties_path, negative_cache=negative_cache)
+
+    assert stats == {'annotations': 4, 'compounds': 3, 'added': 1, 'existing': 1, 'no_identifiers': 1}
+    assert [record for _, record in search_db('64-19-7', db)] == [ACETIC_ACID]
+    assert '64-19-7' not in negative_cache
+
+    # Importing again adds nothing
+    assert bulk_import([annotations_path], db, properties_path=properties_path)['added'] == 0
+    assert len(db) == 2
+
+
+def test_bulk_import_fetch_missing(tmp_path, pubchem_server):
+    annotations_path, _ = write_files(tmp_path)
+    db = TinyDB(storage=MemoryStorage)
+
+    stats = bulk_import([annotations_path], db, fetch_missing=True)
+
+    assert (stats['added'], stats['no_identifiers']) == (2, 1)
+    assert search_db('67-56-1', db)[0][1]['pKa'] == '15.5'
+    # Properties and synonyms of the 3 CIDs in one request each
+    assert len(pubchem_server.requests) == 2
+
+
+@pytest.mark.parametrize('indexed', [False, True])
+def test_bulk_import_in_batches(tmp_path, monkeypatch, indexed):
+    annotations_path, properties_path = write_files(tmp_path)
+    # Another source for acetic acid, after methanol
+    annotations = ANNOTATIONS['Annotations']['Annotation'] + [
+        {'SourceName': 'DrugBank', 'Data': [{'Value': {'StringWithMarkup': [{'String': '4.75'}]}}],
+         'LinkedRecords': {'CID': [176]}},
+    ]
+    jsonl_path = tmp_path / 'annotations.jsonl'
+    jsonl_path.write_text('\n'.join(json.dumps(annotation) for annotation in annotations), encoding='utf-8')
+    db = IndexedDB(TinyDB(storage=MemoryStorage)) if indexed else TinyDB(storage=MemoryStorage)
+    read = []
+    inserts = []
+    insert_multiple = db.insert_multiple
+
+    def counted_iter_annotations(path):
+        for annotation in iter_annotations(path):
+            read.append(annotation)
+            yield annotation
+
+    def counted_insert_multiple(documents):
+        inserts.append(len(read))
+        return insert_multiple(documents)
+
+    property_reads = []
+
+    def counted_read_properties(path, cids=None):
+        property_reads.append(path)
+        return read_properties(path, cids)
+
+    monkeypatch.setattr('src.bulk_import.iter_annotations', counted_iter_annotations)
+    monkeypatch.setattr('src.bulk_import.read_properties', counted_read_properties)
+    monkeypatch.setattr(db, 'insert_multiple', counted_insert_multiple)
+    monkeypatch.setattr('src.bulk_import.BATCH_SIZE', 1)
+
+    stats = bulk_import([str(jsonl_path)], db, properties_path=properties_path)
+
+    assert stats == {'annotations': 5, 'compounds': 3, 'added': 2, 'existing': 0, 'no_identifiers': 1}
+    # Each compound is inserted once read (annotations read so far), not at the end
+    assert inserts == [1, 2]
+    # The property table is read once, not once per batch
+    assert property_reads == [properties_path]
+    acetic_acid = dict(ACETIC_ACID, pKa_values=ACETIC_ACID['pKa_values'] + [{'pKa': '4.75', 'reference': 'DrugBank'}])
+    assert [record for _, record in search_db('64-19-7', db)] == [acetic_acid]
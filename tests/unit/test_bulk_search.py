@@ -0,0 +1,62 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.bulk_search import search_pka_parallel
+from src.search_pka import search_pka_many
+from src.snapshot import build_snapshot
+
+
+RECORDS = [
+    {'Substance_CASRN': '64-19-7', 'InChIKey': 'QTBSBXVTEAMEQO-UHFFFAOYSA-N', 'pKa': '4.76'},
+    {'Substance_CASRN': '108-95-2', 'Canonical_SMILES': 'C1=CC=C(C=C1)O', 'pKa': '9.99'},
+    {'Substance_CASRN': '108-95-2', 'InChIKey': 'ISWSIDIOOBJBQZ-UHFFFAOYSA-N', 'pKa': '9.9'},
+]
+
+METHANOL = {'source': 'Pubchem', 'Substance_CASRN': '67-56-1', 'InChIKey': 'OKKJLVBELUTLKV-UHFFFAOYSA-N', 'pKa': '15.3'}
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    path = str(tmp_path / 'pka_snapshot.bin')
+    build_snapshot(RECORDS, path)
+    return path
+
+
+@pytest.fixture
+def pubchem_calls(monkeypatch):
+    calls = []
+
+    def fake_pka_lookup_pubchem(identifier, **kwargs):
+        calls.append(identifier)
+        return dict(METHANOL) if identifier == '67-56-1' else None
+
+    # Pubchem is only searched by this process
+    monkeypatch.setattr('search_pka.pka_lookup_pubchem', fake_pka_lookup_pubchem)
+    return calls
+
+
+def test_search_pka_parallel(snapshot_path, pubchem_calls):
+    identifiers = ['108-95-2', '67-56-1', '64-19-7', 'unknown', '108-95-2', '', 'C1=CC=C(C=C1)O'] * 3
+    database = TinyDB(storage=MemoryStorage)
+
+    results = search_pka_parallel(identifiers, database, snapshot_path=snapshot_path, processes=2, chunk_size=2)
+
+    assert [result and [record['pKa'] for record in result] if isinstance(result, list) else result
+            for result in results[:7]] == [['9.99', '9.9'], METHANOL, ['4.76'], None, ['9.99', '9.9'], None, ['9.99']]
+    assert [record.doc_id for record in results[0]] == [2, 3]
+    # Misses of the snapshot are searched once, by the parent process that writes the new records
+    assert pubchem_calls == ['67-56-1', 'unknown']
+    assert database.all() == [METHANOL]
+
+
+def test_same_as_search_pka_many(snapshot_path, pubchem_calls):
+    identifiers = ['108-95-2', '64-19-7', 'ISWSIDIOOBJBQZ-UHFFFAOYSA-N', 'unknown']
+    database = TinyDB(storage=MemoryStorage)
+    database.insert_multiple(RECORDS)
+
+    assert search_pka_parallel(identifiers, database, snapshot_path=snapshot_path, processes=2) == \
+        search_pka_many(identifiers, database)
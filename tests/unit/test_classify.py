@@ -1,5 +1,5 @@
 import pytest
-from src.classify import classify
+from src.classify import classify, classify_many
 
 
 @pytest.mark.parametrize(
@@ -45,3 +45,22 @@ def test_classify_return_answer(input, expect):
 def test_classify_return_None(input, expect):
     result = classify(input)
     assert result == expect
+
+
+def test_classify_many():
+    identifiers = ['64-19-7', 'InChI=1S/C2H6O/c1-2-3/h3H,2H2,1H3', 'VZXOZSQDJJNBRC-UHFFFAOYSA-N',
+                   'C1=CC(=CC=C1F)S', '64-19-7', 'InChI=1S/', '']
+    assert classify_many(identifiers) == ['cas', 'inchi', 'inchikey', 'smiles', 'cas', None, None]
+    assert classify_many(identifiers) == [classify(identifier) for identifier in identifiers]
+
+
+@pytest.mark.parametrize(
+    'input, expect', [
+        ('64-19-7\n', 'cas'),    # '$' also matches before a trailing newline
+        ('64-19-7x', None),
+        ('ABCDEFGHIJKLMN-ABCDEFGHIJxyz', 'inchikey'),    # InChIKey pattern only checks the start
+        ('InChI=1S/', None),
+    ]
+)
+def test_classify_prefilter_edge_cases(input, expect):
+    assert classify(input) == expect
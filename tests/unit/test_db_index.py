@@ -0,0 +1,76 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.db_index import IndexedDB
+from src.search_pka import search_db
+
+
+RECORDS = [
+    {
+        'Substance_CASRN': '64-19-7',
+        'IUPAC_Name': 'acetic acid',
+        'InChI': 'InChI=1S/C2H4O2/c1-2(3)4/h1H3,(H,3,4)',
+        'InChIKey': 'QTBSBXVTEAMEQO-UHFFFAOYSA-N',
+        'Canonical_SMILES': 'CC(=O)O',
+        'Isomeric_SMILES': 'CC(=O)O',
+        'pKa': '4.76 at 25 °C',
+    },
+    {
+        'Substance_CASRN': '108-95-2',
+        'InChIKey': 'ISWSIDIOOBJBQZ-UHFFFAOYSA-N',
+        'Original_SMILES': 'OC1=CC=CC=C1',
+        'Structure_SMILES': 'OC1=CC=CC=C1',
+        'pKa': '9.99',
+    },
+    {
+        'Substance_CASRN': '108-95-2',
+        'InChIKey': 'ISWSIDIOOBJBQZ-UHFFFAOYSA-N',
+        'Canonical_SMILES': 'C1=CC=C(C=C1)O',
+        'pKa': '9.9',
+    },
+]
+
+
+@pytest.fixture
+def db():
+    database = TinyDB(storage=MemoryStorage)
+    database.insert_multiple(RECORDS)
+    return database
+
+
+@pytest.mark.parametrize(
+    'identifier', [
+        '64-19-7',
+        'acetic acid',
+        'QTBSBXVTEAMEQO-UHFFFAOYSA-N',
+        '108-95-2',
+        'OC1=CC=CC=C1',
+        'C1=CC=C(C=C1)O',
+        'ISWSIDIOOBJBQZ-UHFFFAOYSA-N',
+        'not in db',
+    ]
+)
+def test_indexed_search_same_as_scan(db, identifier):
+    assert search_db(identifier, IndexedDB(db)) == search_db(identifier, db)
+
+
+def test_insert_keeps_index_in_sync(db):
+    indexed_db = IndexedDB(db)
+    assert search_db('CO', indexed_db) == []
+
+    doc_id = indexed_db.insert({'InChIKey': 'OKKJLVBELUTLKV-UHFFFAOYSA-N', 'Canonical_SMILES': 'CO', 'pKa': '15.3'})
+
+    result = search_db('CO', indexed_db)
+    assert [record_id for record_id, _ in result] == [doc_id]
+    assert result == search_db('CO', db)
+    assert len(indexed_db) == len(db) == 4
+
+
+def test_lookup_restricted_fields(db):
+    indexed_db = IndexedDB(db)
+    assert indexed_db.lookup('108-95-2', fields=['InChIKey']) == []
+    assert len(indexed_db.lookup('108-95-2', fields=['Substance_CASRN'])) == 2
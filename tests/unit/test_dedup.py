@@ -0,0 +1,114 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import threading
+import time
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.db_index import IndexedDB
+from src.dedup import DedupIndex, deduplicate, record_hash
+from src.search_pka import add_pubchem_result, search_db
+from src.sqlite_db import SQLiteDB
+
+
+METHANOL = {
+    'source': 'Pubchem',
+    'Pubchem_CID': '887',
+    'Substance_CASRN': '67-56-1',
+    'pKa': '15.3',
+    'reference': 'Serjeant, E.P., Dempsey B.',
+    'InChIKey': 'OKKJLVBELUTLKV-UHFFFAOYSA-N',
+}
+
+
+def test_record_hash():
+    # Only InChIKey, source, pKa and reference make the hash
+    assert record_hash(METHANOL) == record_hash(dict(METHANOL, Substance_CASRN='', Pubchem_CID='0'))
+    assert record_hash(METHANOL) != record_hash(dict(METHANOL, pKa='15.5'))
+    assert record_hash(METHANOL) != record_hash(dict(METHANOL, reference=None))
+    assert record_hash({'pKa': '15.3'}) is None
+
+
+def test_dedup_index():
+    db = TinyDB(storage=MemoryStorage)
+    db.insert(METHANOL)
+    dedup = DedupIndex(db)
+    assert len(dedup) == 1 and METHANOL in dedup
+
+    assert dedup.add(dict(METHANOL, Substance_CASRN='')) is False
+    assert dedup.add(dict(METHANOL, pKa='15.5')) is True
+    assert dedup.add(dict(METHANOL, pKa='15.5')) is False
+    assert dedup.add({'pKa': '1'}) is False
+
+
+@pytest.mark.parametrize('with_index', [False, True])
+def test_add_pubchem_result(with_index):
+    db = TinyDB(storage=MemoryStorage)
+    dedup = DedupIndex(db) if with_index else None
+
+    assert add_pubchem_result(METHANOL, db, dedup=dedup) == METHANOL
+    # Same content found with another identifier (other CAS): not added again
+    assert add_pubchem_result(dict(METHANOL, Substance_CASRN='67-56-1 '), db, dedup=dedup) is None
+    assert add_pubchem_result(dict(METHANOL, pKa='15.5'), db, dedup=dedup)['pKa'] == '15.5'
+    assert add_pubchem_result(None, db, dedup=dedup) is None
+    assert len(db) == 2
+
+
+def test_deduplicate(tmp_path):
+    db = TinyDB(str(tmp_path / 'tinydb_db.json'))
+    db.insert_multiple([METHANOL, dict(METHANOL, Substance_CASRN=''), dict(METHANOL, pKa='15.5'),
+                        METHANOL, {'pKa': '1'}, {'pKa': '1'}])
+
+    assert deduplicate(db, dry_run=True) == [2, 4]
+    assert len(db) == 6
+    assert deduplicate(db) == [2, 4]
+    assert [record.doc_id for record in db.all()] == [1, 3, 5, 6]
+    assert deduplicate(db) == []
+
+
+def test_deduplicate_indexed_and_sqlite(tmp_path):
+    indexed = IndexedDB(TinyDB(storage=MemoryStorage))
+    sqlite = SQLiteDB(str(tmp_path / 'pka_db.sqlite3'))
+    for db in (indexed, sqlite):
+        db.insert_multiple([METHANOL, METHANOL])
+        assert deduplicate(db) == [2]
+        assert [doc_id for doc_id, _ in search_db('67-56-1', db)] == [1]
+    sqlite.close()
+
+
+def test_add_pubchem_result_failed_insert_is_not_indexed():
+    db = TinyDB(storage=MemoryStorage)
+    dedup = DedupIndex(db)
+
+    class LockedDB:
+        def insert(self, document):
+            raise RuntimeError('database is locked')
+
+    with pytest.raises(RuntimeError):
+        add_pubchem_result(METHANOL, LockedDB(), dedup=dedup)
+    assert METHANOL not in dedup
+    assert add_pubchem_result(METHANOL, db, dedup=dedup) == METHANOL
+    assert METHANOL in dedup and len(db) == 1
+
+
+def test_add_pubchem_result_from_several_threads():
+    class SlowDB:
+        def __init__(self):
+            self.records = []
+
+        def insert(self, document):
+            time.sleep(0.1)
+            self.records.append(document)
+
+    db = SlowDB()
+    dedup = DedupIndex()
+    threads = [threading.Thread(target=add_pubchem_result, args=(METHANOL, db), kwargs={'dedup': dedup})
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert db.records == [METHANOL]
@@ -0,0 +1,87 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.instrumentation import Metrics, count, disable, enable, metrics as current_metrics, span
+from src.search_pka import search_pka, search_pka_many
+
+
+@pytest.fixture
+def metrics():
+    # The modules of src/ import each other by their flat name: enable that copy
+    import instrumentation
+    yield instrumentation.enable()
+    instrumentation.disable()
+
+
+def test_disabled_is_a_no_op():
+    disable()
+    assert current_metrics() is None
+    assert span('a') is span('b')    # one shared no-op context manager
+    with span('a'):
+        count('a')
+
+
+def test_spans_and_counters():
+    hooked = []
+    metrics = enable(hooks=[lambda stage, start, duration, attributes, error:
+                            hooked.append((stage, attributes, type(error).__name__))])
+    try:
+        with span('parse', size=3):
+            pass
+        with pytest.raises(ValueError):
+            with span('parse'):
+                raise ValueError()
+        count('hits')
+        count('hits', 2)
+    finally:
+        disable()
+
+    stages = metrics.stages()
+    assert (stages['parse']['count'], stages['parse']['errors']) == (2, 1)
+    assert stages['parse']['min'] <= stages['parse']['mean'] <= stages['parse']['max']
+    assert metrics.counters() == {'hits': 3}
+    assert hooked == [('parse', {'size': 3}, 'NoneType'), ('parse', {}, 'ValueError')]
+
+    report = metrics.report()
+    assert 'parse' in report and 'hits' in report
+
+    prometheus = metrics.to_prometheus().splitlines()
+    assert '# TYPE pka_lookup_stage_seconds summary' in prometheus
+    assert 'pka_lookup_stage_seconds_count{stage="parse"} 2' in prometheus
+    assert 'pka_lookup_stage_errors_total{stage="parse"} 1' in prometheus
+    assert 'pka_lookup_hits_total 3' in prometheus
+
+    metrics.reset()
+    assert metrics.stages() == {} and metrics.counters() == {}
+
+
+def test_search_pka_stages(pubchem_server, metrics):
+    db = TinyDB(storage=MemoryStorage)
+    assert search_pka('64-19-7', db)['pKa'] == '4.76 at 25 °C'
+    assert search_pka('64-19-7', db)[0]['pKa'] == '4.76 at 25 °C'
+    search_pka_many(['64-19-7', '2950-43-8'], db)
+
+    stages = metrics.stages()
+    assert {'search_db', 'classify', 'rate_limit', 'get_cids', 'get_synonyms', 'get_properties',
+            'get_pka_xml', 'pka_parse', 'db_insert'} <= set(stages)
+    assert stages['search_db']['count'] == 3
+    counters = metrics.counters()
+    assert (counters['db_hits'], counters['db_misses'], counters['pubchem_misses']) == (2, 2, 1)
+    assert counters['pubchem_requests'] == len(pubchem_server.requests)
+
+
+def test_pubchem_retries_counted(pubchem_server, metrics):
+    pubchem_server.busy = 2
+    search_pka('64-19-7', TinyDB(storage=MemoryStorage))
+    assert metrics.counters()['pubchem_retries'] == 2
+
+
+def test_metrics_class_without_enable():
+    metrics = Metrics()
+    with metrics.span('a'):
+        pass
+    assert metrics.stages()['a']['count'] == 1
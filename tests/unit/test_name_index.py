@@ -0,0 +1,104 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.name_index import NameIndex, name_key
+from src.search_pka import search_pka, search_pka_many
+from src.snapshot import DATA_FILE, read_csv
+
+
+ACETIC_ACID = {
+    'Substance_CASRN': '64-19-7',
+    'IUPAC_Name': 'acetic acid',
+    'Substance_Name': 'Ethanoic acid',
+    'InChIKey': 'QTBSBXVTEAMEQO-UHFFFAOYSA-N',
+    'pKa': '4.76 at 25 °C',
+}
+ACRYLIC_ACID = {
+    'Substance_CASRN': '79-10-7',
+    'Substance_Name': 'Acrylic acid',
+    'InChIKey': 'NIXOWILDQLNWCW-UHFFFAOYSA-N',
+    'pKa': '4.25',
+}
+PHENOL = {'Substance_Name': 'NoName_12', 'InChIKey': 'ISWSIDIOOBJBQZ-UHFFFAOYSA-N', 'pKa': '9.99'}
+
+
+@pytest.mark.parametrize(
+    "name, expected", [
+        ('Acetic Acid', 'aceticacid'),
+        ('acetic-acid', 'aceticacid'),
+        (' ACETIC_ACID ', 'aceticacid'),
+        ('Phenol, 2,6-dibromo-', 'phenol26dibromo'),
+    ]
+)
+def test_name_key(name, expected):
+    assert name_key(name) == expected
+
+
+def test_lookup_and_complete():
+    names = NameIndex([ACETIC_ACID, ACRYLIC_ACID, PHENOL, {'Substance_Name': 'no InChIKey'}])
+    assert len(names) == 3    # placeholder names and records without InChIKey are not indexed
+
+    assert names.lookup('Acetic-Acid') == [ACETIC_ACID['InChIKey']]
+    assert names.lookup('ETHANOIC ACID') == [ACETIC_ACID['InChIKey']]
+    assert names.lookup('NoName_12') == []
+
+    assert names.complete('ac') == [('acetic acid', [ACETIC_ACID['InChIKey']]),
+                                    ('Acrylic acid', [ACRYLIC_ACID['InChIKey']])]
+    assert [name for name, _ in names.complete('A', limit=1)] == ['acetic acid']
+    assert names.complete('acr') == [('Acrylic acid', [ACRYLIC_ACID['InChIKey']])]
+    assert names.complete('-') == [] and names.complete('xyz') == []
+
+    # A synonym of acrylic acid, added after the first completion
+    names.add('Acroleic acid', ACRYLIC_ACID['InChIKey'])
+    assert [name for name, _ in names.complete('acr')] == ['Acroleic acid', 'Acrylic acid']
+
+
+def test_fuzzy():
+    names = NameIndex([ACETIC_ACID, ACRYLIC_ACID])
+    results = names.fuzzy('acetc acid')
+    assert results[0][:2] == ('acetic acid', [ACETIC_ACID['InChIKey']])
+    assert results[0][2] > results[1][2]
+    assert names.fuzzy('acetic acid')[0][2] == 1
+    assert names.fuzzy('benzene') == []
+
+
+def test_fuzzy_over_dataset():
+    records = read_csv(DATA_FILE)
+    names = NameIndex(records)
+    assert names.fuzzy('Phenol, 2,6-dibromo')[0][0] == 'Phenol, 2,6-dibromo-'
+    assert names.fuzzy('2,6-dibromophenol', min_similarity=0.9) == []
+
+
+def test_search_pka_by_name(monkeypatch):
+    monkeypatch.setattr('src.search_pka.pka_lookup_pubchem', lambda *args, **kwargs: None)
+    db = TinyDB(storage=MemoryStorage)
+    db.insert_multiple([ACETIC_ACID, ACRYLIC_ACID])
+    names = NameIndex.from_database(db)
+
+    assert search_pka('Acetic-Acid', db) is None
+    assert search_pka('Acetic-Acid', db, names=names) == [ACETIC_ACID]
+    assert search_pka('ethanoic acid', db, names=names) == [ACETIC_ACID]
+    assert search_pka_many(['ACRYLIC ACID', 'acetic acid', 'benzene'], db, names=names) == [
+        [ACRYLIC_ACID], [ACETIC_ACID], None]
+
+
+def test_smiles_are_not_looked_up_as_names(monkeypatch):
+    lookups = []
+    monkeypatch.setattr('src.search_pka.pka_lookup_pubchem', lambda identifier, **kwargs: lookups.append(identifier))
+    cobalt = {'Substance_CASRN': '7440-48-4', 'InChIKey': 'GUTLYIVDDKVIGB-UHFFFAOYSA-N', 'pKa': '1.0'}
+    db = TinyDB(storage=MemoryStorage)
+    db.insert(cobalt)
+    names = NameIndex()
+    names.add_synonyms(cobalt['InChIKey'], ['Co', 'Cobalt'])
+
+    # Formaldehyde and methanol SMILES, not cobalt
+    assert search_pka('C=O', db, names=names) is None
+    assert search_pka('CO', db, names=names) is None
+    assert lookups == ['C=O', 'CO']
+    assert search_pka('Co', db, names=names) == [cobalt]
+    assert search_pka('COBALT', db, names=names) == [cobalt]
+    assert names.lookup('co') == []
@@ -0,0 +1,79 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.negative_cache import NegativeCache, NO_PKA, NOT_EXACT_MATCH, NOT_FOUND
+from src.pka_lookup_pubchem import pka_lookup_pubchem
+from src.search_pka import search_pka, search_pka_many
+
+
+@pytest.fixture
+def db():
+    return TinyDB(storage=MemoryStorage)
+
+
+def test_add_get_remove(db):
+    cache = NegativeCache(db.table('negative_cache'))
+    assert cache.get('2950-43-8') is None
+
+    cache.add('2950-43-8', NO_PKA)
+    assert cache.get('2950-43-8')['reason'] == NO_PKA
+    assert '2950-43-8' in cache
+
+    cache.add('2950-43-8', NOT_FOUND)
+    assert cache.get('2950-43-8')['reason'] == NOT_FOUND
+    assert len(db.table('negative_cache')) == 1
+
+    cache.remove('2950-43-8')
+    assert '2950-43-8' not in cache
+    assert len(db.table('negative_cache')) == 0
+
+
+def test_entries_are_saved_in_table(db):
+    NegativeCache(db.table('negative_cache')).add('2950-43-8', NO_PKA)
+
+    cache = NegativeCache(db.table('negative_cache'))
+    assert cache.get('2950-43-8')['reason'] == NO_PKA
+
+
+def test_expired_entries(db):
+    cache = NegativeCache(db.table('negative_cache'), ttl=60)
+    cache.add('2950-43-8', NO_PKA, ttl=-1)
+    cache.add('00000-00-0', NOT_FOUND, ttl=-1)
+    cache.add('1000-00-0', NOT_EXACT_MATCH)
+
+    assert '2950-43-8' not in cache
+    assert cache.purge_expired() == 1
+    assert len(cache) == len(db.table('negative_cache')) == 1
+
+
+@pytest.mark.parametrize(
+    'identifier, reason', [
+        ('2950-43-8', NO_PKA),
+        ('00000-00-0', NOT_FOUND),
+        ('1000-00-0', NOT_EXACT_MATCH),
+    ]
+)
+def test_pka_lookup_pubchem_miss_reason(pubchem_server, identifier, reason):
+    misses = []
+    assert pka_lookup_pubchem(identifier, on_miss=lambda *miss: misses.append(miss)) is None
+    assert misses == [(identifier, reason)]
+
+
+def test_search_pka_skips_known_misses(db, monkeypatch):
+    calls = []
+
+    def fake_pka_lookup_pubchem(identifier, on_miss=None, **kwargs):
+        calls.append(identifier)
+        on_miss(identifier, NO_PKA)
+
+    monkeypatch.setattr('src.search_pka.pka_lookup_pubchem', fake_pka_lookup_pubchem)
+    cache = NegativeCache(db.table('negative_cache'))
+
+    assert search_pka('2950-43-8', db, negative_cache=cache) is None
+    assert search_pka('2950-43-8', db, negative_cache=cache) is None
+    assert search_pka_many(['2950-43-8', '2950-43-8'], db, negative_cache=cache) == [None, None]
+    assert calls == ['2950-43-8']
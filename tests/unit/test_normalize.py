@@ -0,0 +1,177 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.normalize import IdentifierNormalizer, normalize_identifier
+from src.result_cache import ResultCache
+from src.search_pka import search_pka, search_pka_many
+from src.sqlite_db import SQLiteDB
+
+
+PHENOL_INCHIKEY = 'ISWSIDIOOBJBQZ-UHFFFAOYSA-N'
+PHENOL_1 = {'Substance_CASRN': '108-95-2', 'Original_SMILES': 'OC1=CC=CC=C1',
+            'InChIKey': PHENOL_INCHIKEY, 'pKa': '9.99'}
+PHENOL_2 = {'Substance_CASRN': '108-95-2', 'Canonical_SMILES': 'C1=CC=C(C=C1)O',
+            'InChIKey': PHENOL_INCHIKEY, 'pKa': '10.0'}
+THIOPHENOL = {
+    'source': 'Pubchem',
+    'Substance_CASRN': '108-98-5',
+    'Canonical_SMILES': 'C1=CC=C(C=C1)S',
+    'InChI': 'InChI=1S/C6H6S/c7-6-4-2-1-3-5-6/h1-5,7H',
+    'InChIKey': 'RMVRSNDYEFQCLF-UHFFFAOYSA-N',
+    'pKa': '6.62',
+}
+
+
+@pytest.mark.parametrize(
+    "identifier, expected", [
+        ('  64-19-7\n', '64-19-7'),
+        ('0064-19-7', '64-19-7'),
+        ('qtbsbxvteameqo-uhfffaoysa-n', 'QTBSBXVTEAMEQO-UHFFFAOYSA-N'),
+        ('InChI=1/CH4O/c1-2/h2H,1H3', 'InChI=1S/CH4O/c1-2/h2H,1H3'),
+        ('inchi=1S/CH4O/c1-2/h2H,1H3', 'InChI=1S/CH4O/c1-2/h2H,1H3'),
+        # A fixed-H layer makes a non-standard InChI different from the standard one
+        ('InChI=1/C2H4O2/c1-2(3)4/h1H3,(H,3,4)/f/h3H', 'InChI=1/C2H4O2/c1-2(3)4/h1H3,(H,3,4)/f/h3H'),
+        # SMILES and names are case sensitive
+        ('c1ccccc1', 'c1ccccc1'),
+        (' acetic acid ', 'acetic acid'),
+    ]
+)
+def test_normalize_identifier(identifier, expected):
+    assert normalize_identifier(identifier) == expected
+
+
+@pytest.mark.parametrize('storage', ['sqlite', 'tinydb'])
+def test_aliases_are_saved(tmp_path, storage):
+    if storage == 'sqlite':
+        table = SQLiteDB(str(tmp_path / 'db.sqlite3')).table('aliases')
+    else:
+        table = TinyDB(storage=MemoryStorage).table('aliases')
+
+    normalizer = IdentifierNormalizer(table)
+    normalizer.learn_record(THIOPHENOL, identifier='SC1=CC=CC=C1')
+    assert normalizer.canonical_key('SC1=CC=CC=C1 ') == THIOPHENOL['InChIKey']
+    assert normalizer.canonical_key('InChI=1/C6H6S/c7-6-4-2-1-3-5-6/h1-5,7H') == THIOPHENOL['InChIKey']
+    assert normalizer.canonical_key('0108-98-5') == THIOPHENOL['InChIKey']
+    assert normalizer.canonical_key('not learned') == 'not learned'
+
+    normalizer.learn('SC1=CC=CC=C1', 'OTHER-UHFFFAOYSA-N')
+    reloaded = IdentifierNormalizer(table)
+    assert len(reloaded) == len(normalizer) == 4
+    assert reloaded.alias('SC1=CC=CC=C1') == 'OTHER-UHFFFAOYSA-N'
+
+
+def test_equivalent_smiles_share_one_key():
+    db = TinyDB(storage=MemoryStorage)
+    db.insert_multiple([PHENOL_1, PHENOL_2])
+    normalizer = IdentifierNormalizer()
+
+    # Both spellings of phenol give all the records of phenol
+    assert search_pka('OC1=CC=CC=C1', db, normalizer=normalizer) == [PHENOL_1, PHENOL_2]
+    assert search_pka(' C1=CC=C(C=C1)O', db, normalizer=normalizer) == [PHENOL_1, PHENOL_2]
+    assert normalizer.canonical_key('OC1=CC=CC=C1') == PHENOL_INCHIKEY
+
+    # and one cache entry
+    cache = ResultCache()
+    search_pka('OC1=CC=CC=C1', db, cache=cache, normalizer=normalizer)
+    search_pka('C1=CC=C(C=C1)O', db, cache=cache, normalizer=normalizer)
+    assert list(cache._entries) == [PHENOL_INCHIKEY]
+    assert cache.stats()['hits'] == 1
+
+
+def test_pubchem_aliases_hit_local_database(monkeypatch):
+    lookups = []
+
+    def lookup(identifier, **kwargs):
+        lookups.append(identifier)
+        return dict(THIOPHENOL)
+
+    monkeypatch.setattr('src.search_pka.pka_lookup_pubchem', lookup)
+    db = TinyDB(storage=MemoryStorage)
+    normalizer = IdentifierNormalizer()
+
+    assert search_pka('SC1=CC=CC=C1', db, normalizer=normalizer) == THIOPHENOL
+    # Same query, another notation of the InChI and another SMILES: found locally
+    assert search_pka('SC1=CC=CC=C1', db, normalizer=normalizer) == [THIOPHENOL]
+    assert search_pka('InChI=1/C6H6S/c7-6-4-2-1-3-5-6/h1-5,7H', db, normalizer=normalizer) == [THIOPHENOL]
+    assert search_pka_many(['C1=CC=C(C=C1)S', 'SC1=CC=CC=C1'], db,
+                           normalizer=normalizer) == [[THIOPHENOL], [THIOPHENOL]]
+    assert lookups == ['SC1=CC=CC=C1']
+
+
+def test_search_pka_many_searches_equivalent_identifiers_once(monkeypatch):
+    lookups = []
+
+    def lookup(identifier, **kwargs):
+        lookups.append(identifier)
+        return None
+
+    monkeypatch.setattr('src.search_pka.pka_lookup_pubchem', lookup)
+    db = TinyDB(storage=MemoryStorage)
+    db.insert(PHENOL_1)
+
+    results = search_pka_many(['0108-95-2', '108-95-2 ', 'unknown', ' unknown'], db,
+                              normalizer=IdentifierNormalizer())
+    assert results == [[PHENOL_1], [PHENOL_1], None, None]
+    assert lookups == ['unknown']
+
+
+def test_learn_synonyms():
+    table = TinyDB(storage=MemoryStorage).table('aliases')
+    normalizer = IdentifierNormalizer(table)
+    normalizer.learn('108-95-2', 'OTHER-UHFFFAOYSA-N')
+
+    added = normalizer.learn_synonyms(PHENOL_INCHIKEY, ['Phenol', '0108-95-2', 'Carbolic acid', 'Phenol', '',
+                                                        PHENOL_INCHIKEY, 'OC1=CC=CC=C1', 'OH'])
+    assert added == 2
+    # Known aliases are not replaced by a synonym
+    assert normalizer.alias('108-95-2') == 'OTHER-UHFFFAOYSA-N'
+    # Synonyms are only searched when not found as they are (see search_pka())
+    assert normalizer.canonical_key(' Carbolic acid') == 'Carbolic acid'
+    assert normalizer.synonym('Carbolic acid') == PHENOL_INCHIKEY
+    # SMILES and short tokens are not learned
+    assert normalizer.alias('OC1=CC=CC=C1') is None and normalizer.alias('OH') is None
+    assert normalizer.learn_synonyms(PHENOL_INCHIKEY, ['Phenol']) == 0
+    assert IdentifierNormalizer(table).alias('Phenol') == PHENOL_INCHIKEY
+
+
+def test_synonym_does_not_hide_local_record(monkeypatch):
+    lookups = []
+    monkeypatch.setattr('src.search_pka.pka_lookup_pubchem',
+                        lambda identifier, **kwargs: lookups.append(identifier))
+    acetic_acid = {'Substance_CASRN': '64-19-7', 'InChIKey': 'QTBSBXVTEAMEQO-UHFFFAOYSA-N', 'pKa': '4.76'}
+    sodium_acetate = {'Substance_CASRN': '127-09-3', 'InChIKey': 'VMHLLURERBWHNL-UHFFFAOYSA-M', 'pKa': '4.75'}
+    db = TinyDB(storage=MemoryStorage)
+    db.insert_multiple([acetic_acid, sodium_acetate])
+    normalizer = IdentifierNormalizer()
+    normalizer.learn_synonyms(acetic_acid['InChIKey'], ['Ethanoic acid', '127-09-3'])
+
+    for many in (False, True):
+        search = (lambda identifier, *args, **kwargs: search_pka_many([identifier], *args, **kwargs)[0]) if many \
+            else search_pka
+        assert search('127-09-3', db, normalizer=normalizer) == [sodium_acetate]
+        # A synonym not found as it is gives the records of its compound
+        assert search('ethanoic acid', db, normalizer=normalizer) is None
+        assert search('Ethanoic acid', db, normalizer=normalizer) == [acetic_acid]
+    assert lookups == ['ethanoic acid', 'ethanoic acid']
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_pubchem_synonyms_resolve_locally(pubchem_server, max_workers):
+    from src.name_index import NameIndex
+
+    db = TinyDB(storage=MemoryStorage)
+    normalizer = IdentifierNormalizer()
+    names = NameIndex()
+
+    acetic_acid, methanol = search_pka_many(['64-19-7', 'methanol'], db, max_workers=max_workers,
+                                            normalizer=normalizer, names=names)
+    requests = len(pubchem_server.requests)
+    # Synonyms Pubchem gave for the compounds found, not names its name lookup knows
+    assert search_pka('Glacial acetic acid', db, normalizer=normalizer, names=names) == [acetic_acid]
+    assert search_pka('ethanoic acid', db, normalizer=normalizer, names=names) == [acetic_acid]
+    assert search_pka('METHYL-ALCOHOL', db, normalizer=normalizer, names=names) == [methanol]
+    assert len(pubchem_server.requests) == requests
@@ -1,8 +1,10 @@
 import sys, os
 sys.path.append(os.path.realpath('src'))
 
+import time
+
 import pytest
-from src.pka_lookup_pubchem import pka_lookup_pubchem
+from src.pka_lookup_pubchem import pka_lookup_pubchem, pka_lookup_pubchem_many
 
 
 @pytest.mark.parametrize(
@@ -340,3 +342,158 @@ def test_pka_lookup_pubchem_with_namespace_debugmode(set_debug, capsys, input, n
     captured = capsys.readouterr()
     assert result == expect
     assert error in captured.out
+
+
+# The following tests use a local mock Pubchem server (see conftest.py), no network needed
+
+def test_pka_lookup_pubchem_mock_server(pubchem_server):
+    result = pka_lookup_pubchem('64-19-7')
+    assert result == {
+        'source': 'Pubchem',
+        'Pubchem_CID': '176',
+        'Substance_CASRN': '64-19-7',
+        'pKa': '4.76 at 25 °C',
+        'reference': 'Serjeant, E.P., Dempsey B.; IUPAC Chemical Data Series No. 23',
+        'Canonical_SMILES': 'CC(=O)O',
+        'Isomeric_SMILES': 'CC(=O)O',
+        'InChI': 'InChI=1S/C2H4O2/c1-2(3)4/h1H3,(H,3,4)',
+        'InChIKey': 'QTBSBXVTEAMEQO-UHFFFAOYSA-N',
+        'IUPAC_Name': 'acetic acid',
+    }
+
+
+def test_pka_lookup_pubchem_reports_synonyms(pubchem_server):
+    harvested = []
+    on_synonyms = lambda *synonyms: harvested.append(synonyms)
+
+    pka_lookup_pubchem('64-19-7', on_synonyms=on_synonyms)
+    assert harvested == [('QTBSBXVTEAMEQO-UHFFFAOYSA-N', ['acetic acid', 'ethanoic acid', '64-19-7', 'Glacial acetic acid'])]
+
+    # Once per compound found, not for misses
+    harvested.clear()
+    pka_lookup_pubchem_many(['64-19-7', 'acetic acid', '2950-43-8', 'methanol'], max_workers=2, on_synonyms=on_synonyms)
+    assert sorted(inchikey for inchikey, _ in harvested) == ['OKKJLVBELUTLKV-UHFFFAOYSA-N', 'QTBSBXVTEAMEQO-UHFFFAOYSA-N']
+
+
+def test_pka_lookup_pubchem_many(pubchem_server):
+    identifiers = ['64-19-7', '2950-43-8', 'OKKJLVBELUTLKV-UHFFFAOYSA-N', '64-19-7', '00000-00-0']
+    results = pka_lookup_pubchem_many(identifiers, max_workers=4)
+
+    assert [result and result['Pubchem_CID'] for result in results] == ['176', None, '887', '176', None]
+    assert results[0] is results[3]    # duplicates are looked up only once
+
+
+def test_pka_lookup_pubchem_many_batches_requests(pubchem_server):
+    identifiers = ['64-19-7', '2950-43-8', 'OKKJLVBELUTLKV-UHFFFAOYSA-N', '1000-00-0', '00000-00-0', 'acetic acid']
+    misses = []
+    results = pka_lookup_pubchem_many(identifiers, max_workers=4, on_miss=lambda *miss: misses.append(miss))
+
+    paths = [path for _, _, path in pubchem_server.requests]
+    # Synonyms and properties of all the compounds found come in one request each
+    assert sum('/synonyms/' in path for path in paths) == 1
+    assert sum('/property/' in path for path in paths) == 1
+    # pKa is requested once per compound exactly matched (not for '1000-00-0')
+    assert sum('pug_view' in path for path in paths) == 3
+
+    expected_misses = []
+    expected = [pka_lookup_pubchem(identifier, on_miss=lambda *miss: expected_misses.append(miss))
+                for identifier in identifiers]
+    assert results == expected
+    assert sorted(misses) == sorted(expected_misses)
+
+
+def test_pka_lookup_pubchem_backs_off_when_busy(pubchem_server):
+    pubchem_server.busy = 2
+    result = pka_lookup_pubchem('64-19-7')
+    assert result['pKa'] == '4.76 at 25 °C'
+    # 2 busy answers were retried on top of the 4 normal requests
+    assert len(pubchem_server.requests) == 6
+
+
+def test_pka_lookup_pubchem_error_rate(pubchem_server):
+    pubchem_server.error_rate = 1
+    assert pka_lookup_pubchem('64-19-7') is None
+    # Only busy answers: the first request is tried 1 + MAX_RETRIES times
+    assert len(pubchem_server.requests) == 4
+
+
+def test_pka_lookup_pubchem_recorded_compounds(pubchem_server, tmp_path):
+    import json
+    from mock_pubchem import load_recording, pug_view_xml
+
+    recording = {'1983': {
+        'names': ['103-90-2'],
+        'synonyms': ['acetaminophen', '103-90-2'],
+        'properties': {'InChIKey': 'RZVAJINKPMORJF-UHFFFAOYSA-N', 'CanonicalSMILES': 'CC(=O)NC1=CC=C(C=C1)O'},
+        'pug_view': pug_view_xml([('Recorded reference', 'pKa = 9.38')]),
+    }}
+    path = tmp_path / 'recording.json'
+    path.write_text(json.dumps(recording), encoding='utf-8')
+    pubchem_server.serve(load_recording(str(path)))
+
+    result = pka_lookup_pubchem('103-90-2')
+    assert (result['Pubchem_CID'], result['pKa'], result['reference']) == ('1983', '9.38', 'Recorded reference')
+
+
+def test_pka_lookup_pubchem_many_rate_limited(pubchem_server, monkeypatch):
+    from src.rate_limiter import RateLimiter
+    monkeypatch.setattr('src.pka_lookup_pubchem.rate_limiter', RateLimiter(rate=20, capacity=1))
+
+    pka_lookup_pubchem_many(['64-19-7', 'OKKJLVBELUTLKV-UHFFFAOYSA-N', '2950-43-8'], max_workers=3)
+
+    times = sorted(request_time for request_time, _, _ in pubchem_server.requests)
+    # Every request after the first waits for a new token (1/20 s)
+    assert times[-1] - times[0] >= (len(times) - 1) / 20 * 0.9
+
+
+@pytest.mark.parametrize(
+    'prefetch_pka, expect_requests', [
+        (True, 4),
+        (False, 3),
+    ]
+)
+def test_pka_lookup_pubchem_not_exact_match_prefetch(pubchem_server, prefetch_pka, expect_requests):
+    assert pka_lookup_pubchem('1000-00-0', prefetch_pka=prefetch_pka) is None
+    time.sleep(0.1)    # the prefetched pKa request finishes in the background
+    assert len(pubchem_server.requests) == expect_requests
+    assert any('pug_view' in path for _, _, path in pubchem_server.requests) == prefetch_pka
+
+
+def test_pka_lookup_pubchem_releases_prefetch_on_error(pubchem_server, monkeypatch):
+    import src.pka_lookup_pubchem as lookup_module
+
+    def get_synonyms(*args, **kwargs):
+        raise ConnectionError('synonyms request failed')
+
+    released = []
+    release_response = lookup_module._release_response
+    monkeypatch.setattr(lookup_module.pubchem_api, 'get_synonyms', get_synonyms)
+    monkeypatch.setattr(lookup_module, '_release_response', lambda r: released.append(release_response(r)))
+
+    assert pka_lookup_pubchem('64-19-7') is None
+    deadline = time.monotonic() + 2
+    while not released and time.monotonic() < deadline:
+        time.sleep(0.01)    # the prefetched pKa request finishes in the background
+    assert len(released) == 1
+
+
+def test_pka_lookup_pubchem_no_prefetch_exact_match(pubchem_server):
+    assert pka_lookup_pubchem('67-56-1', prefetch_pka=False)['pKa'] == '15.3'
+
+
+def test_pka_lookup_pubchem_shares_one_executor(pubchem_server, monkeypatch):
+    import src.pka_lookup_pubchem as lookup_module
+
+    executors = []
+    executor_class = lookup_module.ThreadPoolExecutor
+
+    def counted_executor(*args, **kwargs):
+        executors.append(executor_class(*args, **kwargs))
+        return executors[-1]
+
+    monkeypatch.setattr(lookup_module, '_executor', None)
+    monkeypatch.setattr(lookup_module, 'ThreadPoolExecutor', counted_executor)
+    for identifier in ('64-19-7', '67-56-1', '64-19-7'):
+        assert pka_lookup_pubchem(identifier)['pKa']
+    assert len(executors) == 1
+    executors[0].shutdown()
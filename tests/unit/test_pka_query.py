@@ -0,0 +1,90 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import pytest
+
+from src.pka_query import parse_pka, parse_record
+from src.snapshot import DATA_FILE, read_csv
+
+np = pytest.importorskip('numpy')
+from src.pka_query import PkaTable
+
+
+@pytest.mark.parametrize(
+    "text, expected", [
+        ('4.76 at 25 °C', (4.76, None, 25.0, None, None)),
+        ('pKa = 9.99 @ 25 °C', (9.99, None, 25.0, None, None)),
+        ('3.5 +/- 0.1 (in DMSO)', (3.5, 0.1, None, 'DMSO', None)),
+        ('pKa = 4.76 ± 0.02 at 25°C in H2O', (4.76, 0.02, 25.0, 'H2O', None)),
+        ('4.2 in water at 20 deg C', (4.2, None, 20.0, 'H2O', None)),
+        ('pKa1 = 2.15; pKa2 = 7.20', (2.15, None, None, None, None)),
+        ('−1.86', (-1.86, None, None, None, None)),
+        ('10.6 (conjugate acid)', (10.6, None, None, None, 'basic')),
+        ('4.2 (acidic)', (4.2, None, None, None, 'acidic')),
+        ('pK1 = 2.34; pK2 = 9.69 at 25 °C', (2.34, None, 25.0, None, None)),
+        ('4.2 at 20-25 °C', (4.2, None, 22.5, None, None)),
+        ('pKa = -1.5', (-1.5, None, None, None, None)),
+        ('Ka = 1.8X10-5', (4.74, None, None, None, None)),
+        ('pKb = 4.75', (None, None, None, None, 'basic')),
+        ('Kb = 1.8e-5', (None, None, None, None, 'basic')),
+        ('not measured', (None, None, None, None, None)),
+        (None, (None, None, None, None, None)),
+    ]
+)
+def test_parse_pka(text, expected):
+    parsed = parse_pka(text)
+    assert tuple(parsed[key] for key in ('value', 'uncertainty', 'temperature', 'solvent', 'type')) == expected
+
+
+def test_parse_record():
+    parsed = parse_record({'pKa': '10.9', 'temp': '24.9', 'basicOrAcidic': 'acidic'})
+    assert (parsed['value'], parsed['temperature'], parsed['type']) == (10.9, 24.9, 'acidic')
+    assert parse_record({'pKa': '4.76 at 25 °C', 'temp': '20'})['temperature'] == 25.0
+    assert parse_record({'pKa': '4.76', 'temp': '?'})['temperature'] is None
+
+
+RECORDS = [
+    {'InChIKey': 'A', 'pKa': '4.76 at 25 °C in water', 'source': 'Pubchem'},
+    {'InChIKey': 'B', 'pKa': '3.2', 'temp': '20', 'basicOrAcidic': 'acidic'},
+    {'InChIKey': 'C', 'pKa': '9.3', 'temp': '25', 'basicOrAcidic': 'basic'},
+    {'InChIKey': 'D', 'pKa': 'unknown'},
+    {'InChIKey': 'E', 'pKa': '5.0 in DMSO', 'basicOrAcidic': 'acidic'},
+]
+
+
+def test_pka_table_query():
+    table = PkaTable(RECORDS)
+    keys = lambda records: [record['InChIKey'] for record in records]
+
+    assert keys(table.query()) == ['B', 'A', 'E', 'C', 'D']    # by increasing pKa, unknown last
+    assert keys(table.query(min_pka=3, max_pka=5)) == ['B', 'A', 'E']
+    assert keys(table.query(min_pka=5)) == ['E', 'C']
+    assert keys(table.query(max_pka=4.76)) == ['B', 'A']
+    assert keys(table.query(type='acidic')) == ['B', 'E']
+    assert keys(table.query(solvent='water')) == ['A']
+    assert keys(table.query(solvent='H2O', min_pka=3, max_pka=5)) == ['A']
+    assert keys(table.query(min_temperature=21)) == ['A', 'C']
+    assert table.query(solvent='ethanol') == []
+    with pytest.raises(ValueError):
+        table.query(type='neutral')
+
+
+def test_pka_table_add_and_doc_ids():
+    table = PkaTable()
+    assert table.query(min_pka=0) == []
+    table.add(RECORDS[1], doc_id=7)
+    assert table.query(max_pka=4)[0].doc_id == 7
+    table.add(RECORDS[0])
+    assert len(table) == 2 and len(table.query(max_pka=5)) == 2
+
+
+def test_pka_table_matches_loop_over_dataset():
+    records = read_csv(DATA_FILE)
+    table = PkaTable(records)
+    rows = table.query_rows(min_pka=3, max_pka=5, type='acidic', min_temperature=20, max_temperature=25)
+
+    expected = [i for i, record in enumerate(records)
+                if 3 <= float(record['pKa']) <= 5 and record['basicOrAcidic'] == 'acidic'
+                and record['temp'] and 20 <= float(record['temp']) <= 25]
+    assert len(expected) > 100
+    assert sorted(rows.tolist()) == expected
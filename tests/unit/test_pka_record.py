@@ -0,0 +1,64 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import json
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.pka_record import PkaRecord, to_dataframe
+from src.search_pka import search_db
+
+
+PUBCHEM_FIELDS = {
+    'source': 'Pubchem',
+    'Pubchem_CID': '887',
+    'pKa': '15.3',
+    'reference': 'Serjeant, E.P., Dempsey B.; IUPAC Chemical Data Series No. 23',
+    'Substance_CASRN': '67-56-1',
+    'InChIKey': 'OKKJLVBELUTLKV-UHFFFAOYSA-N',
+    'CanonicalSMILES': 'CO',
+    'IsomericSMILES': 'CO',
+    'IUPACName': 'methanol',
+}
+
+
+def test_from_pubchem():
+    record = PkaRecord.from_pubchem(PUBCHEM_FIELDS)
+
+    assert list(record) == ['source', 'Pubchem_CID', 'pKa', 'reference', 'Substance_CASRN',
+                            'InChIKey', 'Canonical_SMILES', 'Isomeric_SMILES', 'IUPAC_Name']
+    assert (record.pka, record.source, record.cas, record.inchikey) == ('15.3', 'Pubchem', '67-56-1',
+                                                                        'OKKJLVBELUTLKV-UHFFFAOYSA-N')
+    assert record.reference.startswith('Serjeant')
+    assert record.doc_id is None
+
+
+def test_record_is_a_dict():
+    record = PkaRecord({'pKa': '4.76'}, doc_id=3)
+
+    assert record == {'pKa': '4.76'}
+    assert json.loads(json.dumps(record)) == {'pKa': '4.76'}
+    assert not hasattr(record, '__dict__')
+    with pytest.raises(AttributeError):
+        record.other = 1
+
+
+def test_search_db_returns_records():
+    db = TinyDB(storage=MemoryStorage)
+    db.insert_multiple([{'Substance_CASRN': '64-19-7', 'pKa': '4.76'}, {'Substance_CASRN': '67-56-1', 'pKa': '15.3'}])
+
+    [(doc_id, record)] = search_db('67-56-1', db)
+    # search_pka imports pka_record from src/, i.e. not as src.pka_record
+    assert type(record).__name__ == 'PkaRecord'
+    assert record.doc_id == doc_id == 2
+    assert record.pka == '15.3'
+
+
+def test_to_dataframe():
+    pytest.importorskip('pandas')
+
+    df = to_dataframe([PkaRecord({'pKa': '4.76'}), None, PkaRecord.from_pubchem(PUBCHEM_FIELDS)])
+    assert list(df['pKa']) == ['4.76', '15.3']
+    assert 'Canonical_SMILES' in df.columns
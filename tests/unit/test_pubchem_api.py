@@ -0,0 +1,125 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import pytest
+import requests
+
+import pubchem_api
+from src.pka_lookup_pubchem import pka_lookup_pubchem
+
+
+class CountingSession(requests.Session):
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def request(self, *args, **kwargs):
+        self.count += 1
+        return super().request(*args, **kwargs)
+
+
+def test_create_session():
+    session = pubchem_api.create_session(pool_size=4, retries=2)
+    adapter = session.get_adapter('https://pubchem.ncbi.nlm.nih.gov/rest/pug')
+
+    assert adapter._pool_maxsize == 4
+    assert adapter.max_retries.total == 2
+    assert 503 not in adapter.max_retries.status_forcelist
+    assert 'user-agent' in session.headers
+
+
+def test_default_session_is_shared():
+    assert pubchem_api.default_session() is pubchem_api.default_session()
+
+
+@pytest.mark.parametrize(
+    'identifier, namespace, expect', [
+        ('64-19-7', 'name', [176]),
+        ('OKKJLVBELUTLKV-UHFFFAOYSA-N', 'inchikey', [887]),
+        ('00000-00-0', 'name', []),
+    ]
+)
+def test_get_cids(pubchem_server, identifier, namespace, expect):
+    assert pubchem_api.get_cids(identifier, namespace=namespace) == expect
+
+
+def test_get_synonyms_and_properties(pubchem_server):
+    assert pubchem_api.get_synonyms(887)[0]['Synonym'] == ['methanol', '67-56-1', 'Methyl alcohol']
+    assert pubchem_api.get_properties(['InChIKey', 'IUPACName'], 887) == [
+        {'CID': 887, 'InChIKey': 'OKKJLVBELUTLKV-UHFFFAOYSA-N', 'IUPACName': 'methanol'}
+    ]
+
+
+def test_pka_lookup_pubchem_uses_given_session(pubchem_server):
+    session = CountingSession()
+    for _ in range(3):
+        assert pka_lookup_pubchem('64-19-7', prefetch_pka=False, session=session)['Pubchem_CID'] == '176'
+
+    assert session.count == len(pubchem_server.requests) == 12
+    # Keep-alive connections are reused: at most 2 requests (synonyms and properties) run at the same time
+    assert len(pubchem_server.connections) <= 2
+
+
+@pytest.mark.parametrize(
+    'cids, max_cids, max_length, expect', [
+        ([], 2, 100, []),
+        ([1, 2, 3, 4, 5], 2, 100, [[1, 2], [3, 4], [5]]),
+        ([176, 887, 6117], 10, 8, [[176, 887], [6117]]),
+        ([123456789], 10, 3, [[123456789]]),
+    ]
+)
+def test_cid_batches(cids, max_cids, max_length, expect):
+    assert list(pubchem_api.cid_batches(cids, max_cids=max_cids, max_length=max_length)) == expect
+
+
+def test_batch_synonyms_and_properties(pubchem_server):
+    synonyms = pubchem_api.get_synonyms([176, 887, 6117])
+    properties = pubchem_api.get_properties(['InChIKey'], [176, 887, 6117])
+
+    assert [information['CID'] for information in synonyms] == [176, 887, 6117]
+    assert properties[2] == {'CID': 6117, 'InChIKey': 'DQMGKULPXJRUDR-UHFFFAOYSA-N'}
+    assert len(pubchem_server.requests) == 2
+    assert all(method == 'POST' for _, method, _ in pubchem_server.requests)
+
+
+def test_iter_pka_values_stops_reading_at_first_value():
+    from mock_pubchem import pug_view_xml
+
+    xml = pug_view_xml([('Reference {}'.format(i), 'pKa = {}'.format(i)) for i in range(1000)]).encode('utf-8')
+    chunks_read = []
+
+    def chunks(size=100):
+        for start in range(0, len(xml), size):
+            chunks_read.append(start)
+            yield xml[start:start + size]
+
+    values = pubchem_api.iter_pka_values(chunks())
+    assert next(values) == ('Reference 0', 'pKa = 0')
+    values.close()
+    assert len(chunks_read) < 10
+
+    assert len(list(pubchem_api.iter_pka_values(chunks()))) == 1000
+
+
+def test_iter_pka_values_skips_incomplete_information():
+    from mock_pubchem import pug_view_xml
+
+    xml = pug_view_xml([('Reference 1', 'pKa = 4.2')]).replace('<Information>', (
+        '<Information><ReferenceNumber>2</ReferenceNumber><Reference>Reference 2</Reference>'
+        '<Value><Number>4.8</Number></Value></Information>'
+        '<Information><ReferenceNumber>3</ReferenceNumber>'
+        '<Value><StringWithMarkup><String>pKa = 5.0</String></StringWithMarkup></Value></Information>'
+        '<Information>'))
+
+    assert list(pubchem_api.iter_pka_values([xml.encode('utf-8')])) == [('Reference 1', 'pKa = 4.2')]
+
+
+def test_pka_lookup_pubchem_all_values(pubchem_server):
+    assert 'pKa_values' not in pka_lookup_pubchem('67-56-1')
+
+    result = pka_lookup_pubchem('67-56-1', all_values=True)
+    assert result['pKa'] == '15.3'
+    assert result['pKa_values'] == [
+        {'pKa': '15.3', 'reference': 'Serjeant, E.P., Dempsey B.; IUPAC Chemical Data Series No. 23'},
+        {'pKa': '15.5', 'reference': 'Another reference'},
+    ]
@@ -0,0 +1,32 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.rate_limiter import RateLimiter
+
+
+def test_burst_up_to_capacity_does_not_wait():
+    limiter = RateLimiter(rate=10, capacity=5)
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    assert time.monotonic() - start < 0.05
+
+
+def test_rate_is_respected_across_threads():
+    limiter = RateLimiter(rate=50, capacity=1)
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: limiter.acquire(), range(26)))
+    # 1 token available at start, the other 25 refill at 50 per second
+    assert time.monotonic() - start >= 0.45
+
+
+def test_pause_holds_back_next_caller():
+    limiter = RateLimiter(rate=100)
+    limiter.pause(0.2)
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.15
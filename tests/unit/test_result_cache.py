@@ -0,0 +1,166 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.pka_record import PkaRecord
+from src.result_cache import ResultCache
+from src.search_pka import search_pka, search_pka_many
+from src.sqlite_db import SQLiteDB
+
+
+ACETIC_ACID = {'Substance_CASRN': '64-19-7', 'InChIKey': 'QTBSBXVTEAMEQO-UHFFFAOYSA-N', 'pKa': '4.76'}
+METHANOL = {'source': 'Pubchem', 'Substance_CASRN': '67-56-1', 'InChIKey': 'OKKJLVBELUTLKV-UHFFFAOYSA-N', 'pKa': '15.3'}
+
+
+def result(pka='4.76', doc_id=1):
+    return [PkaRecord(dict(ACETIC_ACID, pKa=pka), doc_id)]
+
+
+def test_get_put_and_counters():
+    cache = ResultCache()
+    assert cache.get('64-19-7') is None
+    cache.put('64-19-7', result())
+    cache.put('nothing', [])
+
+    assert cache.get('64-19-7') == result()
+    assert 'nothing' not in cache
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+    assert stats['bytes'] > 0
+
+
+def test_lru_eviction_by_entries():
+    cache = ResultCache(max_entries=2)
+    cache.put('a', result())
+    cache.put('b', result())
+    cache.get('a')    # 'b' is now the least recently used
+    cache.put('c', result())
+
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    assert cache.stats()['evictions'] == 1
+
+
+def test_lru_eviction_by_bytes():
+    cache = ResultCache(max_bytes=300)
+    cache.put('a', result())
+    cache.put('b', result(pka='x' * 150))
+    assert 'a' not in cache and 'b' in cache
+    assert cache.stats()['bytes'] <= 300
+
+    cache.put('too big', result(pka='x' * 1000))
+    assert 'too big' not in cache
+
+
+def test_ttl():
+    cache = ResultCache(ttl=60)
+    cache.put('a', result(), ttl=-1)
+    cache.put('b', result())
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_invalidate_record():
+    cache = ResultCache()
+    cache.put('64-19-7', result())
+    cache.put('QTBSBXVTEAMEQO-UHFFFAOYSA-N', result())
+    cache.put('67-56-1', result())
+
+    assert cache.invalidate_record(ACETIC_ACID) == 2
+    assert list(cache._entries) == ['67-56-1']
+
+
+@pytest.mark.parametrize('storage', ['sqlite', 'sqlite_unindexed', 'tinydb'])
+def test_disk_tier(tmp_path, storage):
+    if storage.startswith('sqlite'):
+        db = SQLiteDB(str(tmp_path / 'db.sqlite3'))
+        # Without an indexed 'identifier' column, entries are mapped in memory
+        table = db.table('result_cache', fields=['identifier'] if storage == 'sqlite' else [])
+    else:
+        table = TinyDB(storage=MemoryStorage).table('result_cache')
+
+    cache = ResultCache(max_entries=1, table=table)
+    cache.put('a', result())
+    cache.put('a', result(doc_id=7))
+    cache.put('b', result())
+    assert len(table) == 2    # the entry put again replaced the first one
+    assert 'a' not in cache    # evicted from memory only
+
+    assert cache.get('a') == result()
+    assert cache.get('a')[0].doc_id == 7
+    assert cache.stats()['disk_hits'] == 1 and cache.stats()['memory_hits'] == 1
+
+    # A new cache (e.g. the next run) finds the entries on disk
+    assert ResultCache(table=table).get('b') == result()
+
+    cache.invalidate(['a'])
+    assert ResultCache(table=table).get('a') is None
+    cache.clear()
+    assert len(table) == 0
+
+
+@pytest.mark.parametrize('storage', ['sqlite', 'tinydb'])
+def test_disk_tier_is_bounded_without_scans(tmp_path, storage, monkeypatch):
+    if storage == 'sqlite':
+        table = SQLiteDB(str(tmp_path / 'db.sqlite3')).table('result_cache', fields=['identifier'])
+    else:
+        table = TinyDB(storage=MemoryStorage).table('result_cache')
+    cache = ResultCache(max_entries=1, table=table, max_disk_entries=20)
+    cache.put('expired', result(), ttl=-1)
+
+    scans = []
+    table_all = table.all
+    monkeypatch.setattr(table, 'all', lambda: scans.append(1) or table_all())
+    for i in range(25):
+        cache.put(str(i), result(doc_id=i))
+        assert cache.get(str(i))[0].doc_id == i
+    cache.invalidate(['24'])
+
+    assert len(table) <= 20
+    # The expired entry and the ones expiring first were removed
+    assert cache.get('expired') is None and cache.get('0') is None
+    assert cache.get('23')[0].doc_id == 23
+    assert cache.stats()['disk_evictions'] == 6
+    # The table is only read when it is pruned (down to 18 entries), not on every get and put
+    assert len(scans) == 2
+
+
+class CountingDB:
+    """Count the lookups of the local database"""
+
+    def __init__(self, database):
+        self.database = database
+        self.lookups = 0
+
+    def __len__(self):
+        return len(self.database)
+
+    def lookup(self, identifier, fields=None):
+        self.lookups += 1
+        return [(record.doc_id, record) for record in self.database.all()
+                if identifier in (record.get('Substance_CASRN'), record.get('InChIKey'))]
+
+    def insert(self, document):
+        return self.database.insert(document)
+
+
+def test_search_pka_uses_cache(monkeypatch):
+    monkeypatch.setattr('src.search_pka.pka_lookup_pubchem', lambda identifier, **kwargs: dict(METHANOL))
+    db = TinyDB(storage=MemoryStorage)
+    db.insert(ACETIC_ACID)
+    database = CountingDB(db)
+    cache = ResultCache()
+
+    assert search_pka('64-19-7', database, cache=cache) == [ACETIC_ACID]
+    assert search_pka('64-19-7', database, cache=cache) == [ACETIC_ACID]
+    assert search_pka_many(['64-19-7', '64-19-7'], database, cache=cache) == [[ACETIC_ACID], [ACETIC_ACID]]
+    assert database.lookups == 1
+
+    # A search of the InChIKey was cached before Pubchem added the record with the same InChIKey
+    cache.put('OKKJLVBELUTLKV-UHFFFAOYSA-N', [PkaRecord({'pKa': 'old'})])
+    assert search_pka('67-56-1', database, cache=cache) == METHANOL
+    assert 'OKKJLVBELUTLKV-UHFFFAOYSA-N' not in cache
+    assert search_pka('OKKJLVBELUTLKV-UHFFFAOYSA-N', database, cache=cache) == [METHANOL]
@@ -0,0 +1,120 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.db_index import IndexedDB
+from src.search_pka import search_db, search_db_many, search_pka_many
+
+
+RECORDS = [
+    {
+        'Substance_CASRN': '64-19-7',
+        'IUPAC_Name': 'acetic acid',
+        'InChIKey': 'QTBSBXVTEAMEQO-UHFFFAOYSA-N',
+        'Canonical_SMILES': 'CC(=O)O',
+        'Isomeric_SMILES': 'CC(=O)O',
+        'pKa': '4.76 at 25 °C',
+    },
+    {
+        'Substance_CASRN': '108-95-2',
+        'InChIKey': 'ISWSIDIOOBJBQZ-UHFFFAOYSA-N',
+        'Original_SMILES': 'OC1=CC=CC=C1',
+        'pKa': '9.99',
+    },
+]
+
+METHANOL = {
+    'source': 'Pubchem',
+    'Pubchem_CID': '887',
+    'Substance_CASRN': '67-56-1',
+    'pKa': '15.3',
+    'InChIKey': 'OKKJLVBELUTLKV-UHFFFAOYSA-N',
+    'Canonical_SMILES': 'CO',
+}
+
+
+@pytest.fixture
+def db():
+    database = TinyDB(storage=MemoryStorage)
+    database.insert_multiple(RECORDS)
+    return database
+
+
+@pytest.fixture
+def pubchem_calls(monkeypatch):
+    calls = []
+
+    def fake_pka_lookup_pubchem(identifier, *args, **kwargs):
+        calls.append(identifier)
+        return dict(METHANOL) if identifier == '67-56-1' else None
+
+    monkeypatch.setattr('src.search_pka.pka_lookup_pubchem', fake_pka_lookup_pubchem)
+    return calls
+
+
+@pytest.mark.parametrize('indexed', [False, True])
+def test_search_db_many_same_as_search_db(db, indexed):
+    database = IndexedDB(db) if indexed else db
+    identifiers = ['64-19-7', 'CC(=O)O', 'OC1=CC=CC=C1', 'not in db']
+
+    result = search_db_many(identifiers, database)
+
+    assert set(result) == {'64-19-7', 'CC(=O)O', 'OC1=CC=CC=C1'}
+    for identifier in result:
+        assert result[identifier] == search_db(identifier, database)
+
+
+@pytest.mark.parametrize('indexed', [False, True])
+def test_search_pka_many(db, pubchem_calls, indexed):
+    database = IndexedDB(db) if indexed else db
+    identifiers = ['64-19-7', '67-56-1', '2950-43-8', '64-19-7', '67-56-1', 'OC1=CC=CC=C1', '2950-43-8']
+
+    result = search_pka_many(identifiers, database)
+
+    assert result == [
+        [RECORDS[0]],
+        METHANOL,
+        None,
+        [RECORDS[0]],
+        METHANOL,
+        [RECORDS[1]],
+        None,
+    ]
+    # Only the unique misses are sent to Pubchem
+    assert pubchem_calls == ['67-56-1', '2950-43-8']
+    # Pubchem result is added into the local database
+    assert search_db('67-56-1', database) == [(3, METHANOL)]
+
+
+def test_search_pka_many_empty_identifiers(db, pubchem_calls):
+    assert search_pka_many(['', '64-19-7', None, ''], db) == [None, [RECORDS[0]], None, None]
+    assert pubchem_calls == []
+
+
+def test_search_pka_many_database_error(monkeypatch, capsys):
+    class BrokenDB:
+        def all(self):
+            raise RuntimeError('database is locked')
+
+        def __len__(self):
+            return 1
+
+    # Errors are returned as None (like search_pka()) and printed in debug mode
+    monkeypatch.setattr('src.search_pka.debug', True)
+    monkeypatch.setattr('sys.argv', ['search_pka.py'])
+    assert search_pka_many(['64-19-7', 'OC1=CC=CC=C1'], BrokenDB()) == [None, None]
+    assert 'database is locked' in capsys.readouterr().out
+
+
+def test_search_pka_many_insert_error(db, pubchem_calls, monkeypatch, capsys):
+    def insert(document):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(db, 'insert', insert)
+    monkeypatch.setattr('src.search_pka.debug', True)
+    monkeypatch.setattr('sys.argv', ['search_pka.py'])
+    assert search_pka_many(['67-56-1', '64-19-7'], db) == [None, [RECORDS[0]]]
+    assert 'disk full' in capsys.readouterr().out
@@ -0,0 +1,83 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.search_pka import search_db, search_db_many
+from src.snapshot import Snapshot, build_snapshot
+
+
+RECORDS = [
+    {
+        'Substance_CASRN': '64-19-7',
+        'IUPAC_Name': 'acetic acid',
+        'InChIKey': 'QTBSBXVTEAMEQO-UHFFFAOYSA-N',
+        'Canonical_SMILES': 'CC(=O)O',
+        'Isomeric_SMILES': 'CC(=O)O',
+        'pKa': '4.76 at 25 °C',
+    },
+    {
+        'Substance_CASRN': '108-95-2',
+        'InChIKey': 'ISWSIDIOOBJBQZ-UHFFFAOYSA-N',
+        'Original_SMILES': 'OC1=CC=CC=C1',
+        'Substance_Name': 'Phénol',
+        'temp': '',
+        'pKa': '9.99',
+    },
+    {
+        'Substance_CASRN': '108-95-2',
+        'InChIKey': 'ISWSIDIOOBJBQZ-UHFFFAOYSA-N',
+        'Canonical_SMILES': 'C1=CC=C(C=C1)O',
+        'pKa': '9.9',
+    },
+]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = str(tmp_path / 'pka_snapshot.bin')
+    assert build_snapshot(RECORDS, path) == 3
+    snapshot = Snapshot(path)
+    yield snapshot
+    snapshot.close()
+
+
+def test_records_round_trip(snapshot):
+    assert len(snapshot) == 3
+    assert snapshot.all() == RECORDS
+    assert snapshot.get(2) == RECORDS[1]
+    assert snapshot.get(2).doc_id == 2
+    assert snapshot.get(4) is None
+
+
+@pytest.mark.parametrize(
+    'identifier', [
+        '64-19-7',
+        'CC(=O)O',
+        '108-95-2',
+        'OC1=CC=CC=C1',
+        'ISWSIDIOOBJBQZ-UHFFFAOYSA-N',
+        '9.99',    # not an identifier field
+        'Phénol',
+        'not in snapshot',
+    ]
+)
+def test_lookup_same_as_scan(snapshot, identifier):
+    db = TinyDB(storage=MemoryStorage)
+    db.insert_multiple(RECORDS)
+    assert search_db(identifier, snapshot) == search_db(identifier, db)
+
+
+def test_lookup_restricted_fields(snapshot):
+    assert snapshot.lookup('108-95-2', fields=['InChIKey']) == []
+    assert [doc_id for doc_id, _ in snapshot.lookup('108-95-2', fields=['Substance_CASRN'])] == [2, 3]
+    assert set(search_db_many(['64-19-7', 'C1=CC=C(C=C1)O', 'x'], snapshot)) == {'64-19-7', 'C1=CC=C(C=C1)O'}
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / 'not_a_snapshot.bin'
+    path.write_bytes(b'\0' * 128)
+    with pytest.raises(ValueError):
+        Snapshot(str(path))
@@ -0,0 +1,105 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import pytest
+from tinydb import TinyDB
+
+from src.negative_cache import NegativeCache, NO_PKA
+from src.search_pka import search_db, search_db_many
+from src.sqlite_db import SQLiteDB, migrate_tinydb_json
+
+
+RECORDS = [
+    {
+        'Substance_CASRN': '64-19-7',
+        'IUPAC_Name': 'acetic acid',
+        'InChIKey': 'QTBSBXVTEAMEQO-UHFFFAOYSA-N',
+        'Canonical_SMILES': 'CC(=O)O',
+        'Isomeric_SMILES': 'CC(=O)O',
+        'pKa': '4.76 at 25 °C',
+    },
+    {
+        'Substance_CASRN': '108-95-2',
+        'InChIKey': 'ISWSIDIOOBJBQZ-UHFFFAOYSA-N',
+        'Original_SMILES': 'OC1=CC=CC=C1',
+        'pKa': '9.99',
+        'temp': 25,
+    },
+]
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = SQLiteDB(str(tmp_path / 'pka_db.sqlite3'))
+    database.insert_multiple(RECORDS)
+    yield database
+    database.close()
+
+
+def test_insert_and_lookup(db):
+    assert len(db) == 2
+    assert search_db('CC(=O)O', db) == [(1, RECORDS[0])]
+    assert search_db('108-95-2', db)[0][1]['temp'] == 25
+    assert search_db('not in db', db) == []
+
+    doc_id = db.insert({'InChIKey': 'OKKJLVBELUTLKV-UHFFFAOYSA-N', 'Canonical_SMILES': 'CO'})
+    assert doc_id == 3
+    assert search_db('CO', db) == [(3, {'InChIKey': 'OKKJLVBELUTLKV-UHFFFAOYSA-N', 'Canonical_SMILES': 'CO'})]
+    assert search_db_many(['CO', '64-19-7'], db) == {'CO': search_db('CO', db), '64-19-7': search_db('64-19-7', db)}
+
+
+def test_lookup_only_indexed_fields(db):
+    with pytest.raises(ValueError):
+        db.lookup('64-19-7', fields=['Substance_Name'])
+    with pytest.raises(ValueError):
+        db.table('result_cache').lookup('a')
+
+
+def test_records_persist(tmp_path):
+    path = str(tmp_path / 'pka_db.sqlite3')
+    db = SQLiteDB(path)
+    db.insert(RECORDS[0])
+    db.close()
+
+    db = SQLiteDB(path)
+    assert db.all() == [RECORDS[0]]
+    assert db.all()[0].doc_id == 1
+    db.close()
+
+
+def test_update_remove(db):
+    db.update({'pKa': '4.75'}, doc_ids=[1])
+    assert db.get(1)['pKa'] == '4.75'
+
+    db.update({'Canonical_SMILES': 'OC(C)=O'}, doc_ids=[1])
+    assert search_db('OC(C)=O', db) == [(1, db.get(1))]
+
+    db.remove(doc_ids=[1])
+    assert db.get(1) is None
+    assert search_db('64-19-7', db) == []
+
+
+def test_negative_cache_table(db):
+    NegativeCache(db.table('negative_cache')).add('2950-43-8', NO_PKA)
+    assert len(db) == 2
+    assert NegativeCache(db.table('negative_cache')).get('2950-43-8')['reason'] == NO_PKA
+
+
+def test_migrate_tinydb_json(tmp_path):
+    json_path = str(tmp_path / 'tinydb_db.json')
+    tinydb = TinyDB(json_path, sort_keys=True, indent=4)
+    tinydb.insert_multiple(RECORDS)
+    tinydb.remove(doc_ids=[1])
+    tinydb.insert({'Canonical_SMILES': 'CO'})
+    tinydb.table('negative_cache').insert({'identifier': '2950-43-8', 'reason': NO_PKA, 'expires': 0})
+    tinydb.close()
+
+    sqlite_path = str(tmp_path / 'pka_db.sqlite3')
+    assert migrate_tinydb_json(json_path, sqlite_path) == 3
+
+    db = SQLiteDB(sqlite_path)
+    # Record ids are kept
+    assert search_db('108-95-2', db) == [(2, RECORDS[1])]
+    assert search_db('CO', db) == [(3, {'Canonical_SMILES': 'CO'})]
+    assert db.table('negative_cache').all() == [{'identifier': '2950-43-8', 'reason': NO_PKA, 'expires': 0}]
+    db.close()
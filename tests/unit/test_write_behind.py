@@ -0,0 +1,138 @@
+import sys, os
+sys.path.append(os.path.realpath('src'))
+
+import json
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.db_index import IndexedDB
+from src.search_pka import search_db, search_pka
+from src.write_behind import AtomicJSONStorage, WriteBehindDB
+
+
+ACETIC_ACID = {'Substance_CASRN': '64-19-7', 'InChIKey': 'QTBSBXVTEAMEQO-UHFFFAOYSA-N', 'pKa': '4.76'}
+METHANOL = {'Substance_CASRN': '67-56-1', 'InChIKey': 'OKKJLVBELUTLKV-UHFFFAOYSA-N', 'pKa': '15.3'}
+
+
+class CountingDB(IndexedDB):
+    def __init__(self, database):
+        super().__init__(database)
+        self.writes = 0
+
+    def insert_multiple(self, documents):
+        self.writes += 1
+        return super().insert_multiple(documents)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return str(tmp_path / 'db.journal')
+
+
+def test_inserts_are_batched(journal):
+    database = CountingDB(TinyDB(storage=MemoryStorage))
+    db = WriteBehindDB(database, journal, max_pending=3)
+
+    for i in range(7):
+        db.insert({'Substance_CASRN': str(i)})
+    assert database.writes == 2
+    assert len(database) == 6
+    assert len(db) == 7
+    assert db.pending == [{'Substance_CASRN': '6'}]
+
+    db.close()
+    assert database.writes == 3
+    assert len(database) == 7
+    assert not os.path.exists(journal)
+
+
+def test_flush_interval(journal):
+    database = CountingDB(TinyDB(storage=MemoryStorage))
+    db = WriteBehindDB(database, journal, max_pending=100, flush_interval=0)
+    db.insert(ACETIC_ACID)
+    assert database.writes == 1
+    assert db.pending == []
+
+
+def test_flush_writes_through_caching_middleware(tmp_path, journal):
+    from tinydb.middlewares import CachingMiddleware
+
+    path = str(tmp_path / 'db.json')
+    db = WriteBehindDB(TinyDB(path, storage=CachingMiddleware(AtomicJSONStorage)), journal)
+    db.insert(ACETIC_ACID)
+    db.flush()
+    # On disk before the journal is cleared: nothing lost if the process dies now
+    with open(path, encoding='utf-8') as f:
+        assert list(json.load(f)['_default'].values()) == [ACETIC_ACID]
+    assert os.path.getsize(journal) == 0
+
+
+def test_pending_records_are_found(journal):
+    db = WriteBehindDB(TinyDB(storage=MemoryStorage), journal)
+    db.insert(ACETIC_ACID)
+    db.insert(METHANOL)
+    db.flush()
+    db.insert(dict(ACETIC_ACID, pKa='4.75'))
+
+    results = search_db('64-19-7', db)
+    assert [record for _, record in results] == [ACETIC_ACID, dict(ACETIC_ACID, pKa='4.75')]
+    assert [doc_id for doc_id, _ in results] == [1, None]
+    assert search_db('OKKJLVBELUTLKV-UHFFFAOYSA-N', db) == [(2, METHANOL)]
+
+
+def test_recover_after_crash(tmp_path, journal):
+    path = str(tmp_path / 'db.json')
+    db = WriteBehindDB(TinyDB(path, storage=AtomicJSONStorage), journal)
+    db.insert(ACETIC_ACID)
+    db.flush()
+    db.insert(METHANOL)
+    # The process dies here: METHANOL is only in the journal
+    with open(journal, 'a') as f:
+        f.write('{"Substance_CASRN": "cut in the mid')
+
+    db = WriteBehindDB(TinyDB(path, storage=AtomicJSONStorage), journal)
+    assert [dict(record) for record in db.all()] == [ACETIC_ACID, METHANOL]
+    assert db.pending == []
+
+
+def test_recover_does_not_duplicate(journal):
+    database = TinyDB(storage=MemoryStorage)
+    database.insert(ACETIC_ACID)
+    # Crash after the records were written, before the journal was cleared
+    with open(journal, 'w') as f:
+        f.write(json.dumps(ACETIC_ACID) + '\n' + json.dumps(METHANOL) + '\n')
+
+    db = WriteBehindDB(database, journal)
+    assert [dict(record) for record in database.all()] == [ACETIC_ACID, METHANOL]
+
+
+def test_atomic_json_storage(tmp_path):
+    path = str(tmp_path / 'db.json')
+    db = TinyDB(path, storage=AtomicJSONStorage)
+    db.insert(ACETIC_ACID)
+    db.insert(METHANOL)
+
+    assert os.listdir(str(tmp_path)) == ['db.json']
+    assert search_db('67-56-1', db) == [(2, METHANOL)]
+    db.close()
+    assert len(TinyDB(path)) == 2
+
+
+def test_search_pka_adds_pubchem_results_behind(journal, monkeypatch):
+    calls = []
+
+    def fake_pka_lookup_pubchem(identifier, **kwargs):
+        calls.append(identifier)
+        return dict(METHANOL, source='Pubchem')
+
+    monkeypatch.setattr('src.search_pka.pka_lookup_pubchem', fake_pka_lookup_pubchem)
+    database = TinyDB(storage=MemoryStorage)
+    db = WriteBehindDB(database, journal)
+
+    assert search_pka('67-56-1', db)['pKa'] == '15.3'
+    assert len(database) == 0
+    # Found in the queue, not searched in Pubchem again
+    assert search_pka('67-56-1', db)[0]['pKa'] == '15.3'
+    assert calls == ['67-56-1']